@@ -1,4 +1,6 @@
 const API_BASE_URL = import.meta.env.VITE_API_BASE_URL || 'http://localhost:8000/api';
+const JOB_POLL_INTERVAL_MS = 1000;
+const JOB_POLL_TIMEOUT_MS = 120000;
 
 function getCookie(name: string): string | null {
   const value = `; ${document.cookie}`;
@@ -31,16 +33,48 @@ export interface Conversation {
   summary?: string;
   messages?: Message[];
   is_archived?: boolean;
+  message_count?: number;
+  last_message_preview?: string | null;
+  last_message_at?: string | null;
+}
+
+export interface ConversationPage {
+  next: string | null;
+  previous: string | null;
+  results: Conversation[];
 }
 
 export interface SendMessageResponse {
   user_message: string;
   ai_response: string;
+  user_message_id: number;
+  ai_message_id: number;
+}
+
+export interface MessageTreeNode extends Message {
+  depth: number;
+  children: MessageTreeNode[];
 }
 
+export type SummaryStatus = 'rolling' | 'pending' | 'processing' | 'done' | 'failed';
+
 export interface EndConversationResponse {
   message: string;
-  summary: string;
+  job_id: number;
+  summary_status: SummaryStatus;
+}
+
+export interface Job {
+  id: number;
+  kind: string;
+  conversation: string | null;
+  status: 'pending' | 'processing' | 'done' | 'failed';
+  attempts: number;
+  max_attempts: number;
+  last_error: string | null;
+  result: Record<string, unknown> | null;
+  created_at: string;
+  updated_at: string;
 }
 
 export interface QueryResponse {
@@ -54,15 +88,23 @@ export interface SuggestionsResponse {
 
 export const conversationAPI = {
   async getAllConversations(showArchived: boolean = false): Promise<Conversation[]> {
-    const params = new URLSearchParams();
+    const params = new URLSearchParams({ page_size: '100' });
     if (showArchived) {
       params.append('show_archived', 'true');
     }
-    const response = await fetch(`${API_BASE_URL}/conversations/?${params}`, {
-      credentials: 'include',
-    });
-    if (!response.ok) throw new Error('Failed to fetch conversations');
-    return response.json();
+    const conversations: Conversation[] = [];
+    // The server pages with an opaque cursor; follow `next` until the last page
+    let url: string | null = `${API_BASE_URL}/conversations/?${params}`;
+    while (url) {
+      const response = await fetch(url, {
+        credentials: 'include',
+      });
+      if (!response.ok) throw new Error('Failed to fetch conversations');
+      const page: ConversationPage = await response.json();
+      conversations.push(...page.results);
+      url = page.next;
+    }
+    return conversations;
   },
 
   async getConversation(id: string): Promise<Conversation> {
@@ -87,7 +129,7 @@ export const conversationAPI = {
     return response.json();
   },
 
-  async sendMessage(conversationId: string, content: string): Promise<SendMessageResponse> {
+  async sendMessage(conversationId: string, content: string, parentId?: number): Promise<SendMessageResponse> {
     const response = await fetch(`${API_BASE_URL}/conversations/${conversationId}/send_message/`, {
       method: 'POST',
       headers: {
@@ -95,12 +137,30 @@ export const conversationAPI = {
         'X-CSRFToken': getCSRFToken(),
       },
       credentials: 'include',
-      body: JSON.stringify({ content }),
+      body: JSON.stringify(parentId === undefined ? { content } : { content, parent_id: parentId }),
     });
     if (!response.ok) throw new Error('Failed to send message');
     return response.json();
   },
 
+  async getMessageTree(conversationId: string): Promise<MessageTreeNode[]> {
+    const response = await fetch(`${API_BASE_URL}/conversations/${conversationId}/tree/`, {
+      credentials: 'include',
+    });
+    if (!response.ok) throw new Error('Failed to fetch message tree');
+    const data: { messages: MessageTreeNode[] } = await response.json();
+    return data.messages;
+  },
+
+  async getActivePath(conversationId: string, leafId: number): Promise<Message[]> {
+    const response = await fetch(`${API_BASE_URL}/conversations/${conversationId}/tree/?leaf=${leafId}`, {
+      credentials: 'include',
+    });
+    if (!response.ok) throw new Error('Failed to fetch message path');
+    const data: { path: Message[] } = await response.json();
+    return data.path;
+  },
+
   async endConversation(conversationId: string): Promise<EndConversationResponse> {
     const response = await fetch(`${API_BASE_URL}/conversations/${conversationId}/end/`, {
       method: 'POST',
@@ -114,6 +174,25 @@ export const conversationAPI = {
     return response.json();
   },
 
+  async getJob(jobId: number): Promise<Job> {
+    const response = await fetch(`${API_BASE_URL}/jobs/${jobId}/`, {
+      credentials: 'include',
+    });
+    if (!response.ok) throw new Error('Failed to fetch job');
+    return response.json();
+  },
+
+  // Background work (summaries, PDF renders) is queued server-side; poll until the job settles
+  async waitForJob(jobId: number, timeoutMs: number = JOB_POLL_TIMEOUT_MS): Promise<Job> {
+    const deadline = Date.now() + timeoutMs;
+    for (;;) {
+      const job = await conversationAPI.getJob(jobId);
+      if (job.status === 'done' || job.status === 'failed') return job;
+      if (Date.now() >= deadline) throw new Error('Timed out waiting for job');
+      await new Promise((resolve) => setTimeout(resolve, JOB_POLL_INTERVAL_MS));
+    }
+  },
+
   async queryConversations(query: string): Promise<QueryResponse> {
     const response = await fetch(`${API_BASE_URL}/conversations/query/`, {
       method: 'POST',
@@ -137,9 +216,19 @@ export const conversationAPI = {
   },
 
   async exportConversation(conversationId: string, format: 'json' | 'pdf' | 'markdown'): Promise<Blob> {
-    const response = await fetch(`${API_BASE_URL}/conversations/${conversationId}/export/?format=${format}`, {
+    const url = `${API_BASE_URL}/conversations/${conversationId}/export/?format=${format}`;
+    let response = await fetch(url, {
       credentials: 'include',
     });
+    if (response.status === 202) {
+      // PDFs are rendered by a background job; fetch again once it has finished
+      const { job_id } = await response.json();
+      const job = await conversationAPI.waitForJob(job_id);
+      if (job.status === 'failed') throw new Error('Failed to export conversation');
+      response = await fetch(url, {
+        credentials: 'include',
+      });
+    }
     if (!response.ok) throw new Error('Failed to export conversation');
     return response.blob();
   },
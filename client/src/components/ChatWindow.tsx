@@ -135,7 +135,12 @@ export default function ChatWindow({
     setIsEnding(true);
 
     try {
-      await conversationAPI.endConversation(conversationId);
+      const { job_id } = await conversationAPI.endConversation(conversationId);
+      // The summary is written by a background job; wait for it before reporting success
+      const job = await conversationAPI.waitForJob(job_id);
+      if (job.status === "failed") {
+        throw new Error(job.last_error || "Summary generation failed");
+      }
       setShowEndDialog(false);
       setShowSuccessDialog(true);
 
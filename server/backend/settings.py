@@ -4,9 +4,92 @@ from dotenv import load_dotenv
 
 load_dotenv()
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "gemini")
+LLM_MODEL = os.getenv("LLM_MODEL", "gemini-2.5-flash")
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "models/text-embedding-004")
+LLM_CACHE_ALIAS = os.getenv("LLM_CACHE_ALIAS", "default")
+LLM_CACHE_LOCAL_MAX_ENTRIES = int(os.getenv("LLM_CACHE_LOCAL_MAX_ENTRIES", "1024"))
+LLM_CACHE_TTLS = {
+    'suggestions': int(os.getenv("LLM_CACHE_TTL_SUGGESTIONS", "600")),
+    'query': int(os.getenv("LLM_CACHE_TTL_QUERY", "300")),
+    'query_embedding': int(os.getenv("LLM_CACHE_TTL_QUERY_EMBEDDING", "3600")),
+}
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "30"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "64"))
+LLM_RETRY_ATTEMPTS = int(os.getenv("LLM_RETRY_ATTEMPTS", "3"))
+LLM_RETRY_BASE_DELAY = float(os.getenv("LLM_RETRY_BASE_DELAY", "0.5"))
+LLM_RETRY_MAX_DELAY = float(os.getenv("LLM_RETRY_MAX_DELAY", "8"))
+LLM_RETRY_BUDGET = float(os.getenv("LLM_RETRY_BUDGET", "60"))
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_RESET = float(os.getenv("LLM_BREAKER_RESET", "30"))
+# Seconds before a slow call is raced against a duplicate; 0 disables hedging
+LLM_HEDGE_AFTER = float(os.getenv("LLM_HEDGE_AFTER", "0"))
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "6000"))
+CONTEXT_RECENT_MESSAGES = int(os.getenv("CONTEXT_RECENT_MESSAGES", "20"))
+CONTEXT_FOLD_BATCH = int(os.getenv("CONTEXT_FOLD_BATCH", "200"))
+CONTEXT_SUMMARY_WORDS = int(os.getenv("CONTEXT_SUMMARY_WORDS", "250"))
+SUMMARY_ROLLING_EVERY = int(os.getenv("SUMMARY_ROLLING_EVERY", "20"))
+MEMORY_DIGEST_WORDS = int(os.getenv("MEMORY_DIGEST_WORDS", "300"))
+MEMORY_DIGEST_INPUT_TOKENS = int(os.getenv("MEMORY_DIGEST_INPUT_TOKENS", "12000"))
+EXTRACTION_MAX_TOKENS = int(os.getenv("EXTRACTION_MAX_TOKENS", "24000"))
+EXTRACTION_CHUNK_TOKENS = int(os.getenv("EXTRACTION_CHUNK_TOKENS", "8000"))
+SEARCH_TOP_K = int(os.getenv("SEARCH_TOP_K", "8"))
+SEARCH_CHUNK_CHARS = int(os.getenv("SEARCH_CHUNK_CHARS", "1500"))
+SEARCH_IVF_MIN_VECTORS = int(os.getenv("SEARCH_IVF_MIN_VECTORS", "20000"))
+SEARCH_IVF_NPROBE = int(os.getenv("SEARCH_IVF_NPROBE", "8"))
+SEARCH_INDEX_CACHE_USERS = int(os.getenv("SEARCH_INDEX_CACHE_USERS", "64"))
+BULK_MAX_ITEMS = int(os.getenv("BULK_MAX_ITEMS", "1000"))
+ADMISSION_STORE = os.getenv("ADMISSION_STORE", "local")
+ADMISSION_CACHE_ALIAS = os.getenv("ADMISSION_CACHE_ALIAS", "default")
+ADMISSION_MAX_CONCURRENT = int(os.getenv("ADMISSION_MAX_CONCURRENT", "2"))
+ADMISSION_RATE = float(os.getenv("ADMISSION_RATE", "0.5"))
+ADMISSION_BURST = int(os.getenv("ADMISSION_BURST", "10"))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "4"))
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "10"))
+ADMISSION_BUSY_RETRY_AFTER = float(os.getenv("ADMISSION_BUSY_RETRY_AFTER", "1"))
+ADMISSION_SLOT_TTL = int(os.getenv("ADMISSION_SLOT_TTL", "300"))
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", "500"))
+EXPORT_ZIP_FLUSH_BYTES = int(os.getenv("EXPORT_ZIP_FLUSH_BYTES", "65536"))
+# Bytes gathered per step when an export is streamed from the ASGI server
+EXPORT_STREAM_BYTES = int(os.getenv("EXPORT_STREAM_BYTES", "65536"))
+PDF_RENDER_WORKERS = int(os.getenv("PDF_RENDER_WORKERS", "2"))
+PDF_RENDER_TIMEOUT = float(os.getenv("PDF_RENDER_TIMEOUT", "60"))
+# Seconds a client is told to wait before polling again while its PDF renders
+PDF_EXPORT_RETRY_AFTER = int(os.getenv("PDF_EXPORT_RETRY_AFTER", "2"))
+SHARED_SNAPSHOT_CACHE_ALIAS = os.getenv("SHARED_SNAPSHOT_CACHE_ALIAS", "default")
+SHARED_SNAPSHOT_TTL = int(os.getenv("SHARED_SNAPSHOT_TTL", "86400"))
+# How long shared links trust their cached pointers when the snapshot cache is per process (locmem)
+SHARED_SNAPSHOT_LOCAL_POINTER_TTL = int(os.getenv("SHARED_SNAPSHOT_LOCAL_POINTER_TTL", "5"))
+SHARED_CACHE_MAX_AGE = int(os.getenv("SHARED_CACHE_MAX_AGE", "60"))
+SHARED_CACHE_S_MAXAGE = int(os.getenv("SHARED_CACHE_S_MAXAGE", "300"))
+SHARED_CACHE_STALE_WHILE_REVALIDATE = int(os.getenv("SHARED_CACHE_STALE_WHILE_REVALIDATE", "600"))
+# Without a token /metrics is only served to staff sessions
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_MODE = os.getenv("PROFILE_MODE", "cprofile")
+PROFILE_WALL_INTERVAL = float(os.getenv("PROFILE_WALL_INTERVAL", "0.005"))
+PROFILE_TOP_ENTRIES = int(os.getenv("PROFILE_TOP_ENTRIES", "50"))
+PROFILE_MAX_STATEMENTS = int(os.getenv("PROFILE_MAX_STATEMENTS", "1000"))
+PROFILE_REPEATED_QUERY_THRESHOLD = int(os.getenv("PROFILE_REPEATED_QUERY_THRESHOLD", "5"))
+PROFILE_MAX_STORED = int(os.getenv("PROFILE_MAX_STORED", "200"))
+AUTH_USER_CACHE_ALIAS = os.getenv("AUTH_USER_CACHE_ALIAS", "default")
+# Seconds an authenticated user row is reused across requests; 0 loads it from the database every time
+AUTH_USER_CACHE_TTL = int(os.getenv("AUTH_USER_CACHE_TTL", "60"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_RETRY_BACKOFF = float(os.getenv("JOB_RETRY_BACKOFF", "5"))
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "300"))
+JOB_WORKER_CONCURRENCY = int(os.getenv("JOB_WORKER_CONCURRENCY", "4"))
+FAKE_LLM_LATENCY = float(os.getenv("FAKE_LLM_LATENCY", "0"))
+FAKE_LLM_CHUNK_DELAY = float(os.getenv("FAKE_LLM_CHUNK_DELAY", "0"))
+FAKE_LLM_ERROR_RATE = float(os.getenv("FAKE_LLM_ERROR_RATE", "0.1"))
+FAKE_LLM_SLOW_RATE = float(os.getenv("FAKE_LLM_SLOW_RATE", "0.05"))
+FAKE_LLM_SLOW_LATENCY = float(os.getenv("FAKE_LLM_SLOW_LATENCY", "5"))
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+PDF_CACHE_DIR = os.getenv("PDF_CACHE_DIR", str(BASE_DIR / "pdf_cache"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", str(BASE_DIR / "profiles"))
+
 SECRET_KEY = os.getenv("SECRET_KEY")
 
 DEBUG = os.getenv("DEBUG", "False").lower() == "true"
@@ -14,12 +97,15 @@ DEBUG = os.getenv("DEBUG", "False").lower() == "true"
 ALLOWED_HOSTS = os.getenv("ALLOWED_HOSTS", "").split(",")
 
 INSTALLED_APPS = [
+    # Serves the ASGI application, WebSockets included, under runserver
+    'daphne',
     'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'corsheaders',
     'chat',
@@ -27,11 +113,13 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'chat.middleware.RequestMetricsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'chat.middleware.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -54,6 +142,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'backend.wsgi.application'
+ASGI_APPLICATION = 'backend.asgi.application'
 
 DATABASES = {
     'default': {
@@ -66,6 +155,36 @@ DATABASES = {
     }
 }
 
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Fan-out for real-time events. The in-memory layer only reaches connections in the same process, so
+# use Redis once the job workers or several web processes need to publish
+if os.getenv('CHANNEL_REDIS_URL', os.getenv('REDIS_URL')):
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels_redis.core.RedisChannelLayer',
+            'CONFIG': {'hosts': [os.getenv('CHANNEL_REDIS_URL', os.getenv('REDIS_URL'))]},
+        }
+    }
+else:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels.layers.InMemoryChannelLayer',
+        }
+    }
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -96,6 +215,16 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 CORS_ALLOW_ALL_ORIGINS = True
 CORS_ALLOW_CREDENTIALS = True
 
+# Sessions are read from the cache and only hit the database on a miss or when they change. Set
+# SESSION_ENGINE=django.contrib.sessions.backends.signed_cookies to keep no server-side sessions at all
+SESSION_ENGINE = os.getenv("SESSION_ENGINE", "django.contrib.sessions.backends.cached_db")
+SESSION_CACHE_ALIAS = os.getenv("SESSION_CACHE_ALIAS", "default")
+# ModelBackend stays listed so sessions created before the cached backend keep working until they expire
+AUTHENTICATION_BACKENDS = [
+    'chat.auth_backends.CachedModelBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
+
 SESSION_COOKIE_DOMAIN = ".anuragsawant.in"  # note the leading dot
 SESSION_COOKIE_SAMESITE = "None"
 SESSION_COOKIE_SECURE = True
@@ -105,6 +234,10 @@ CSRF_COOKIE_SECURE = True
 
 CSRF_TRUSTED_ORIGINS = ['http://localhost:5173', 'http://localhost:3000', 'http://127.0.0.1:5173', "https://recallai.anuragsawant.in", "https://recallai-serve.anuragsawant.in",]
 
+WEBSOCKET_ALLOWED_ORIGINS = (
+    os.getenv("WEBSOCKET_ALLOWED_ORIGINS").split(",") if os.getenv("WEBSOCKET_ALLOWED_ORIGINS") else CSRF_TRUSTED_ORIGINS
+)
+
 
 REST_FRAMEWORK = {
     'DEFAULT_RENDERER_CLASSES': [
@@ -119,4 +252,6 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    # ?format= selects the export format, not a renderer
+    'URL_FORMAT_OVERRIDE': None,
 }
@@ -2,9 +2,11 @@ from django.contrib import admin
 from django.urls import path, include
 from chat.auth_views import register, login_view, logout_view, current_user
 from chat.csrf_views import get_csrf_token
+from chat.metrics_views import metrics
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('metrics', metrics, name='metrics'),
     path('api/', include('chat.urls')),
     path('api/auth/register/', register, name='register'),
     path('api/auth/login/', login_view, name='login'),
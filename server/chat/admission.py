@@ -0,0 +1,213 @@
+import functools
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+class Rejected(Exception):
+    def __init__(self, reason, retry_after):
+        super().__init__(f"Request rejected ({reason}); retry after {retry_after:.1f}s")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class LocalAdmissionStore:
+    """Per-process state: exact token buckets, and a condition variable for queued requests."""
+
+    def __init__(self):
+        self._lock = threading.Condition()
+        self._active = Counter()
+        self._queued = Counter()
+        self._buckets = {}
+
+    def take_token(self, key, rate, burst):
+        # Returns 0 if a token was taken, otherwise the seconds until one is available
+        with self._lock:
+            now = time.monotonic()
+            tokens, updated = self._buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            if tokens >= 1:
+                self._buckets[key] = (tokens - 1, now)
+                return 0.0
+            self._buckets[key] = (tokens, now)
+            return (1 - tokens) / rate
+
+    def refund_token(self, key, rate, burst):
+        with self._lock:
+            if key in self._buckets:
+                tokens, updated = self._buckets[key]
+                self._buckets[key] = (min(burst, tokens + 1), updated)
+
+    def acquire(self, key, limit, max_queue, timeout):
+        with self._lock:
+            # New arrivals queue behind existing waiters instead of barging in when a slot frees up
+            if self._active[key] < limit and not self._queued[key]:
+                self._active[key] += 1
+                return True
+            if self._queued[key] >= max_queue:
+                return False
+            self._queued[key] += 1
+            try:
+                deadline = time.monotonic() + timeout
+                while self._active[key] >= limit:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return False
+                    self._lock.wait(remaining)
+                self._active[key] += 1
+                return True
+            finally:
+                self._queued[key] -= 1
+                if not self._queued[key]:
+                    del self._queued[key]
+
+    def release(self, key):
+        with self._lock:
+            self._active[key] -= 1
+            if self._active[key] <= 0:
+                del self._active[key]
+            self._lock.notify_all()
+
+
+class CacheAdmissionStore:
+    """
+    State in a shared Django cache (Redis in production) so limits hold across worker processes.
+    Counters use atomic incr/decr; the rate limit is a fixed window of `burst` requests per
+    `burst / rate` seconds, which allows the same average rate as the local token bucket.
+    Slot counters expire after `slot_ttl` so a crashed worker cannot hold a user's slots forever.
+    """
+
+    def __init__(self, alias, slot_ttl=300, poll_interval=0.05):
+        self.alias = alias
+        self.slot_ttl = slot_ttl
+        self.poll_interval = poll_interval
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def _incr(self, key, timeout):
+        self.cache.add(key, 0, timeout=timeout)
+        try:
+            return self.cache.incr(key)
+        except ValueError:
+            # Expired between add() and incr()
+            self.cache.set(key, 1, timeout=timeout)
+            return 1
+
+    def _decr(self, key):
+        try:
+            if self.cache.decr(key) < 0:
+                self.cache.set(key, 0, timeout=self.slot_ttl)
+        except ValueError:
+            pass
+
+    def take_token(self, key, rate, burst):
+        period = burst / rate
+        now = time.time()
+        window = int(now // period)
+        if self._incr(f"admission:window:{key}:{window}", int(period) + 1) <= burst:
+            return 0.0
+        return (window + 1) * period - now
+
+    def refund_token(self, key, rate, burst):
+        # Credits the current window; a refund that lands after the window rolled over is approximate
+        window = int(time.time() // (burst / rate))
+        try:
+            self.cache.decr(f"admission:window:{key}:{window}")
+        except ValueError:
+            pass
+
+    def _try_acquire(self, key, limit):
+        active_key = f"admission:active:{key}"
+        if self._incr(active_key, self.slot_ttl) <= limit:
+            self.cache.touch(active_key, self.slot_ttl)
+            return True
+        self._decr(active_key)
+        return False
+
+    def acquire(self, key, limit, max_queue, timeout):
+        if self._try_acquire(key, limit):
+            return True
+        queue_key = f"admission:queued:{key}"
+        try:
+            if self._incr(queue_key, int(timeout) + 1) > max_queue:
+                return False
+            deadline = time.monotonic() + timeout
+            while time.monotonic() < deadline:
+                time.sleep(self.poll_interval)
+                if self._try_acquire(key, limit):
+                    return True
+            return False
+        finally:
+            self._decr(queue_key)
+
+    def release(self, key):
+        self._decr(f"admission:active:{key}")
+
+
+class Ticket:
+    def __init__(self, store, key):
+        self._store = store
+        self._key = key
+        self._released = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self._store.release(self._key)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+
+class AdmissionController:
+    """
+    Fair admission for LLM-backed requests: each user gets a token bucket (rate, burst) and at most
+    `max_concurrent` requests in flight. Requests over the concurrency limit wait in a per-user queue
+    of `max_queue` for up to `queue_timeout` seconds; a full queue is rejected immediately. Only
+    admitted requests spend a rate token.
+    """
+
+    def __init__(self, store, max_concurrent, rate, burst, max_queue, queue_timeout, busy_retry_after=1.0):
+        self.store = store
+        self.max_concurrent = max_concurrent
+        self.rate = rate
+        self.burst = burst
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.busy_retry_after = busy_retry_after
+
+    def acquire(self, user_id):
+        key = str(user_id)
+        wait = self.store.take_token(key, self.rate, self.burst)
+        if wait > 0:
+            raise Rejected('rate_limited', wait)
+        if not self.store.acquire(key, self.max_concurrent, self.max_queue, self.queue_timeout):
+            # Nothing was served, so a request turned away for concurrency keeps its rate token
+            self.store.refund_token(key, self.rate, self.burst)
+            raise Rejected('too_many_concurrent_requests', self.busy_retry_after)
+        return Ticket(self.store, key)
+
+
+@functools.lru_cache(maxsize=None)
+def get_admission():
+    if settings.ADMISSION_STORE == "cache":
+        store = CacheAdmissionStore(settings.ADMISSION_CACHE_ALIAS, slot_ttl=settings.ADMISSION_SLOT_TTL)
+    else:
+        store = LocalAdmissionStore()
+    return AdmissionController(
+        store,
+        max_concurrent=settings.ADMISSION_MAX_CONCURRENT,
+        rate=settings.ADMISSION_RATE,
+        burst=settings.ADMISSION_BURST,
+        max_queue=settings.ADMISSION_MAX_QUEUE,
+        queue_timeout=settings.ADMISSION_QUEUE_TIMEOUT,
+        busy_retry_after=settings.ADMISSION_BUSY_RETRY_AFTER,
+    )
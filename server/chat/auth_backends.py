@@ -0,0 +1,41 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import caches
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+
+def _key(user_id):
+    return f"auth-user:{user_id}"
+
+
+def _cache():
+    return caches[settings.AUTH_USER_CACHE_ALIAS]
+
+
+class CachedModelBackend(ModelBackend):
+    """
+    ModelBackend that keeps the user loaded for each authenticated request in the cache for
+    AUTH_USER_CACHE_TTL seconds. Django still checks the session auth hash against the cached user, so a
+    password change logs other sessions out as before. Saves and deletes evict the entry; with a
+    per-process cache other processes may see the old row until the TTL runs out.
+    """
+
+    def get_user(self, user_id):
+        ttl = settings.AUTH_USER_CACHE_TTL
+        if ttl <= 0:
+            return super().get_user(user_id)
+        cache = _cache()
+        user = cache.get(_key(user_id))
+        if user is None:
+            user = super().get_user(user_id)
+            if user is not None:
+                cache.set(_key(user_id), user, ttl)
+        return user
+
+
+@receiver(post_save, sender=get_user_model())
+@receiver(post_delete, sender=get_user_model())
+def forget_user(sender, instance, **kwargs):
+    _cache().delete(_key(instance.pk))
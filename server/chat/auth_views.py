@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.models import User
 from rest_framework.decorators import api_view, permission_classes
@@ -24,7 +25,8 @@ def register(request):
         )
     
     user = User.objects.create_user(username=username, password=password)
-    login(request, user)
+    # Several backends are configured, so login() needs to be told which one vouched for the new user
+    login(request, user, backend=settings.AUTHENTICATION_BACKENDS[0])
     
     return Response({
         "message": "User registered successfully",
@@ -0,0 +1,40 @@
+import json
+
+from channels.generic.websocket import AsyncWebsocketConsumer
+
+from .events import group_name
+from .metrics import WEBSOCKET_CONNECTIONS
+
+
+class EventConsumer(AsyncWebsocketConsumer):
+    """Pushes the signed-in user's events (see events.py); the socket is receive-only apart from pings."""
+
+    group = None
+
+    async def connect(self):
+        user = self.scope.get('user')
+        if user is None or not user.is_authenticated:
+            await self.close()
+            return
+        self.group = group_name(user.pk)
+        await self.channel_layer.group_add(self.group, self.channel_name)
+        await self.accept()
+        WEBSOCKET_CONNECTIONS.inc()
+
+    async def disconnect(self, code):
+        if self.group is None:
+            return
+        await self.channel_layer.group_discard(self.group, self.channel_name)
+        WEBSOCKET_CONNECTIONS.dec()
+
+    async def receive(self, text_data=None, bytes_data=None):
+        # Application-level keepalive for clients behind proxies that drop idle connections
+        try:
+            message = json.loads(text_data or '')
+        except ValueError:
+            return
+        if isinstance(message, dict) and message.get('type') == 'ping':
+            await self.send(text_data=json.dumps({"event": "pong"}))
+
+    async def chat_event(self, event):
+        await self.send(text_data=event['text'])
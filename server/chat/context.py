@@ -0,0 +1,114 @@
+import logging
+
+from django.conf import settings
+
+from .llm import generate_text
+from .threads import active_path
+
+logger = logging.getLogger(__name__)
+
+
+def estimate_tokens(text):
+    # Roughly four characters per token for English text; cheap enough to run on every turn
+    return (len(text) + 3) // 4
+
+
+def format_turn(message):
+    return f"{message.sender}: {message.content}"
+
+
+def fold_into_summary(previous_summary, messages):
+    transcript = "\n".join(format_turn(m) for m in messages)
+    prompt = (
+        "You maintain a running summary of a conversation so it can be continued later.\n"
+        f"Current summary:\n{previous_summary or '(empty)'}\n\n"
+        f"New turns:\n{transcript}\n\n"
+        f"Rewrite the summary to include the new turns in at most {settings.CONTEXT_SUMMARY_WORDS} words. "
+        "Keep names, facts, decisions and open questions. Return only the summary."
+    )
+    return generate_text(prompt, site='context_summary')
+
+
+def _fit_recent(newest, available, max_recent):
+    # newest: messages newest first; keeps as many as fit the token budget
+    recent = []
+    recent_tokens = 0
+    for message in newest[:max_recent]:
+        tokens = estimate_tokens(format_turn(message))
+        if recent_tokens + tokens > available:
+            break
+        recent.append(message)
+        recent_tokens += tokens
+    return recent, recent_tokens
+
+
+def _assemble(conversation, summary, recent, recent_tokens, truncated, user_message):
+    budget = settings.CONTEXT_TOKEN_BUDGET
+    summary_tokens = estimate_tokens(summary)
+    if summary_tokens > budget // 2:
+        summary = summary[:(budget // 2) * 4]
+        summary_tokens = estimate_tokens(summary)
+
+    parts = []
+    if summary:
+        parts.append(f"Summary of earlier conversation:\n{summary}\n")
+    context = "\n".join(format_turn(m) for m in reversed(recent))
+    parts.append(f"Conversation so far:\n{context}\nUser: {user_message.content}\nAI:")
+    prompt = "\n".join(parts)
+
+    metrics = {
+        "prompt_tokens": estimate_tokens(prompt),
+        "summary_tokens": summary_tokens,
+        "recent_messages": len(recent),
+        "recent_tokens": recent_tokens,
+        "truncated": truncated,
+        "token_budget": budget,
+    }
+    logger.info(f"Built prompt for conversation {conversation.pk}: {metrics}")
+    return prompt, metrics
+
+
+def build_prompt(conversation, user_message):
+    """
+    Build the prompt for `user_message` (already saved) from the persisted rolling summary plus the
+    newest unsummarized turns that fit the token budget. Only messages newer than the summary are
+    read, so the cost of a turn does not grow with the length of the conversation. Messages in a
+    branch (with a parent) get the context of their own path instead of the mainline.
+
+    No LLM call happens here: when older unsummarized turns did not fit, metrics["truncated"] is set
+    and the caller schedules the rolling summary job to fold them.
+    """
+    if user_message.parent_id is not None:
+        return _build_branch_prompt(conversation, user_message)
+
+    budget = settings.CONTEXT_TOKEN_BUDGET
+    max_recent = settings.CONTEXT_RECENT_MESSAGES
+    summarized_upto = conversation.context_summary_message_id or 0
+    summary = conversation.context_summary or ""
+
+    history = conversation.messages.filter(parent__isnull=True, id__gt=summarized_upto, id__lt=user_message.id)
+    newest = list(history.order_by('-id')[:max_recent + 1])
+
+    available = budget - estimate_tokens(user_message.content) - estimate_tokens(summary)
+    recent, recent_tokens = _fit_recent(newest, available, max_recent)
+
+    truncated = len(recent) < len(newest)
+    return _assemble(conversation, summary, recent, recent_tokens, truncated, user_message)
+
+
+def _build_branch_prompt(conversation, user_message):
+    # The mainline summary only applies if everything it covers comes before the fork point; branch
+    # prompts never schedule a fold, since the persisted summary belongs to the mainline
+    max_recent = settings.CONTEXT_RECENT_MESSAGES
+    path = active_path(conversation, user_message.parent_id, prefix_limit=max_recent + 1)
+    fork = next((m for m in reversed(path) if m.parent_id is None), None)
+    summarized_upto = conversation.context_summary_message_id or 0
+
+    summary = ""
+    if summarized_upto and fork is not None and fork.id >= summarized_upto:
+        summary = conversation.context_summary or ""
+        path = [m for m in path if m.parent_id is not None or m.id > summarized_upto]
+
+    available = settings.CONTEXT_TOKEN_BUDGET - estimate_tokens(user_message.content) - estimate_tokens(summary)
+    recent, recent_tokens = _fit_recent(list(reversed(path)), available, max_recent)
+    return _assemble(conversation, summary, recent, recent_tokens, False, user_message)
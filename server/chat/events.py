@@ -0,0 +1,71 @@
+import json
+import logging
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+
+from .metrics import EVENTS_PUBLISHED
+
+logger = logging.getLogger(__name__)
+
+# Per-user events pushed to the user's WebSocket connections (see consumers.EventConsumer). Fan-out goes
+# through the channel layer configured in CHANNEL_LAYERS: in memory for a single process, Redis when web
+# servers and job workers run as separate processes. Events are hints for the client to patch its state;
+# anything missed while disconnected is recovered by refetching over REST.
+
+CONVERSATION_FIELDS = ('id', 'title', 'status', 'summary_status', 'is_archived', 'version', 'updated_at')
+
+
+def group_name(user_id):
+    return f"events.user.{user_id}"
+
+
+def publish(user_id, event, **data):
+    """Send an event to the user's connections once the current transaction commits; dropped on rollback."""
+    if user_id is None:
+        return
+    text = json.dumps({"event": event, **data}, cls=DjangoJSONEncoder)
+    transaction.on_commit(lambda: _send(user_id, event, text))
+
+
+def _send(user_id, event, text):
+    layer = get_channel_layer()
+    if layer is None:
+        return
+    try:
+        # Encoded once here rather than per connection in the consumer
+        async_to_sync(layer.group_send)(group_name(user_id), {"type": "chat.event", "text": text})
+    except Exception as e:
+        logger.warning(f"Could not publish {event} to user {user_id}: {str(e)}")
+        return
+    EVENTS_PUBLISHED.inc(event=event)
+
+
+def conversation_data(conversation):
+    return {field: getattr(conversation, field) for field in CONVERSATION_FIELDS}
+
+
+def conversation_changed(event, conversation, **data):
+    publish(conversation.user_id, event, conversation=conversation_data(conversation), **data)
+
+
+def message_created(message, user_id, version=None):
+    from .serializers import MessageSerializer
+
+    publish(
+        user_id, 'message.created',
+        conversation_id=message.conversation_id, version=version, message=MessageSerializer(message).data,
+    )
+
+
+def job_finished(job):
+    if job.conversation_id:
+        user_id = job.conversation.user_id
+    else:
+        user_id = (job.payload or {}).get('user_id')
+    publish(
+        user_id, 'job.finished',
+        job={'id': job.pk, 'kind': job.kind, 'status': job.status, 'conversation_id': job.conversation_id},
+    )
@@ -0,0 +1,190 @@
+import json
+import zipfile
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+from django.utils.text import slugify
+
+from .models import Conversation, Message
+
+MESSAGE_FIELDS = ('conversation_id', 'sender', 'content', 'timestamp')
+
+
+def _isoformat(value):
+    return value.isoformat() if value else None
+
+
+def conversation_data(conversation):
+    return {
+        'id': conversation.id,
+        'title': conversation.title,
+        'start_time': _isoformat(conversation.start_time),
+        'end_time': _isoformat(conversation.end_time),
+        'status': conversation.status,
+        'summary': conversation.summary,
+        'key_points': conversation.key_points,
+    }
+
+
+def message_data(message):
+    return {
+        'sender': message['sender'],
+        'content': message['content'],
+        'timestamp': _isoformat(message['timestamp']),
+    }
+
+
+def _messages(queryset):
+    return queryset.order_by('timestamp', 'id').values(*MESSAGE_FIELDS).iterator(chunk_size=settings.EXPORT_CHUNK_SIZE)
+
+
+def _dumps(data, **kwargs):
+    return json.dumps(data, default=str, **kwargs)
+
+
+def json_chunks(conversation):
+    """Yield the conversation as one JSON document, writing messages as they are read from the database."""
+    head = _dumps(conversation_data(conversation), indent=2)
+    yield head[:-2] + ',\n  "messages": ['
+    separator = '\n    '
+    for message in _messages(conversation.messages.all()):
+        yield separator + _dumps(message_data(message))
+        separator = ',\n    '
+    yield '\n  ]\n}\n'
+
+
+def _markdown_header(conversation):
+    header = f"# {conversation.title}\n\n**Start Time:** {conversation.start_time}\n\n"
+    if conversation.end_time:
+        header += f"**End Time:** {conversation.end_time}\n\n"
+    if conversation.summary:
+        header += f"## Summary\n\n{conversation.summary}\n\n"
+    return header + "## Messages\n\n"
+
+
+def _markdown_message(message):
+    sender_label = "**User:**" if message['sender'] == "user" else "**AI:**"
+    return f"{sender_label}\n\n{message['content']}\n\n---\n\n"
+
+
+def markdown_chunks(conversation):
+    yield _markdown_header(conversation)
+    for message in _messages(conversation.messages.all()):
+        yield _markdown_message(message)
+
+
+def _with_messages(user):
+    """
+    Yield (conversation, messages) for every conversation of `user` using two server-side cursors
+    ordered by conversation id, so the whole history is read in two queries with bounded memory.
+    `messages` is an iterator that must be consumed before advancing to the next conversation.
+    """
+    conversations = Conversation.objects.filter(user=user).order_by('id').iterator(
+        chunk_size=settings.EXPORT_CHUNK_SIZE
+    )
+    messages = (
+        Message.objects.filter(conversation__user=user)
+        .order_by('conversation_id', 'timestamp', 'id')
+        .values(*MESSAGE_FIELDS)
+        .iterator(chunk_size=settings.EXPORT_CHUNK_SIZE)
+    )
+    pending = next(messages, None)
+
+    def take(conversation_id):
+        nonlocal pending
+        while pending is not None and pending['conversation_id'] < conversation_id:
+            pending = next(messages, None)
+        while pending is not None and pending['conversation_id'] == conversation_id:
+            yield pending
+            pending = next(messages, None)
+
+    for conversation in conversations:
+        yield conversation, take(conversation.id)
+
+
+def ndjson_chunks(user):
+    """One JSON record per line: each conversation followed by its messages."""
+    for conversation, messages in _with_messages(user):
+        yield _dumps({'type': 'conversation', **conversation_data(conversation)}) + '\n'
+        for message in messages:
+            yield _dumps({'type': 'message', 'conversation_id': conversation.id, **message_data(message)}) + '\n'
+
+
+class _ZipStream:
+    # Write-only, unseekable file object; zipfile falls back to data descriptors and we drain the bytes between writes
+    def __init__(self):
+        self._chunks = []
+        self.buffered = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self.buffered += len(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        self.buffered = 0
+        return data
+
+
+def archive_name(conversation):
+    slug = slugify(conversation.title)[:50] or 'conversation'
+    return f"{conversation.start_time:%Y-%m-%d}_{slug}_{conversation.id}.md"
+
+
+def zip_chunks(user):
+    """Stream a ZIP of one Markdown file per conversation without buffering the archive."""
+    stream = _ZipStream()
+    with zipfile.ZipFile(stream, mode='w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for conversation, messages in _with_messages(user):
+            info = zipfile.ZipInfo(archive_name(conversation), date_time=conversation.start_time.timetuple()[:6])
+            info.compress_type = zipfile.ZIP_DEFLATED
+            with archive.open(info, mode='w', force_zip64=True) as entry:
+                entry.write(_markdown_header(conversation).encode())
+                for message in messages:
+                    entry.write(_markdown_message(message).encode())
+                    if stream.buffered >= settings.EXPORT_ZIP_FLUSH_BYTES:
+                        yield stream.drain()
+            yield stream.drain()
+    yield stream.drain()
+
+
+def _take(chunks):
+    # Join chunks up to EXPORT_STREAM_BYTES so each thread hop carries a useful amount of data
+    batch, size = [], 0
+    for chunk in chunks:
+        data = chunk.encode() if isinstance(chunk, str) else chunk
+        batch.append(data)
+        size += len(data)
+        if size >= settings.EXPORT_STREAM_BYTES:
+            break
+    return b''.join(batch)
+
+
+async def _async_chunks(chunks):
+    """
+    Serve a sync chunk generator as an async iterator. Every step runs on the thread-sensitive executor, so
+    the server-side cursors stay on the connection that opened them.
+    """
+    take = sync_to_async(_take, thread_sensitive=True)
+    try:
+        while data := await take(chunks):
+            yield data
+    finally:
+        await sync_to_async(chunks.close, thread_sensitive=True)()
+
+
+def streaming_response(request, chunks, content_type):
+    """
+    StreamingHttpResponse that really streams under both servers: ASGI drains sync iterators into a list
+    before sending the first byte, and WSGI does the same with async ones.
+    """
+    if isinstance(getattr(request, '_request', request), ASGIRequest):
+        chunks = _async_chunks(chunks)
+    return StreamingHttpResponse(chunks, content_type=content_type)
@@ -0,0 +1,112 @@
+import asyncio
+import json
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+
+from .context import estimate_tokens, format_turn
+from .llm import get_client
+
+EXTRACTION_PROMPT = (
+    "Analyze the conversation below and respond with a single JSON object with exactly these keys:\n"
+    '  "summary": a brief summary of the conversation (string),\n'
+    '  "key_points": 3-5 key points (array of strings),\n'
+    '  "insights": insights and analysis from the conversation (string).\n'
+    "Respond with JSON only.\n\n"
+    "{source}"
+)
+
+CHUNK_NOTES_PROMPT = (
+    "This is part {index} of {total} of a longer conversation. Write concise notes covering its topics, "
+    "facts, decisions and open questions so the whole conversation can be summarized from the notes later.\n\n"
+    "{chunk}"
+)
+
+
+class ExtractionError(ValueError):
+    pass
+
+
+def build_transcript(messages):
+    return "\n".join(format_turn(m) for m in messages)
+
+
+def split_transcript(transcript, max_tokens):
+    max_chars = max_tokens * 4
+    chunks = []
+    current = []
+    size = 0
+    for line in transcript.split("\n"):
+        while len(line) > max_chars:
+            chunks.append(line[:max_chars])
+            line = line[max_chars:]
+        if size + len(line) > max_chars and current:
+            chunks.append("\n".join(current))
+            current = []
+            size = 0
+        current.append(line)
+        size += len(line) + 1
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
+
+def parse_extraction(content):
+    text = content.strip()
+    if text.startswith("```"):
+        text = text.strip("`")
+        if text.lower().startswith("json"):
+            text = text[4:]
+    try:
+        data = json.loads(text)
+    except (json.JSONDecodeError, ValueError, TypeError) as e:
+        raise ExtractionError(f"Extraction response is not valid JSON: {str(e)}")
+
+    if not isinstance(data, dict):
+        raise ExtractionError("Extraction response is not a JSON object")
+    summary = data.get("summary")
+    key_points = data.get("key_points")
+    insights = data.get("insights")
+    if not isinstance(summary, str) or not summary.strip():
+        raise ExtractionError("Extraction response has no summary")
+    if isinstance(key_points, str):
+        key_points = [key_points]
+    if not isinstance(key_points, list) or not all(isinstance(p, str) for p in key_points):
+        raise ExtractionError("Extraction key_points must be an array of strings")
+    if not isinstance(insights, str):
+        raise ExtractionError("Extraction insights must be a string")
+
+    return {
+        "summary": summary.strip(),
+        "key_points": [p.strip() for p in key_points if p.strip()][:10],
+        "insights": insights.strip(),
+    }
+
+
+async def aextract(transcript, client):
+    """
+    Produce summary, key points and insights in one structured call. Transcripts over the context
+    budget are first condensed chunk by chunk (map), then the notes are extracted from (reduce).
+    """
+    source = transcript
+    while estimate_tokens(source) > settings.EXTRACTION_MAX_TOKENS:
+        chunks = split_transcript(source, settings.EXTRACTION_CHUNK_TOKENS)
+        notes = await asyncio.gather(*(
+            client.generate(
+                CHUNK_NOTES_PROMPT.format(index=i + 1, total=len(chunks), chunk=chunk), site='extraction_notes'
+            )
+            for i, chunk in enumerate(chunks)
+        ))
+        condensed = "\n\n".join(f"Notes for part {i + 1}:\n{n}" for i, n in enumerate(notes))
+        if len(condensed) >= len(source):
+            # The notes did not shrink the input; cut it rather than loop forever
+            source = condensed[:settings.EXTRACTION_MAX_TOKENS * 4]
+            break
+        source = condensed
+
+    content = await client.generate(EXTRACTION_PROMPT.format(source=source), json_output=True, site='extraction')
+    return parse_extraction(content)
+
+
+def extract(transcript, client=None):
+    return async_to_sync(aextract)(transcript, client or get_client())
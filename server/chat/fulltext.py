@@ -0,0 +1,119 @@
+from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchRank
+from django.db.models import Count, F, FloatField, Q, Value
+from django.db.models.functions import Cast, Replace
+
+from .models import Conversation, Message
+from .pagination import decode_cursor, encode_cursor
+
+SEARCH_CONFIG = 'english'
+CONVERSATION_RESULTS = 10
+
+
+def _escaped(field):
+    # ts_headline returns the stored text as is, so escape it first and only the <mark> tags are markup
+    expression = F(field)
+    for char, entity in (('&', '&amp;'), ('<', '&lt;'), ('>', '&gt;')):
+        expression = Replace(expression, Value(char), Value(entity))
+    return expression
+
+
+def _headline(field, query):
+    return SearchHeadline(
+        _escaped(field),
+        query,
+        config=SEARCH_CONFIG,
+        start_sel='<mark>',
+        stop_sel='</mark>',
+        max_words=35,
+        min_words=15,
+    )
+
+
+def keyword_search(user, text, status=None, archived=None, date_from=None, date_to=None, cursor=None, limit=20):
+    """
+    Ranked keyword search over message content and conversation title/summary, using the
+    trigger-maintained tsvector columns and their GIN indexes. Messages are paged with a
+    (rank, id) keyset cursor; matching conversations and facets are only returned on the first
+    page (no cursor), so paging does not re-aggregate the whole match set.
+    """
+    query = SearchQuery(text, search_type='websearch', config=SEARCH_CONFIG)
+
+    messages = Message.objects.filter(conversation__user=user, search_vector=query)
+    conversations = Conversation.objects.filter(user=user, search_vector=query)
+    if date_from:
+        messages = messages.filter(timestamp__date__gte=date_from)
+        conversations = conversations.filter(start_time__date__gte=date_from)
+    if date_to:
+        messages = messages.filter(timestamp__date__lte=date_to)
+        conversations = conversations.filter(start_time__date__lte=date_to)
+
+    # Facets are counted before the status/archived filters so the client can show every option
+    facets = None
+    if not cursor:
+        counts = messages.aggregate(
+            total=Count('id'),
+            active=Count('id', filter=Q(conversation__status='active')),
+            ended=Count('id', filter=Q(conversation__status='ended')),
+            archived=Count('id', filter=Q(conversation__is_archived=True)),
+            unarchived=Count('id', filter=Q(conversation__is_archived=False)),
+        )
+        facets = {
+            "total": counts['total'],
+            "status": {"active": counts['active'], "ended": counts['ended']},
+            "archived": {"true": counts['archived'], "false": counts['unarchived']},
+        }
+
+    if status:
+        messages = messages.filter(conversation__status=status)
+        conversations = conversations.filter(status=status)
+    if archived is not None:
+        messages = messages.filter(conversation__is_archived=archived)
+        conversations = conversations.filter(is_archived=archived)
+
+    # ts_rank returns a real; casting to double precision makes the value round-trip through the cursor exactly
+    ranked = messages.annotate(
+        rank=Cast(SearchRank(F('search_vector'), query), FloatField())
+    ).order_by('-rank', '-id')
+    if cursor:
+        position = decode_cursor(cursor, rank=(int, float), id=int)
+        ranked = ranked.filter(Q(rank__lt=position['rank']) | Q(rank=position['rank'], id__lt=position['id']))
+
+    page = list(
+        ranked.annotate(headline=_headline('content', query))
+        .values('id', 'conversation_id', 'conversation__title', 'sender', 'timestamp', 'rank', 'headline')[:limit + 1]
+    )
+    next_cursor = None
+    if len(page) > limit:
+        page = page[:limit]
+        next_cursor = encode_cursor({"rank": page[-1]['rank'], "id": page[-1]['id']})
+
+    conversation_hits = []
+    if not cursor:
+        conversation_hits = list(
+            conversations.annotate(
+                rank=SearchRank(F('search_vector'), query),
+                title_headline=_headline('title', query),
+                headline=_headline('summary', query),
+            )
+            .order_by('-rank', '-start_time')
+            .values('id', 'title', 'status', 'is_archived', 'start_time', 'rank', 'title_headline', 'headline')[:CONVERSATION_RESULTS]
+        )
+
+    return {
+        "query": text,
+        "conversations": conversation_hits,
+        "messages": [
+            {
+                "id": m['id'],
+                "conversation_id": m['conversation_id'],
+                "conversation_title": m['conversation__title'],
+                "sender": m['sender'],
+                "timestamp": m['timestamp'],
+                "rank": m['rank'],
+                "headline": m['headline'],
+            }
+            for m in page
+        ],
+        "facets": facets,
+        "next_cursor": next_cursor,
+    }
@@ -0,0 +1,96 @@
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .events import job_finished
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+HANDLERS = {}
+
+
+def handler(kind, on_failure=None):
+    def decorator(func):
+        func.on_failure = on_failure
+        HANDLERS[kind] = func
+        return func
+    return decorator
+
+
+def enqueue(kind, conversation=None, key=None, payload=None, max_attempts=None):
+    """
+    Create a job unless one with the same idempotency key already exists; returns the job. A job that
+    failed for good is reset and runs again, so asking for the same work later is not a dead end.
+    """
+    key = key or f"{kind}:{conversation.pk}"
+    job, created = Job.objects.get_or_create(
+        idempotency_key=key,
+        defaults={
+            'kind': kind,
+            'conversation': conversation,
+            'payload': payload,
+            'max_attempts': max_attempts or settings.JOB_MAX_ATTEMPTS,
+        }
+    )
+    if not created and job.status == 'failed':
+        # Conditional, so concurrent callers reset the job once
+        Job.objects.filter(pk=job.pk, status='failed').update(
+            status='pending', attempts=0, run_after=timezone.now(), locked_at=None, updated_at=timezone.now()
+        )
+        job.refresh_from_db()
+    return job
+
+
+def claim(limit):
+    now = timezone.now()
+    stale = now - timedelta(seconds=settings.JOB_LEASE_SECONDS)
+    with transaction.atomic():
+        jobs = list(
+            Job.objects.select_for_update(skip_locked=True)
+            .filter(
+                Q(status='pending', run_after__lte=now) |
+                Q(status='processing', locked_at__lt=stale)
+            )
+            .order_by('run_after')[:limit]
+        )
+        for job in jobs:
+            job.status = 'processing'
+            job.attempts += 1
+            job.locked_at = now
+            job.save(update_fields=['status', 'attempts', 'locked_at', 'updated_at'])
+    return jobs
+
+
+def run(job):
+    func = HANDLERS.get(job.kind)
+    try:
+        if func is None:
+            raise ValueError(f"No handler registered for job kind '{job.kind}'")
+        result = func(job)
+    except Exception as e:
+        logger.error(f"Job {job.pk} ({job.kind}) attempt {job.attempts} failed: {str(e)}", exc_info=True)
+        job.last_error = str(e)
+        job.locked_at = None
+        if job.attempts < job.max_attempts:
+            job.status = 'pending'
+            job.run_after = timezone.now() + timedelta(seconds=settings.JOB_RETRY_BACKOFF * 2 ** (job.attempts - 1))
+        else:
+            job.status = 'failed'
+            if func is not None and func.on_failure:
+                func.on_failure(job)
+        job.save(update_fields=['status', 'run_after', 'last_error', 'locked_at', 'updated_at'])
+        if job.status == 'failed':
+            job_finished(job)
+        return job
+
+    job.status = 'done'
+    job.result = result
+    job.locked_at = None
+    job.save(update_fields=['status', 'result', 'locked_at', 'updated_at'])
+    job_finished(job)
+    return job
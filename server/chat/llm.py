@@ -0,0 +1,330 @@
+import asyncio
+import contextlib
+import functools
+import hashlib
+import json
+import random
+import re
+import time
+
+import google.generativeai as genai
+from asgiref.sync import async_to_sync
+from django.conf import settings
+
+from . import metrics
+from .resilience import CircuitBreaker, CircuitOpenError, RetryPolicy, SharedSemaphore, TransientLLMError, hedged
+
+
+class LLMTimeoutError(TimeoutError):
+    # Not retried: a stalled upstream already used the whole LLM_TIMEOUT, and retrying would multiply it
+    pass
+
+
+class GeminiProvider:
+    def __init__(self, model_name, embedding_model):
+        genai.configure(api_key=settings.GEMINI_API_KEY)
+        self.model_name = model_name
+        self.embedding_model = embedding_model
+        self.model = genai.GenerativeModel(model_name)
+
+    async def generate(self, prompt, json_output=False):
+        generation_config = {"response_mime_type": "application/json"} if json_output else None
+        response = await self.model.generate_content_async(prompt, generation_config=generation_config)
+        return response.text.strip()
+
+    async def stream(self, prompt):
+        response = await self.model.generate_content_async(prompt, stream=True)
+        async for chunk in response:
+            try:
+                text = chunk.text
+            except ValueError:
+                # Chunks without text parts (e.g. safety-blocked) have nothing to forward
+                continue
+            if text:
+                yield text
+
+    async def embed(self, texts, task_type='retrieval_document'):
+        result = await genai.embed_content_async(model=self.embedding_model, content=texts, task_type=task_type)
+        return result['embedding']
+
+
+class FakeProvider:
+    """Deterministic offline stand-in for Gemini, used for local development and load tests."""
+
+    def __init__(self, reply=None, latency=0.0, chunk_size=8, chunk_delay=0.0):
+        self.model_name = "fake"
+        self.embedding_model = "fake-hashing"
+        self.reply = reply or "This is a response from the fake LLM provider."
+        self.latency = latency
+        self.chunk_size = chunk_size
+        self.chunk_delay = chunk_delay
+
+    async def generate(self, prompt, json_output=False):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if json_output:
+            return json.dumps({"summary": self.reply, "key_points": [self.reply], "insights": self.reply})
+        return self.reply
+
+    async def stream(self, prompt):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        for i in range(0, len(self.reply), self.chunk_size):
+            if self.chunk_delay:
+                await asyncio.sleep(self.chunk_delay)
+            yield self.reply[i:i + self.chunk_size]
+
+    async def embed(self, texts, task_type='retrieval_document', dimensions=256):
+        # Hashed bag of words: texts sharing words land close together, which is enough for offline search
+        vectors = []
+        for text in texts:
+            vector = [0.0] * dimensions
+            for word in re.findall(r"\w+", text.lower()):
+                vector[int(hashlib.md5(word.encode()).hexdigest()[:8], 16) % dimensions] += 1.0
+            vectors.append(vector)
+        return vectors
+
+
+class FaultyProvider:
+    """
+    Wraps another provider and injects failures: a share of calls raise a transient error and a share
+    stall for `slow_latency` seconds before answering. Used to exercise retries, the breaker and hedging.
+    """
+
+    def __init__(self, provider, error_rate=0.0, slow_rate=0.0, slow_latency=5.0, seed=None):
+        self.provider = provider
+        self.error_rate = error_rate
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self._random = random.Random(seed)
+
+    @property
+    def model_name(self):
+        return self.provider.model_name
+
+    @property
+    def embedding_model(self):
+        return self.provider.embedding_model
+
+    async def _inject(self):
+        roll = self._random.random()
+        if roll < self.error_rate:
+            raise TransientLLMError("Injected upstream failure")
+        if roll < self.error_rate + self.slow_rate:
+            await asyncio.sleep(self.slow_latency)
+
+    async def generate(self, prompt, json_output=False):
+        await self._inject()
+        return await self.provider.generate(prompt, json_output=json_output)
+
+    async def stream(self, prompt):
+        await self._inject()
+        async for chunk in self.provider.stream(prompt):
+            yield chunk
+
+    async def embed(self, texts, task_type='retrieval_document'):
+        await self._inject()
+        return await self.provider.embed(texts, task_type=task_type)
+
+
+class LLMClient:
+    """
+    Async front door for every LLM call. Timeouts cancel the upstream coroutine instead of
+    abandoning a worker thread, and at most `max_concurrency` calls run at once in the process,
+    whichever event loop or thread they come from.
+    Transient failures are retried with jittered backoff, a circuit breaker fails calls fast while
+    the provider is unhealthy, and with `hedge_after` set a slow call is raced against a second copy.
+    """
+
+    def __init__(self, provider, timeout=30, max_concurrency=64, retry=None, breaker=None, hedge_after=None):
+        self.provider = provider
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self.retry = retry or RetryPolicy(attempts=1)
+        self.breaker = breaker
+        self.hedge_after = hedge_after
+        self._slots = SharedSemaphore(max_concurrency)
+
+    @property
+    def model_name(self):
+        return self.provider.model_name
+
+    @property
+    def embedding_model(self):
+        return self.provider.embedding_model
+
+    @contextlib.asynccontextmanager
+    async def _slot(self):
+        metrics.LLM_WAITING.inc()
+        try:
+            await self._slots.acquire()
+        finally:
+            metrics.LLM_WAITING.dec()
+        metrics.LLM_IN_FLIGHT.inc()
+        try:
+            yield
+        finally:
+            metrics.LLM_IN_FLIGHT.dec()
+            self._slots.release()
+
+    async def _attempt(self, make_call, timeout):
+        async with self._slot():
+            try:
+                return await asyncio.wait_for(make_call(), timeout)
+            except asyncio.TimeoutError:
+                raise LLMTimeoutError(f"Request timed out after {timeout} seconds")
+
+    def _observe(self, site, operation, started, error=None):
+        if error is None:
+            outcome = 'ok'
+        elif isinstance(error, CircuitOpenError):
+            outcome = 'circuit_open'
+        elif isinstance(error, LLMTimeoutError):
+            outcome = 'timeout'
+        else:
+            outcome = 'error'
+        metrics.LLM_CALLS.inc(site=site, operation=operation, outcome=outcome)
+        metrics.LLM_CALL_DURATION.observe(
+            time.perf_counter() - started, site=site, operation=operation, outcome=outcome
+        )
+
+    async def _call(self, make_call, timeout, site, operation, prompt_chars):
+        metrics.LLM_PROMPT_CHARS.observe(prompt_chars, site=site, operation=operation)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        clock = time.perf_counter()
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                if self.breaker:
+                    self.breaker.before_call()
+                if self.hedge_after:
+                    result = await hedged(lambda: self._attempt(make_call, timeout), self.hedge_after)
+                else:
+                    result = await self._attempt(make_call, timeout)
+            except CircuitOpenError as e:
+                self._observe(site, operation, clock, e)
+                raise
+            except Exception as e:
+                if self.breaker:
+                    self.breaker.record(e)
+                delay = self.retry.next_delay(e, attempt, loop.time() - started)
+                if delay is None:
+                    self._observe(site, operation, clock, e)
+                    raise
+                metrics.LLM_RETRIES.inc(site=site, operation=operation)
+                await asyncio.sleep(delay)
+                continue
+            if self.breaker:
+                self.breaker.record_success()
+            self._observe(site, operation, clock)
+            if isinstance(result, str):
+                metrics.LLM_RESPONSE_CHARS.observe(len(result), site=site, operation=operation)
+            return result
+
+    async def generate(self, prompt, timeout=None, json_output=False, site='other'):
+        return await self._call(
+            lambda: self.provider.generate(prompt, json_output=json_output),
+            timeout or self.timeout, site, 'generate', len(prompt),
+        )
+
+    async def embed(self, texts, task_type='retrieval_document', timeout=None, site='other'):
+        return await self._call(
+            lambda: self.provider.embed(texts, task_type=task_type),
+            timeout or self.timeout, site, 'embed', sum(len(text) for text in texts),
+        )
+
+    async def stream(self, prompt, timeout=None, site='other'):
+        # Only failures before the first chunk are retried; after that the caller has already forwarded text
+        metrics.LLM_PROMPT_CHARS.observe(len(prompt), site=site, operation='stream')
+        timeout = timeout or self.timeout
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        clock = time.perf_counter()
+        attempt = 0
+        while True:
+            attempt += 1
+            received = 0
+            try:
+                if self.breaker:
+                    self.breaker.before_call()
+                deadline = loop.time() + timeout
+                async with self._slot():
+                    chunks = self.provider.stream(prompt)
+                    try:
+                        while True:
+                            remaining = deadline - loop.time()
+                            if remaining <= 0:
+                                raise LLMTimeoutError(f"Request timed out after {timeout} seconds")
+                            try:
+                                chunk = await asyncio.wait_for(chunks.__anext__(), remaining)
+                            except StopAsyncIteration:
+                                break
+                            except asyncio.TimeoutError:
+                                raise LLMTimeoutError(f"Request timed out after {timeout} seconds")
+                            received += len(chunk)
+                            yield chunk
+                    finally:
+                        await chunks.aclose()
+            except CircuitOpenError as e:
+                self._observe(site, 'stream', clock, e)
+                raise
+            except Exception as e:
+                if self.breaker:
+                    self.breaker.record(e)
+                delay = None if received else self.retry.next_delay(e, attempt, loop.time() - started)
+                if delay is None:
+                    self._observe(site, 'stream', clock, e)
+                    raise
+                metrics.LLM_RETRIES.inc(site=site, operation='stream')
+                await asyncio.sleep(delay)
+                continue
+            if self.breaker:
+                self.breaker.record_success()
+            self._observe(site, 'stream', clock)
+            metrics.LLM_RESPONSE_CHARS.observe(received, site=site, operation='stream')
+            return
+
+
+@functools.lru_cache(maxsize=None)
+def get_provider():
+    if settings.LLM_PROVIDER in ("fake", "faulty"):
+        provider = FakeProvider(latency=settings.FAKE_LLM_LATENCY, chunk_delay=settings.FAKE_LLM_CHUNK_DELAY)
+        if settings.LLM_PROVIDER == "faulty":
+            provider = FaultyProvider(
+                provider,
+                error_rate=settings.FAKE_LLM_ERROR_RATE,
+                slow_rate=settings.FAKE_LLM_SLOW_RATE,
+                slow_latency=settings.FAKE_LLM_SLOW_LATENCY,
+            )
+        return provider
+    return GeminiProvider(settings.LLM_MODEL, settings.EMBEDDING_MODEL)
+
+
+@functools.lru_cache(maxsize=None)
+def get_client():
+    return LLMClient(
+        get_provider(),
+        timeout=settings.LLM_TIMEOUT,
+        max_concurrency=settings.LLM_MAX_CONCURRENCY,
+        retry=RetryPolicy(
+            attempts=settings.LLM_RETRY_ATTEMPTS,
+            base_delay=settings.LLM_RETRY_BASE_DELAY,
+            max_delay=settings.LLM_RETRY_MAX_DELAY,
+            budget=settings.LLM_RETRY_BUDGET,
+        ),
+        breaker=CircuitBreaker(
+            failure_threshold=settings.LLM_BREAKER_FAILURES,
+            reset_timeout=settings.LLM_BREAKER_RESET,
+        ),
+        hedge_after=settings.LLM_HEDGE_AFTER or None,
+    )
+
+
+def generate_text(prompt, json_output=False, site='other'):
+    return async_to_sync(get_client().generate)(prompt, json_output=json_output, site=site)
+
+
+def embed_texts(texts, task_type='retrieval_document', site='other'):
+    return async_to_sync(get_client().embed)(texts, task_type=task_type, site=site)
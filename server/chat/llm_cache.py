@@ -0,0 +1,112 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .metrics import LLM_CACHE_LOOKUPS
+
+MISSING = object()
+
+
+class LocalLRUCache:
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return MISSING
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return MISSING
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class ResponseCache:
+    """
+    Two-tier cache for LLM results keyed on a hash of model plus prompt: an in-process LRU in
+    front of a shared Django cache. Only scopes listed in LLM_CACHE_TTLS are cached.
+    """
+
+    def __init__(self, local, shared_alias=None):
+        self.local = local
+        self.shared_alias = shared_alias
+
+    @staticmethod
+    def make_key(model_name, prompt):
+        digest = hashlib.sha256(f"{model_name}\0{prompt}".encode()).hexdigest()
+        return f"llm:{digest}"
+
+    @property
+    def shared(self):
+        return caches[self.shared_alias] if self.shared_alias else None
+
+    def ttl(self, scope):
+        return settings.LLM_CACHE_TTLS.get(scope, 0) if scope else 0
+
+    def _count(self, scope, outcome):
+        LLM_CACHE_LOOKUPS.inc(scope=scope, outcome=outcome)
+
+    def get(self, scope, key):
+        value = self.local.get(key)
+        if value is not MISSING:
+            self._count(scope, 'local_hit')
+            return value
+        shared = self.shared
+        if shared is not None:
+            value = shared.get(key, MISSING)
+            if value is not MISSING:
+                self.local.set(key, value, self.ttl(scope))
+                self._count(scope, 'shared_hit')
+                return value
+        self._count(scope, 'miss')
+        return MISSING
+
+    def set(self, scope, key, value):
+        ttl = self.ttl(scope)
+        self.local.set(key, value, ttl)
+        shared = self.shared
+        if shared is not None:
+            shared.set(key, value, ttl)
+
+    def lookup(self, scope, model_name, prompt, bypass=False):
+        # MISSING when the scope is uncached, the lookup is bypassed, or nothing is stored yet
+        if not self.ttl(scope):
+            return MISSING
+        if bypass:
+            self._count(scope, 'bypass')
+            return MISSING
+        return self.get(scope, self.make_key(model_name, prompt))
+
+    def compute_and_set(self, scope, model_name, prompt, compute):
+        value = compute()
+        if self.ttl(scope):
+            self.set(scope, self.make_key(model_name, prompt), value)
+        return value
+
+    def get_or_compute(self, scope, model_name, prompt, compute, bypass=False):
+        value = self.lookup(scope, model_name, prompt, bypass=bypass)
+        if value is not MISSING:
+            return value
+        return self.compute_and_set(scope, model_name, prompt, compute)
+
+response_cache = ResponseCache(LocalLRUCache(settings.LLM_CACHE_LOCAL_MAX_ENTRIES), settings.LLM_CACHE_ALIAS)
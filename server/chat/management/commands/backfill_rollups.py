@@ -0,0 +1,18 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from chat.rollups import rebuild
+
+
+class Command(BaseCommand):
+    help = "Rebuild the per-user daily analytics rollups from conversations and messages"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Only rebuild rollups for this username')
+
+    def handle(self, *args, **options):
+        user_ids = None
+        if options['user']:
+            user_ids = list(User.objects.filter(username=options['user']).values_list('id', flat=True))
+        rows = rebuild(user_ids)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {rows} rollup rows"))
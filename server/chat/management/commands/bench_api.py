@@ -0,0 +1,260 @@
+import json
+import statistics
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.test import APIClient
+
+from chat import admission, llm
+from chat.models import Conversation, Message
+
+
+class Rollback(Exception):
+    pass
+
+
+def _conversation(ctx, i):
+    return ctx['conversations'][i % len(ctx['conversations'])]
+
+
+def _message(ctx, i):
+    return ctx['messages'][i % len(ctx['messages'])]
+
+
+def _batch(items, i, size=20):
+    start = (i * size) % max(len(items) - size, 1)
+    return [str(item) for item in items[start:start + size]]
+
+
+# name -> (method, build(ctx, i) returning (path, data))
+SCENARIOS = {
+    'conversations.list': ('get', lambda ctx, i: ("/api/conversations/", None)),
+    'conversations.create': ('post', lambda ctx, i: ("/api/conversations/", {"title": f"Bench {i}"})),
+    'conversations.retrieve': ('get', lambda ctx, i: (f"/api/conversations/{_conversation(ctx, i)}/", None)),
+    'conversations.partial_update': (
+        'patch', lambda ctx, i: (f"/api/conversations/{_conversation(ctx, i)}/", {"title": f"Renamed {i}"}),
+    ),
+    'conversations.destroy': ('delete', lambda ctx, i: (f"/api/conversations/{ctx['scratch_conversations'][i]}/", None)),
+    'conversations.send_message': (
+        'post', lambda ctx, i: (f"/api/conversations/{_conversation(ctx, i)}/send_message/", {"content": f"Question {i}"}),
+    ),
+    'conversations.messages': ('get', lambda ctx, i: (f"/api/conversations/{_conversation(ctx, i)}/messages/", None)),
+    'conversations.tree': ('get', lambda ctx, i: (f"/api/conversations/{_conversation(ctx, i)}/tree/", None)),
+    'conversations.end': ('post', lambda ctx, i: (f"/api/conversations/{_conversation(ctx, i)}/end/", None)),
+    'conversations.query': (
+        'post', lambda ctx, i: ("/api/conversations/query/?nocache=true", {"query": "What did I plan for the release?"}),
+    ),
+    'conversations.search': ('get', lambda ctx, i: ("/api/conversations/search/?q=database+release", None)),
+    'conversations.suggestions': (
+        'get', lambda ctx, i: (f"/api/conversations/{_conversation(ctx, i)}/suggestions/?nocache=true", None),
+    ),
+    'conversations.archive': ('post', lambda ctx, i: (f"/api/conversations/{_conversation(ctx, i)}/archive/", None)),
+    'conversations.bulk_archive': (
+        'post', lambda ctx, i: (
+            "/api/conversations/bulk_archive/", {"ids": _batch(ctx['conversations'], i), "archived": i % 2 == 0},
+        ),
+    ),
+    'conversations.share': ('post', lambda ctx, i: (f"/api/conversations/{_conversation(ctx, i)}/share/", None)),
+    'conversations.get_shared': ('get', lambda ctx, i: (f"/api/conversations/shared/{ctx['share_token']}/", None)),
+    'conversations.share_stats': ('get', lambda ctx, i: (f"/api/conversations/{ctx['shared']}/share_stats/", None)),
+    'conversations.export_json': ('get', lambda ctx, i: (f"/api/conversations/{_conversation(ctx, i)}/export/", None)),
+    'conversations.export_markdown': (
+        'get', lambda ctx, i: (f"/api/conversations/{_conversation(ctx, i)}/export/?format=markdown", None),
+    ),
+    'conversations.export_pdf': (
+        'get', lambda ctx, i: (f"/api/conversations/{_conversation(ctx, i)}/export/?format=pdf", None),
+    ),
+    'conversations.export_all': ('get', lambda ctx, i: ("/api/conversations/export_all/?format=ndjson", None)),
+    'conversations.analytics': ('get', lambda ctx, i: ("/api/conversations/analytics/", None)),
+    'messages.list': ('get', lambda ctx, i: ("/api/messages/", None)),
+    'messages.retrieve': ('get', lambda ctx, i: (f"/api/messages/{_message(ctx, i)}/", None)),
+    'messages.create': (
+        'post', lambda ctx, i: (
+            "/api/messages/", {"conversation": str(_conversation(ctx, i)), "sender": "user", "content": f"Note {i}"},
+        ),
+    ),
+    'messages.partial_update': ('patch', lambda ctx, i: (f"/api/messages/{_message(ctx, i)}/", {"content": f"Edit {i}"})),
+    'messages.destroy': ('delete', lambda ctx, i: (f"/api/messages/{ctx['scratch_messages'][i]}/", None)),
+    'messages.bookmark': ('post', lambda ctx, i: (f"/api/messages/{_message(ctx, i)}/bookmark/", None)),
+    'messages.react': ('post', lambda ctx, i: (f"/api/messages/{_message(ctx, i)}/react/", {"reaction": "👍"})),
+    'messages.bulk_bookmark': (
+        'post', lambda ctx, i: ("/api/messages/bulk_bookmark/", {"ids": _batch(ctx['messages'], i), "bookmarked": i % 2 == 0}),
+    ),
+    'messages.bulk_react': (
+        'post', lambda ctx, i: ("/api/messages/bulk_react/", {"ids": _batch(ctx['messages'], i), "reaction": "🤔"}),
+    ),
+    'messages.bookmarked': ('get', lambda ctx, i: ("/api/messages/bookmarked/", None)),
+    'messages.branch': (
+        'post', lambda ctx, i: (f"/api/messages/{_message(ctx, i)}/branch/", {"content": f"Alternative {i}"}),
+    ),
+    'messages.get_branches': ('get', lambda ctx, i: (f"/api/messages/{_message(ctx, i)}/get_branches/", None)),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Drive every conversation and message endpoint against the fake LLM provider, report p50/p95/p99 "
+        "latency, throughput and queries per request, and fail on regressions against stored baselines"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--prefix', default='synthetic', help='Username prefix used by generate_synthetic_data')
+        parser.add_argument('--iterations', type=int, default=20, help='Requests per endpoint')
+        parser.add_argument('--llm-latency', type=float, default=0.0, help='Fake provider latency in seconds')
+        parser.add_argument('--only', nargs='+', choices=sorted(SCENARIOS), help='Run only these endpoints')
+        parser.add_argument(
+            '--baseline', default=str(Path(settings.BASE_DIR) / 'benchmarks' / 'api_baselines.json'),
+        )
+        parser.add_argument('--save-baseline', action='store_true', help='Store this run as the new baseline')
+        parser.add_argument(
+            '--latency-tolerance', type=float, default=0.5, help='Allowed p95 increase over the baseline, as a fraction',
+        )
+        parser.add_argument(
+            '--latency-floor-ms', type=float, default=5.0, help='Ignore p95 increases smaller than this',
+        )
+        parser.add_argument('--query-tolerance', type=float, default=0.0, help='Allowed extra queries per request')
+
+    def _user(self, prefix):
+        # The newest synthetic user that has data
+        user = User.objects.filter(username__startswith=f"{prefix}-", conversations__isnull=False).order_by('-id').first()
+        if user is None:
+            raise CommandError(f"No users with prefix '{prefix}'; run generate_synthetic_data first")
+        return user
+
+    def _context(self, client, user, iterations):
+        conversations = list(
+            Conversation.objects.filter(user=user).order_by('-start_time').values_list('id', flat=True)[:200]
+        )
+        messages = list(
+            Message.objects.filter(conversation__user=user).order_by('-id').values_list('id', flat=True)[:500]
+        )
+        shared = conversations[-1]
+        share_token = client.post(f"/api/conversations/{shared}/share/").json()['share_token']
+        # Rows for the destroy scenarios, so they never delete the data the other scenarios read
+        scratch_conversations = Conversation.objects.bulk_create(
+            [Conversation(user=user, title=f"Scratch {i}") for i in range(iterations)]
+        )
+        scratch_messages = Message.objects.bulk_create(
+            [Message(conversation_id=conversations[0], sender='user', content="scratch") for _ in range(iterations)]
+        )
+        return {
+            'conversations': conversations,
+            'messages': messages,
+            'shared': shared,
+            'share_token': share_token,
+            'scratch_conversations': [c.pk for c in scratch_conversations],
+            'scratch_messages': [m.pk for m in scratch_messages],
+        }
+
+    def _request(self, client, method, path, data):
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = getattr(client, method)(path, data, format='json') if data is not None else getattr(client, method)(path)
+            if response.streaming:
+                b"".join(response.streaming_content)
+            else:
+                response.content
+            elapsed = time.perf_counter() - started
+        return elapsed, len(queries), response.status_code
+
+    def _measure(self, client, ctx, name, iterations):
+        method, build = SCENARIOS[name]
+        latencies, query_counts, errors = [], [], 0
+        for i in range(iterations):
+            path, data = build(ctx, i)
+            elapsed, queries, status_code = self._request(client, method, path, data)
+            latencies.append(elapsed)
+            query_counts.append(queries)
+            if status_code >= 400:
+                errors += 1
+        quantiles = statistics.quantiles(latencies, n=100) if len(latencies) >= 2 else latencies * 99
+        return {
+            'p50_ms': round(quantiles[49] * 1000, 2),
+            'p95_ms': round(quantiles[94] * 1000, 2),
+            'p99_ms': round(quantiles[98] * 1000, 2),
+            'throughput': round(len(latencies) / sum(latencies), 1),
+            'queries': round(statistics.mean(query_counts), 2),
+            'errors': errors,
+        }
+
+    def _regressions(self, results, baseline, options):
+        regressions = []
+        for name, result in results.items():
+            if result['errors']:
+                regressions.append(f"{name}: {result['errors']} failed requests")
+            base = baseline.get(name)
+            if base is None:
+                continue
+            limit = max(base['p95_ms'] * (1 + options['latency_tolerance']), base['p95_ms'] + options['latency_floor_ms'])
+            if result['p95_ms'] > limit:
+                regressions.append(f"{name}: p95 {result['p95_ms']}ms > {limit:.2f}ms (baseline {base['p95_ms']}ms)")
+            if result['queries'] > base['queries'] + options['query_tolerance']:
+                regressions.append(f"{name}: {result['queries']} queries/request > baseline {base['queries']}")
+        return regressions
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+        names = options['only'] or list(SCENARIOS)
+        overrides = override_settings(
+            LLM_PROVIDER='fake',
+            FAKE_LLM_LATENCY=options['llm_latency'],
+            FAKE_LLM_CHUNK_DELAY=0,
+            ADMISSION_STORE='local',
+            ADMISSION_RATE=1e9,
+            ADMISSION_BURST=10 ** 9,
+            ADMISSION_MAX_CONCURRENT=10 ** 9,
+            PROFILE_SAMPLE_RATE=0,
+        )
+        results = {}
+        with overrides:
+            for cached in (llm.get_provider, llm.get_client, admission.get_admission):
+                cached.cache_clear()
+            # Every write is rolled back so repeated runs see the same dataset
+            try:
+                with transaction.atomic():
+                    user = self._user(options['prefix'])
+                    client = APIClient()
+                    client.force_login(user)
+                    ctx = self._context(client, user, iterations)
+                    self.stdout.write(
+                        f"user {user.username}: {len(ctx['conversations'])} conversations, "
+                        f"{len(ctx['messages'])} messages sampled, fake LLM latency {options['llm_latency']}s"
+                    )
+                    self.stdout.write(
+                        f"{'endpoint':<32} {'p50':>9} {'p95':>9} {'p99':>9} {'req/s':>8} {'queries':>8} {'errors':>7}"
+                    )
+                    for name in names:
+                        result = results[name] = self._measure(client, ctx, name, iterations)
+                        self.stdout.write(
+                            f"{name:<32} {result['p50_ms']:>7.1f}ms {result['p95_ms']:>7.1f}ms "
+                            f"{result['p99_ms']:>7.1f}ms {result['throughput']:>8.1f} {result['queries']:>8.1f} "
+                            f"{result['errors']:>7}"
+                        )
+                    raise Rollback
+            except Rollback:
+                pass
+            finally:
+                for cached in (llm.get_provider, llm.get_client, admission.get_admission):
+                    cached.cache_clear()
+
+        baseline_path = Path(options['baseline'])
+        if options['save_baseline']:
+            stored = json.loads(baseline_path.read_text()) if baseline_path.exists() else {}
+            stored.update(results)
+            baseline_path.parent.mkdir(parents=True, exist_ok=True)
+            baseline_path.write_text(json.dumps(stored, indent=2, sort_keys=True) + "\n")
+            self.stdout.write(self.style.SUCCESS(f"Baseline saved to {baseline_path}"))
+            return
+
+        if not baseline_path.exists():
+            self.stdout.write(f"No baseline at {baseline_path}; run with --save-baseline to store one")
+            return
+        regressions = self._regressions(results, json.loads(baseline_path.read_text()), options)
+        if regressions:
+            raise CommandError("Regressions against baseline:\n  " + "\n  ".join(regressions))
+        self.stdout.write(self.style.SUCCESS("No regressions against baseline"))
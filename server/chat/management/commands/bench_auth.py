@@ -0,0 +1,86 @@
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+
+MODEL_BACKEND = 'django.contrib.auth.backends.ModelBackend'
+CACHED_BACKEND = 'chat.auth_backends.CachedModelBackend'
+
+# name -> (session engine, authentication backend, user cache TTL)
+CONFIGURATIONS = {
+    'db': ('django.contrib.sessions.backends.db', MODEL_BACKEND, 0),
+    'cached_db': ('django.contrib.sessions.backends.cached_db', MODEL_BACKEND, 0),
+    'cached_db+user_cache': ('django.contrib.sessions.backends.cached_db', CACHED_BACKEND, 60),
+    'signed_cookies+user_cache': ('django.contrib.sessions.backends.signed_cookies', CACHED_BACKEND, 60),
+}
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare session engines and the authenticated-user cache: queries and latency per session-authenticated "
+        "request, with the auth share (session and user lookups) broken out"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=200)
+        parser.add_argument('--path', default='/api/jobs/', help='Cheap authenticated endpoint to request')
+        parser.add_argument('--only', nargs='+', choices=list(CONFIGURATIONS))
+
+    def _measure(self, path, iterations, engine, backend, ttl):
+        with override_settings(SESSION_ENGINE=engine, AUTHENTICATION_BACKENDS=[backend], AUTH_USER_CACHE_TTL=ttl):
+            user = User.objects.create_user(username=f"bench-auth-{time.time_ns():x}")
+            client = Client()
+            client.force_login(user)
+            # The first request fills the caches; steady state is what matters
+            client.get(path)
+            latencies, queries, auth_queries = [], [], []
+            for _ in range(iterations):
+                with CaptureQueriesContext(connection) as captured:
+                    started = time.perf_counter()
+                    response = client.get(path)
+                    latencies.append(time.perf_counter() - started)
+                if response.status_code != 200:
+                    raise Rollback(f"{path} returned {response.status_code}")
+                queries.append(len(captured))
+                auth_queries.append(sum(
+                    1 for query in captured.captured_queries
+                    if '"django_session"' in query['sql'] or '"auth_user"' in query['sql']
+                ))
+            # Evicts the session and cached user so nothing outlives the rolled-back rows
+            client.logout()
+            user.delete()
+        return {
+            'p50_ms': statistics.median(latencies) * 1000,
+            'queries': statistics.mean(queries),
+            'auth_queries': statistics.mean(auth_queries),
+        }
+
+    def handle(self, *args, **options):
+        names = options['only'] or list(CONFIGURATIONS)
+        results = {}
+        try:
+            with transaction.atomic():
+                for name in names:
+                    results[name] = self._measure(options['path'], options['iterations'], *CONFIGURATIONS[name])
+                raise Rollback
+        except Rollback as e:
+            if e.args:
+                self.stderr.write(str(e.args[0]))
+                return
+
+        baseline = results.get('db')
+        self.stdout.write(f"GET {options['path']} x {options['iterations']} per configuration")
+        self.stdout.write(f"{'configuration':<28} {'p50':>9} {'queries':>8} {'auth':>6} {'saved':>7}")
+        for name, result in results.items():
+            saved = f"{baseline['queries'] - result['queries']:>7.2f}" if baseline else f"{'-':>7}"
+            self.stdout.write(
+                f"{name:<28} {result['p50_ms']:>7.2f}ms {result['queries']:>8.2f} {result['auth_queries']:>6.2f} {saved}"
+            )
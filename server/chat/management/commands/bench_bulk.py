@@ -0,0 +1,68 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from chat.models import Conversation, Message
+from chat.mutations import bulk_archive, bulk_bookmark, parse_conversation_ids, parse_message_ids
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Compare per-row load-and-save toggles with the single-statement bulk endpoints on large batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000])
+
+    def _measure(self, func):
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            func()
+            elapsed = time.perf_counter() - started
+        return elapsed, len(queries)
+
+    def _run(self, size):
+        user = User.objects.create_user(f"bench-bulk-{size}-{time.time_ns()}")
+        conversations = Conversation.objects.bulk_create(
+            [Conversation(user=user, title=f"Bench {i}") for i in range(size)]
+        )
+        messages = Message.objects.bulk_create(
+            [Message(conversation=c, sender='user', content="bench") for c in conversations]
+        )
+
+        def per_row_archive():
+            for conversation in Conversation.objects.filter(user=user):
+                conversation.is_archived = not conversation.is_archived
+                conversation.save()
+
+        def per_row_bookmark():
+            for message in Message.objects.filter(conversation__user=user):
+                message.is_bookmarked = not message.is_bookmarked
+                message.save()
+
+        conversation_ids = parse_conversation_ids([c.pk for c in conversations])
+        message_ids = parse_message_ids([m.pk for m in messages])
+        rows = [
+            ('archive', 'per-row save', self._measure(per_row_archive)),
+            ('archive', 'bulk', self._measure(lambda: bulk_archive(user, conversation_ids, False))),
+            ('bookmark', 'per-row save', self._measure(per_row_bookmark)),
+            ('bookmark', 'bulk', self._measure(lambda: bulk_bookmark(user, message_ids, False))),
+        ]
+        for kind, mode, (elapsed, queries) in rows:
+            self.stdout.write(f"{size:>6} {kind:>9} {mode:>13} {queries:>8} {elapsed * 1000:>9.1f}ms")
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'items':>6} {'action':>9} {'mode':>13} {'queries':>8} {'latency':>11}")
+        for size in options['sizes']:
+            # Everything, including the benchmark user, is rolled back afterwards
+            try:
+                with transaction.atomic():
+                    self._run(size)
+                    raise Rollback
+            except Rollback:
+                pass
@@ -0,0 +1,61 @@
+import asyncio
+import time
+
+from django.core.management.base import BaseCommand
+
+from chat.context import estimate_tokens
+from chat.extraction import aextract
+from chat.llm import FakeProvider, LLMClient
+
+
+class MeteredFakeProvider(FakeProvider):
+    """Fake provider whose latency grows with prompt size and which records input tokens per call."""
+
+    def __init__(self, base_latency, per_1k_tokens):
+        super().__init__()
+        self.base_latency = base_latency
+        self.per_1k_tokens = per_1k_tokens
+        self.calls = 0
+        self.input_tokens = 0
+
+    async def generate(self, prompt, json_output=False):
+        tokens = estimate_tokens(prompt)
+        self.calls += 1
+        self.input_tokens += tokens
+        await asyncio.sleep(self.base_latency + self.per_1k_tokens * tokens / 1000)
+        return await super().generate(prompt, json_output=json_output)
+
+
+async def three_call_flow(full_text, client):
+    # The original end() flow: three sequential calls over the full transcript
+    await client.generate(f"Summarize this conversation briefly:\n{full_text}")
+    await client.generate(f"Extract 3-5 key points from this conversation as a JSON array of strings:\n{full_text}")
+    await client.generate(f"Provide insights and analysis from this conversation:\n{full_text}")
+
+
+class Command(BaseCommand):
+    help = "Compare token use and latency of the three-call end() flow against the single structured extraction"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, nargs='+', default=[20, 200, 2000])
+        parser.add_argument('--message-chars', type=int, default=400)
+        parser.add_argument('--base-latency', type=float, default=0.05)
+        parser.add_argument('--per-1k-tokens', type=float, default=0.01)
+
+    def _measure(self, flow, transcript, options):
+        provider = MeteredFakeProvider(options['base_latency'], options['per_1k_tokens'])
+        client = LLMClient(provider, timeout=600)
+        started = time.perf_counter()
+        asyncio.run(flow(transcript, client))
+        return provider.calls, provider.input_tokens, time.perf_counter() - started
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'messages':>9} {'flow':>12} {'calls':>6} {'input tokens':>13} {'latency':>9}")
+        for count in options['messages']:
+            transcript = "\n".join(
+                f"{'user' if i % 2 == 0 else 'ai'}: " + ("lorem ipsum " * options['message_chars'])[:options['message_chars']]
+                for i in range(count)
+            )
+            for name, flow in (('three-call', three_call_flow), ('structured', aextract)):
+                calls, tokens, elapsed = self._measure(flow, transcript, options)
+                self.stdout.write(f"{count:>9} {name:>12} {calls:>6} {tokens:>13} {elapsed:>8.2f}s")
@@ -0,0 +1,56 @@
+import time
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+
+from django.core.management.base import BaseCommand
+
+from chat.pdf import render_pdf
+
+
+def make_document(count, message_chars):
+    text = ("lorem ipsum dolor sit amet " * (message_chars // 27 + 1))[:message_chars]
+    return {
+        'title': f"Benchmark conversation with {count} messages",
+        'start_time': "2025-01-01 00:00:00+00:00",
+        'end_time': None,
+        'summary': "Synthetic conversation used to measure PDF rendering.",
+        'messages': [('user' if i % 2 == 0 else 'ai', text) for i in range(count)],
+    }
+
+
+class Command(BaseCommand):
+    help = "Measure PDF render time against message count, inline and across a process pool"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, nargs='+', default=[10, 100, 1000, 5000])
+        parser.add_argument('--message-chars', type=int, default=400)
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--concurrent', type=int, default=8, help="Documents rendered at once in the pool run")
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'messages':>9} {'render':>9} {'per msg':>9} {'size':>10}")
+        for count in options['messages']:
+            document = make_document(count, options['message_chars'])
+            started = time.perf_counter()
+            content = render_pdf(document)
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f"{count:>9} {elapsed:>8.2f}s {elapsed / count * 1000:>7.2f}ms {len(content) / 1024:>8.0f}KB"
+            )
+
+        count = options['messages'][0]
+        documents = [make_document(count, options['message_chars'])] * options['concurrent']
+        started = time.perf_counter()
+        for document in documents:
+            render_pdf(document)
+        serial = time.perf_counter() - started
+
+        with ProcessPoolExecutor(options['workers'], mp_context=multiprocessing.get_context('spawn')) as pool:
+            list(pool.map(render_pdf, documents[:options['workers']]))  # warm up the workers
+            started = time.perf_counter()
+            list(pool.map(render_pdf, documents))
+            pooled = time.perf_counter() - started
+        self.stdout.write(
+            f"{options['concurrent']} x {count} messages: serial {serial:.2f}s, "
+            f"{options['workers']} workers {pooled:.2f}s"
+        )
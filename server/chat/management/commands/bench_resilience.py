@@ -0,0 +1,91 @@
+import asyncio
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+
+from chat.llm import FakeProvider, FaultyProvider, LLMClient
+from chat.resilience import CircuitBreaker, CircuitOpenError, RetryPolicy
+
+
+class Command(BaseCommand):
+    help = "Compare plain, retrying and hedged LLM clients against a fault-injecting fake provider"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--calls', type=int, default=400)
+        parser.add_argument('--concurrency', type=int, default=20)
+        parser.add_argument('--latency', type=float, default=0.05, help='Normal fake provider latency in seconds')
+        parser.add_argument('--error-rate', type=float, default=0.1)
+        parser.add_argument('--slow-rate', type=float, default=0.05)
+        parser.add_argument('--slow-latency', type=float, default=2.0)
+        parser.add_argument('--timeout', type=float, default=5.0)
+        parser.add_argument('--hedge-after', type=float, default=0.2)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def _client(self, options, retry=None, breaker=None, hedge_after=None):
+        provider = FaultyProvider(
+            FakeProvider(latency=options['latency']),
+            error_rate=options['error_rate'],
+            slow_rate=options['slow_rate'],
+            slow_latency=options['slow_latency'],
+            seed=options['seed'],
+        )
+        return LLMClient(provider, timeout=options['timeout'], retry=retry, breaker=breaker, hedge_after=hedge_after)
+
+    def _run(self, client, options):
+        latencies = []
+        failures = 0
+        fast_failures = 0
+
+        async def worker(calls):
+            nonlocal failures, fast_failures
+            for i in calls:
+                started = time.perf_counter()
+                try:
+                    await client.generate(f"call {i}")
+                except CircuitOpenError:
+                    fast_failures += 1
+                    continue
+                except Exception:
+                    failures += 1
+                    continue
+                latencies.append(time.perf_counter() - started)
+
+        async def run():
+            workers = options['concurrency']
+            await asyncio.gather(*(worker(range(w, options['calls'], workers)) for w in range(workers)))
+
+        started = time.perf_counter()
+        asyncio.run(run())
+        return latencies, failures, fast_failures, time.perf_counter() - started
+
+    def handle(self, *args, **options):
+        retry = RetryPolicy(attempts=3, base_delay=0.05, max_delay=1.0, budget=options['timeout'] * 3)
+        modes = [
+            ('plain', self._client(options)),
+            ('retry', self._client(options, retry=retry, breaker=CircuitBreaker(failure_threshold=20))),
+            ('retry+hedge', self._client(
+                options, retry=retry, breaker=CircuitBreaker(failure_threshold=20), hedge_after=options['hedge_after'],
+            )),
+        ]
+        self.stdout.write(
+            f"{'mode':>12} {'ok':>6} {'failed':>7} {'fast-fail':>10} {'p50':>9} {'p99':>9} {'elapsed':>9}"
+        )
+        for name, client in modes:
+            latencies, failures, fast_failures, elapsed = self._run(client, options)
+            p50 = p99 = 0.0
+            if len(latencies) >= 2:
+                quantiles = statistics.quantiles(latencies, n=100)
+                p50, p99 = quantiles[49], quantiles[98]
+            self.stdout.write(
+                f"{name:>12} {len(latencies):>6} {failures:>7} {fast_failures:>10} "
+                f"{p50 * 1000:>7.1f}ms {p99 * 1000:>7.1f}ms {elapsed:>8.2f}s"
+            )
+
+        # A hard outage: the breaker should turn almost every call into an immediate failure
+        outage = dict(options, error_rate=1.0, slow_rate=0.0)
+        client = self._client(outage, retry=retry, breaker=CircuitBreaker(failure_threshold=5, reset_timeout=30))
+        latencies, failures, fast_failures, elapsed = self._run(client, outage)
+        self.stdout.write(
+            f"outage: {failures} failed upstream, {fast_failures} failed fast by the breaker, {elapsed:.2f}s"
+        )
@@ -0,0 +1,34 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from chat.rollups import find_drift, rebuild
+
+
+class Command(BaseCommand):
+    help = "Compare the daily analytics rollups with the source tables and report drift"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Only check rollups for this username')
+        parser.add_argument('--fix', action='store_true', help='Rebuild rollups for users with drift')
+
+    def handle(self, *args, **options):
+        user_ids = None
+        if options['user']:
+            user_ids = list(User.objects.filter(username=options['user']).values_list('id', flat=True))
+
+        drift = find_drift(user_ids)
+        for user_id, day, stored, expected in drift:
+            changed = {name: (stored[name], expected[name]) for name in stored if stored[name] != expected[name]}
+            self.stdout.write(f"user {user_id} {day}: " + ", ".join(
+                f"{name} stored={have} expected={want}" for name, (have, want) in changed.items()
+            ))
+
+        if not drift:
+            self.stdout.write(self.style.SUCCESS("Rollups are consistent"))
+            return
+
+        if options['fix']:
+            rebuild(sorted({user_id for user_id, _, _, _ in drift}))
+            self.stdout.write(self.style.SUCCESS(f"Rebuilt rollups for {len({d[0] for d in drift})} users"))
+        else:
+            raise CommandError(f"{len(drift)} rollup rows have drifted; run with --fix to rebuild them")
@@ -0,0 +1,159 @@
+import random
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from chat.models import Conversation, Message
+from chat.rollups import rebuild
+
+WORDS = (
+    "project deadline budget design review database query index cache latency deploy release feature bug "
+    "customer meeting roadmap sprint estimate migration schema api endpoint token prompt model summary "
+    "search vector report chart invoice travel recipe garden workout novel chapter lecture exam python "
+    "django react postgres redis queue worker thread profile benchmark baseline regression metric"
+).split()
+
+REACTIONS = ['👍', '❤️', '😂', '🤔']
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate synthetic users, conversations and messages (with branches, bookmarks, reactions and "
+        "summaries) using bulk inserts, for load tests and benchmarks"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10)
+        parser.add_argument('--conversations', type=int, default=50, help='Conversations per user')
+        parser.add_argument('--messages', type=int, default=40, help='Mainline messages per conversation')
+        parser.add_argument('--branch-rate', type=float, default=0.2, help='Share of conversations with a branch')
+        parser.add_argument('--bookmark-rate', type=float, default=0.05)
+        parser.add_argument('--reaction-rate', type=float, default=0.1)
+        parser.add_argument('--ended-rate', type=float, default=0.5, help='Share of conversations ended with a summary')
+        parser.add_argument('--archived-rate', type=float, default=0.1)
+        parser.add_argument('--days', type=int, default=90, help='Spread conversations over this many past days')
+        parser.add_argument('--prefix', default='synthetic', help='Username prefix; reused by bench_api')
+        parser.add_argument('--password', default='synthetic-password')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def _sentence(self, rng, low=6, high=30):
+        return " ".join(rng.choice(WORDS) for _ in range(rng.randint(low, high))).capitalize() + "."
+
+    def _spread_timestamps(self, user_ids, days):
+        # auto_now_add overwrites timestamps on insert, so spread them afterwards: conversations over the
+        # past `days`, messages a minute apart from their conversation's start
+        conversations = Conversation._meta.db_table
+        messages = Message._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {conversations} SET start_time = now() - (abs(hashtext(id::text)) %% %s) * interval '1 day' "
+                f"- (abs(hashtext(title)) %% 1440) * interval '1 minute', updated_at = now() "
+                f"WHERE user_id = ANY(%s)",
+                [max(days, 1), user_ids],
+            )
+            cursor.execute(
+                f"""
+                UPDATE {messages} m SET timestamp = c.start_time + ordered.position * interval '1 minute'
+                FROM (
+                    SELECT m.id, row_number() OVER (PARTITION BY m.conversation_id ORDER BY m.id) AS position
+                    FROM {messages} m JOIN {conversations} c ON c.id = m.conversation_id
+                    WHERE c.user_id = ANY(%s)
+                ) ordered, {conversations} c
+                WHERE m.id = ordered.id AND c.id = m.conversation_id
+                """,
+                [user_ids],
+            )
+            cursor.execute(
+                f"UPDATE {conversations} c SET end_time = c.start_time + interval '1 hour' "
+                f"WHERE c.user_id = ANY(%s) AND c.status = 'ended'",
+                [user_ids],
+            )
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        batch_size = options['batch_size']
+        started = time.perf_counter()
+
+        # A per-run suffix lets the command be run repeatedly against the same database
+        run = f"{options['prefix']}-{time.time_ns():x}"
+        # Hashing is deliberately slow; every synthetic user shares one hash
+        password = make_password(options['password'])
+
+        with transaction.atomic():
+            users = User.objects.bulk_create(
+                [User(username=f"{run}-{i}", password=password) for i in range(options['users'])],
+                batch_size=batch_size,
+            )
+            user_ids = [user.pk for user in users]
+
+            conversations = []
+            for user in users:
+                for _ in range(options['conversations']):
+                    ended = rng.random() < options['ended_rate']
+                    conversation = Conversation(
+                        user=user,
+                        title=" ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 6))).capitalize(),
+                        is_archived=rng.random() < options['archived_rate'],
+                    )
+                    if ended:
+                        conversation.status = 'ended'
+                        conversation.summary_status = 'done'
+                        conversation.summary = self._sentence(rng, 30, 80)
+                        conversation.key_points = [self._sentence(rng, 5, 12) for _ in range(rng.randint(3, 5))]
+                        conversation.insights = self._sentence(rng, 20, 50)
+                    conversations.append(conversation)
+            conversations = Conversation.objects.bulk_create(conversations, batch_size=batch_size)
+
+            def message(conversation, sender, **fields):
+                reacted = rng.random() < options['reaction_rate']
+                return Message(
+                    conversation=conversation,
+                    sender=sender,
+                    content=self._sentence(rng),
+                    is_bookmarked=rng.random() < options['bookmark_rate'],
+                    reactions=[rng.choice(REACTIONS)] if reacted else [],
+                    **fields,
+                )
+
+            mainline = []
+            for conversation in conversations:
+                mainline.extend(
+                    message(conversation, 'user' if i % 2 == 0 else 'ai') for i in range(options['messages'])
+                )
+                if conversation.status == 'ended':
+                    mainline.append(Message(
+                        conversation=conversation, sender='ai', content=f"**Conversation Summary**\n\n{conversation.summary}"
+                    ))
+            mainline = Message.objects.bulk_create(mainline, batch_size=batch_size)
+
+            # Branches fork from a mainline message and may nest one level deeper
+            by_conversation = {}
+            for row in mainline:
+                by_conversation.setdefault(row.conversation_id, []).append(row)
+            branches = []
+            for conversation in conversations:
+                rows = by_conversation.get(conversation.pk)
+                if rows and rng.random() < options['branch_rate']:
+                    fork = rng.choice(rows)
+                    branches.append(message(
+                        conversation, fork.sender, parent=fork, branch_name=f"Branch {rng.randint(1, 99)}"
+                    ))
+            branches = Message.objects.bulk_create(branches, batch_size=batch_size)
+            replies = Message.objects.bulk_create(
+                [message(branch.conversation, 'ai', parent=branch, branch_name=branch.branch_name) for branch in branches],
+                batch_size=batch_size,
+            )
+
+            self._spread_timestamps(user_ids, options['days'])
+            rebuild(user_ids)
+
+        total_messages = len(mainline) + len(branches) + len(replies)
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {len(users)} users ({run}-*), {len(conversations)} conversations and "
+            f"{total_messages} messages ({len(branches) + len(replies)} in branches) "
+            f"in {time.perf_counter() - started:.1f}s"
+        ))
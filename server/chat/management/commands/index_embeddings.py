@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from chat.models import Conversation
+from chat.search import index_conversation
+
+
+class Command(BaseCommand):
+    help = "Embed messages and summaries that are not in the semantic search index yet"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Only index conversations of this username')
+
+    def handle(self, *args, **options):
+        conversations = Conversation.objects.all().order_by('start_time')
+        if options['user']:
+            conversations = conversations.filter(user__username=options['user'])
+
+        total = 0
+        for conversation in conversations.iterator():
+            created = index_conversation(conversation)
+            total += created
+            if created:
+                self.stdout.write(f"{conversation.id}: {created} embeddings")
+        self.stdout.write(self.style.SUCCESS(f"Indexed {total} chunks"))
@@ -0,0 +1,56 @@
+import asyncio
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from chat.llm import FakeProvider, LLMClient, LLMTimeoutError
+
+
+class Command(BaseCommand):
+    help = "Drive the async LLM client with many concurrent chats against the fake provider"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chats', type=int, default=500, help='Number of concurrent chats')
+        parser.add_argument('--turns', type=int, default=4, help='LLM calls per chat')
+        parser.add_argument('--latency', type=float, default=0.5, help='Fake provider latency in seconds')
+        parser.add_argument('--max-concurrency', type=int, default=settings.LLM_MAX_CONCURRENCY)
+        parser.add_argument('--timeout', type=float, default=settings.LLM_TIMEOUT)
+
+    def handle(self, *args, **options):
+        client = LLMClient(
+            FakeProvider(latency=options['latency']),
+            timeout=options['timeout'],
+            max_concurrency=options['max_concurrency'],
+        )
+        latencies = []
+        timeouts = 0
+
+        async def chat(index):
+            nonlocal timeouts
+            for turn in range(options['turns']):
+                started = time.perf_counter()
+                try:
+                    await client.generate(f"chat {index} turn {turn}")
+                except LLMTimeoutError:
+                    timeouts += 1
+                    continue
+                latencies.append(time.perf_counter() - started)
+
+        async def run():
+            await asyncio.gather(*(chat(i) for i in range(options['chats'])))
+
+        started = time.perf_counter()
+        asyncio.run(run())
+        elapsed = time.perf_counter() - started
+
+        total = options['chats'] * options['turns']
+        self.stdout.write(f"calls: {total}, completed: {len(latencies)}, timeouts: {timeouts}")
+        self.stdout.write(f"elapsed: {elapsed:.2f}s, throughput: {len(latencies) / elapsed:.1f} calls/s")
+        if len(latencies) >= 2:
+            quantiles = statistics.quantiles(latencies, n=100)
+            self.stdout.write(
+                f"latency p50: {quantiles[49] * 1000:.1f}ms, "
+                f"p95: {quantiles[94] * 1000:.1f}ms, p99: {quantiles[98] * 1000:.1f}ms"
+            )
@@ -0,0 +1,45 @@
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+import chat.tasks  # noqa: F401 - registers the job handlers
+from chat.jobs import claim, run
+
+
+class Command(BaseCommand):
+    help = "Process background jobs (summaries, insights) from the database queue"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=settings.JOB_WORKER_CONCURRENCY)
+        parser.add_argument('--poll-interval', type=float, default=1.0)
+        parser.add_argument('--once', action='store_true', help='Exit when the queue is empty')
+
+    def _run(self, job):
+        try:
+            job = run(job)
+            self.stdout.write(f"Job {job.pk} ({job.kind}): {job.status}")
+        finally:
+            close_old_connections()
+
+    def handle(self, *args, **options):
+        concurrency = options['concurrency']
+        inflight = set()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            while True:
+                free = concurrency - len(inflight)
+                jobs = claim(free) if free else []
+                for job in jobs:
+                    inflight.add(pool.submit(self._run, job))
+
+                if not inflight:
+                    if options['once']:
+                        break
+                    time.sleep(options['poll_interval'])
+                    continue
+
+                done, inflight = wait(inflight, timeout=options['poll_interval'], return_when=FIRST_COMPLETED)
+                for future in done:
+                    future.result()
@@ -0,0 +1,192 @@
+import re
+from collections import Counter
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .context import estimate_tokens
+from .jobs import enqueue
+from .llm import generate_text
+from .models import Conversation, MemoryDigest
+
+LEVELS = ('week', 'month', 'all')
+PARENT = {'week': 'month', 'month': 'all'}
+ALL_TIME = (date(1970, 1, 1), date(9999, 12, 31))
+
+DIGEST_PROMPT = (
+    "You maintain {label} of a user's conversations, covering {start} to {end}. Using the {sources} below, "
+    "write at most {words} words on the main projects, topics, decisions, people and open questions, with "
+    "dates where they help. Return only the digest.\n\n{text}"
+)
+LABELS = {
+    'week': ("a weekly memory digest", "conversation summaries"),
+    'month': ("a monthly memory digest", "weekly digests"),
+    'all': ("an all-time memory digest", "monthly digests"),
+}
+
+# Broad questions about what the user has been doing are answered from digests; specific ones from excerpts
+BROAD_QUESTION = re.compile(
+    r"\b(what (?:have|did|was) i|working on|been (?:doing|up to)|overview|summar(?:y|ize|ise)|recap|themes?|"
+    r"topics|trends?|progress|highlights|in general|overall|all my|everything)\b",
+    re.IGNORECASE,
+)
+LAST_N = re.compile(r"\b(?:last|past)\s+(\d+)\s+(day|week|month|year)s?\b", re.IGNORECASE)
+UNIT_DAYS = {'day': 1, 'week': 7, 'month': 31, 'year': 366}
+
+
+def period(level, day):
+    """[start, end) of the digest period containing `day`; weeks start on Monday."""
+    if level == 'week':
+        start = day - timedelta(days=day.weekday())
+        return start, start + timedelta(days=7)
+    if level == 'month':
+        start = day.replace(day=1)
+        return start, (start + timedelta(days=32)).replace(day=1)
+    return ALL_TIME
+
+
+def mark_stale(user_id, level, day):
+    start, end = period(level, day)
+    MemoryDigest.objects.bulk_create(
+        [MemoryDigest(user_id=user_id, level=level, period_start=start, period_end=end, is_stale=True)],
+        update_conflicts=True,
+        unique_fields=['user', 'level', 'period_start'],
+        update_fields=['is_stale'],
+    )
+
+
+def mark_conversation_stale(conversation):
+    """Flag the week holding the conversation for the next refresh without scheduling one."""
+    mark_stale(conversation.user_id, 'week', timezone.localdate(conversation.start_time))
+
+
+def schedule_refresh(conversation, key=None):
+    """Call when a conversation's summary changes or a summarized conversation is deleted."""
+    mark_conversation_stale(conversation)
+    return enqueue(
+        'refresh_memory',
+        key=key or f"refresh_memory:{conversation.user_id}:{conversation.pk}:{conversation.version}",
+        payload={'user_id': conversation.user_id},
+    )
+
+
+def _fit(entries, max_tokens):
+    # Share the input budget evenly so one long source cannot crowd out the rest
+    if estimate_tokens("\n\n".join(entries)) <= max_tokens:
+        return entries
+    share = max(max_tokens * 4 // len(entries), 200)
+    return [entry if len(entry) <= share else entry[:share] + "…" for entry in entries]
+
+
+def _sources(digest):
+    if digest.level == 'week':
+        conversations = Conversation.objects.filter(
+            user_id=digest.user_id,
+            summary_status__in=['rolling', 'done'],
+            start_time__date__gte=digest.period_start,
+            start_time__date__lt=digest.period_end,
+        ).order_by('start_time').values_list('start_time', 'title', 'summary')
+        return [
+            f"{timezone.localdate(start_time)} {title}: {summary}"
+            for start_time, title, summary in conversations if summary
+        ]
+    child = 'week' if digest.level == 'month' else 'month'
+    children = MemoryDigest.objects.filter(
+        user_id=digest.user_id,
+        level=child,
+        period_start__gte=digest.period_start,
+        period_start__lt=digest.period_end,
+    ).exclude(content='').order_by('period_start').values_list('period_start', 'content')
+    return [f"{child.capitalize()} of {period_start}:\n{content}" for period_start, content in children]
+
+
+def _rebuild(digest):
+    sources = _sources(digest)
+    if not sources:
+        digest.delete()
+        return
+    label, source_label = LABELS[digest.level]
+    end = "now" if digest.level == 'all' else digest.period_end - timedelta(days=1)
+    start = "the beginning" if digest.level == 'all' else digest.period_start
+    prompt = DIGEST_PROMPT.format(
+        label=label,
+        start=start,
+        end=end,
+        sources=source_label,
+        words=settings.MEMORY_DIGEST_WORDS,
+        text="\n\n".join(_fit(sources, settings.MEMORY_DIGEST_INPUT_TOKENS)),
+    )
+    content = generate_text(prompt, site='memory_digest').strip()
+    MemoryDigest.objects.filter(pk=digest.pk).update(
+        content=content, source_count=len(sources), updated_at=timezone.now()
+    )
+
+
+def refresh(user_id):
+    """
+    Rebuild the user's stale digests bottom-up: weeks, then months, then all time. Each rebuilt digest
+    marks its parent stale, so only the periods touched since the last refresh are regenerated.
+    """
+    rebuilt = Counter()
+    for level in LEVELS:
+        stale = MemoryDigest.objects.filter(user_id=user_id, level=level, is_stale=True).order_by('period_start')
+        for digest in stale:
+            # Claim the digest; a change arriving during the rebuild sets the flag again and is picked up later
+            if not MemoryDigest.objects.filter(pk=digest.pk, is_stale=True).update(is_stale=False):
+                continue
+            try:
+                _rebuild(digest)
+            except Exception:
+                MemoryDigest.objects.filter(pk=digest.pk).update(is_stale=True)
+                raise
+            if level in PARENT:
+                mark_stale(user_id, PARENT[level], digest.period_start)
+            rebuilt[level] += 1
+    return dict(rebuilt)
+
+
+def route(question, today=None):
+    """
+    Pick the cheapest source for a question: 'excerpts' (semantic search) for specific questions, otherwise
+    the digest level whose periods cover the question's time range with the fewest digests.
+    Returns {"level", "start", "end"}.
+    """
+    today = today or timezone.localdate()
+    text = question.lower()
+    start = None
+    match = LAST_N.search(text)
+    if match:
+        start = today - timedelta(days=int(match.group(1)) * UNIT_DAYS[match.group(2).lower()])
+    elif re.search(r"\b(today|yesterday)\b", text):
+        start = today - timedelta(days=1)
+    elif re.search(r"\bthis week\b", text):
+        start = period('week', today)[0]
+    elif re.search(r"\b(last|past) week\b", text):
+        start = period('week', today)[0] - timedelta(days=7)
+    elif re.search(r"\bthis month\b", text):
+        start = period('month', today)[0]
+    elif re.search(r"\b(last|past) month\b", text):
+        start = period('month', period('month', today)[0] - timedelta(days=1))[0]
+
+    if not BROAD_QUESTION.search(text):
+        return {"level": 'excerpts', "start": start, "end": None}
+    if start is None:
+        return {"level": 'all', "start": None, "end": None}
+    end = today + timedelta(days=1)
+    span = (end - start).days
+    level = 'week' if span <= 14 else 'month' if span <= 62 else 'all'
+    return {"level": level, "start": start, "end": end}
+
+
+def digests_for(user, routed):
+    """Digests answering a routed question, falling back to coarser levels while the finer ones are not built yet."""
+    levels = LEVELS[LEVELS.index(routed["level"]):]
+    for level in levels:
+        digests = MemoryDigest.objects.filter(user=user, level=level).exclude(content='')
+        if level != 'all' and routed["start"] is not None:
+            digests = digests.filter(period_start__lt=routed["end"], period_end__gt=routed["start"])
+        digests = list(digests.order_by('period_start'))
+        if digests:
+            return digests
+    return []
@@ -0,0 +1,174 @@
+import bisect
+import math
+import threading
+
+# Minimal in-process metrics registry rendered in the Prometheus text format. Values are per
+# process: scrape every worker, or run one worker per metrics target.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+SIZE_BUCKETS = (100, 500, 1000, 5000, 10000, 50000, 100000, 500000)
+
+REGISTRY = []
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+        REGISTRY.append(self)
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, key, (), value) for key, value in self._values.items()]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for name, key, extra, value in self.samples():
+            lines.append(f"{name}{_format_labels(self.labelnames, key, extra)} {_format_value(value)}")
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    """A gauge set directly, or computed at scrape time by `collect()` returning {label tuple: value}."""
+
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=(), collect=None):
+        super().__init__(name, documentation, labelnames)
+        self.collect = collect
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def samples(self):
+        if self.collect is None:
+            return super().samples()
+        return [(self.name, tuple(map(str, key)), (), value) for key, value in self.collect().items()]
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * (len(self.buckets) + 1), 0))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._values[key] = (counts, total + value)
+
+    def samples(self):
+        samples = []
+        with self._lock:
+            values = [(key, list(counts), total) for key, (counts, total) in self._values.items()]
+        for key, counts, total in values:
+            cumulative = 0
+            for bound, count in zip((*self.buckets, math.inf), counts):
+                cumulative += count
+                samples.append((f"{self.name}_bucket", key, (('le', _format_value(bound)),), cumulative))
+            samples.append((f"{self.name}_sum", key, (), total))
+            samples.append((f"{self.name}_count", key, (), cumulative))
+        return samples
+
+
+def render():
+    return "\n".join(metric.render() for metric in REGISTRY) + "\n"
+
+
+def _job_queue_depth():
+    from django.db.models import Count
+
+    from .models import Job
+
+    depth = {(status,): 0 for status in ('pending', 'processing')}
+    for row in Job.objects.filter(status__in=['pending', 'processing']).values('status').annotate(n=Count('id')):
+        depth[(row['status'],)] = row['n']
+    return depth
+
+
+REQUEST_DURATION = Histogram(
+    'http_request_duration_seconds', "Time to produce the response, per view and action.",
+    ['view', 'action', 'method', 'status'],
+)
+REQUEST_DB_QUERIES = Histogram(
+    'http_request_db_queries', "Database queries issued per request.", ['view', 'action'], buckets=COUNT_BUCKETS,
+)
+REQUEST_DB_DURATION = Histogram(
+    'http_request_db_duration_seconds', "Time spent in database queries per request.", ['view', 'action'],
+)
+LLM_CALLS = Counter(
+    'llm_calls_total', "LLM calls by call site, operation and outcome (ok, timeout, error, circuit_open).",
+    ['site', 'operation', 'outcome'],
+)
+LLM_CALL_DURATION = Histogram(
+    'llm_call_duration_seconds', "LLM call duration including retries.", ['site', 'operation', 'outcome'],
+)
+LLM_RETRIES = Counter('llm_retries_total', "LLM attempts retried after a transient failure.", ['site', 'operation'])
+LLM_PROMPT_CHARS = Histogram(
+    'llm_prompt_chars', "Prompt size in characters.", ['site', 'operation'], buckets=SIZE_BUCKETS,
+)
+LLM_RESPONSE_CHARS = Histogram(
+    'llm_response_chars', "Response size in characters.", ['site', 'operation'], buckets=SIZE_BUCKETS,
+)
+LLM_CACHE_LOOKUPS = Counter(
+    'llm_cache_lookups_total', "LLM response cache lookups by scope and outcome (local_hit, shared_hit, miss, bypass).",
+    ['scope', 'outcome'],
+)
+LLM_IN_FLIGHT = Gauge('llm_in_flight', "LLM attempts currently holding a concurrency slot.")
+LLM_WAITING = Gauge('llm_waiting', "LLM attempts queued for a concurrency slot.")
+PDF_RENDER_QUEUE = Gauge('pdf_render_queue_depth', "PDF renders submitted to the process pool and not yet finished.")
+JOB_QUEUE_DEPTH = Gauge(
+    'job_queue_depth', "Background jobs waiting or running.", ['status'], collect=_job_queue_depth,
+)
+WEBSOCKET_CONNECTIONS = Gauge('websocket_connections', "Open event WebSocket connections.")
+EVENTS_PUBLISHED = Counter('events_published_total', "Real-time events sent to the channel layer.", ['event'])
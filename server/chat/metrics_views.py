@@ -0,0 +1,17 @@
+import hmac
+
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse
+
+from . import metrics as registry
+
+
+def metrics(request):
+    """Prometheus scrape endpoint. Needs `Authorization: Bearer <METRICS_TOKEN>`, or a staff session when no token is set."""
+    if settings.METRICS_TOKEN:
+        expected = f"Bearer {settings.METRICS_TOKEN}"
+        if not hmac.compare_digest(request.headers.get('Authorization', '').encode(), expected.encode()):
+            return JsonResponse({"error": "Invalid metrics token"}, status=403)
+    elif not request.user.is_staff:
+        return JsonResponse({"error": "Metrics require a staff session or METRICS_TOKEN"}, status=403)
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
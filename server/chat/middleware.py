@@ -0,0 +1,103 @@
+import random
+import time
+
+from django.conf import settings
+from django.utils import timezone
+
+from . import metrics, profiling
+
+
+def resolve_endpoint(request):
+    """(view, action) labels for a request: the DRF viewset and action, or the URL name of a plain view."""
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        # Unmatched paths share one label so scanners cannot blow up the metric cardinality
+        return 'unmatched', ''
+    view_class = getattr(match.func, 'cls', None)
+    if view_class is not None:
+        actions = getattr(match.func, 'actions', None) or {}
+        return view_class.__name__, actions.get(request.method.lower(), '')
+    return match.url_name or match.view_name or 'unknown', ''
+
+
+class RequestMetricsMiddleware:
+    """
+    Records latency, query count and query time per view and action. Streaming responses are timed
+    until the response object is returned, not until the last chunk is sent.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = profiling.QueryRecorder()
+        started = time.perf_counter()
+        with recorder.record():
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - started
+
+        view, action = resolve_endpoint(request)
+        metrics.REQUEST_DURATION.observe(
+            elapsed, view=view, action=action, method=request.method, status=response.status_code
+        )
+        metrics.REQUEST_DB_QUERIES.observe(recorder.count, view=view, action=action)
+        metrics.REQUEST_DB_DURATION.observe(recorder.duration, view=view, action=action)
+        return response
+
+
+class ProfilingMiddleware:
+    """
+    Profiles a request and captures its SQL when a staff user sends `X-Profile: cprofile|wall`, or for
+    a random PROFILE_SAMPLE_RATE share of requests. Results are stored under PROFILE_DIR and their id is
+    returned in the `X-Profile-Id` header; read them back through /api/profiles/.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def _mode(self, request):
+        requested = request.headers.get('X-Profile')
+        if requested:
+            user = getattr(request, 'user', None)
+            if user is not None and user.is_staff:
+                return requested if requested in ('cprofile', 'wall') else settings.PROFILE_MODE
+        if settings.PROFILE_SAMPLE_RATE and random.random() < settings.PROFILE_SAMPLE_RATE:
+            return settings.PROFILE_MODE
+        return None
+
+    def __call__(self, request):
+        mode = self._mode(request)
+        if mode is None:
+            return self.get_response(request)
+
+        recorder = profiling.QueryRecorder(keep_statements=True, max_statements=settings.PROFILE_MAX_STATEMENTS)
+        created_at = timezone.now()
+        started = time.perf_counter()
+        with recorder.record(), profiling.profiler(mode) as profiler:
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - started
+
+        view, action = resolve_endpoint(request)
+        user = getattr(request, 'user', None)
+        profile_id = profiling.save({
+            "created_at": created_at.isoformat(),
+            "method": request.method,
+            "path": request.get_full_path(),
+            "view": view,
+            "action": action,
+            "status": response.status_code,
+            "user_id": user.pk if user is not None and user.is_authenticated else None,
+            "mode": profiler.mode,
+            "duration_ms": round(elapsed * 1000, 3),
+            "queries": {
+                "count": recorder.count,
+                "duration_ms": round(recorder.duration * 1000, 3),
+                "repeated": profiling.repeated_queries(
+                    recorder.statements, settings.PROFILE_REPEATED_QUERY_THRESHOLD
+                ),
+                "statements": recorder.statements,
+            },
+            "profile": profiler.report(settings.PROFILE_TOP_ENTRIES),
+        })
+        response['X-Profile-Id'] = profile_id
+        return response
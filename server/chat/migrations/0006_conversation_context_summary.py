@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 05:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0005_uuid_and_user_field'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversation',
+            name='context_summary',
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='context_summary_message_id',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-17 05:56
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0007_job_conversation_summary_status'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Embedding',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('message', 'Message'), ('summary', 'Summary')], max_length=10)),
+                ('chunk_index', models.PositiveIntegerField(default=0)),
+                ('text', models.TextField()),
+                ('vector', models.BinaryField()),
+                ('model_name', models.CharField(max_length=100)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('conversation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='embeddings', to='chat.conversation')),
+                ('message', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='embeddings', to='chat.message')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='embeddings', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'model_name', 'id'], name='chat_embedd_user_id_675433_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('kind', 'message')), fields=('message', 'chunk_index', 'model_name'), name='unique_message_chunk_embedding'), models.UniqueConstraint(condition=models.Q(('kind', 'summary')), fields=('conversation', 'chunk_index', 'model_name'), name='unique_summary_chunk_embedding')],
+            },
+        ),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 5.2.18 on 2026-10-17 05:57
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.conf import settings
+from django.db import migrations
+
+CREATE_TRIGGERS = """
+CREATE OR REPLACE FUNCTION chat_conversation_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('pg_catalog.english', coalesce(NEW.title, '')), 'A') ||
+        setweight(to_tsvector('pg_catalog.english', coalesce(NEW.summary, '')), 'B');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER chat_conversation_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF title, summary ON chat_conversation
+    FOR EACH ROW EXECUTE FUNCTION chat_conversation_search_vector_update();
+
+CREATE TRIGGER chat_message_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF content ON chat_message
+    FOR EACH ROW EXECUTE FUNCTION tsvector_update_trigger(search_vector, 'pg_catalog.english', content);
+
+UPDATE chat_conversation SET title = title;
+UPDATE chat_message SET content = content;
+"""
+
+DROP_TRIGGERS = """
+DROP TRIGGER IF EXISTS chat_message_search_vector_trigger ON chat_message;
+DROP TRIGGER IF EXISTS chat_conversation_search_vector_trigger ON chat_conversation;
+DROP FUNCTION IF EXISTS chat_conversation_search_vector_update();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0008_embedding'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversation',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='conversation',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='chat_conver_search__d15248_gin'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='chat_messag_search__9be221_gin'),
+        ),
+        migrations.RunSQL(CREATE_TRIGGERS, reverse_sql=DROP_TRIGGERS),
+    ]
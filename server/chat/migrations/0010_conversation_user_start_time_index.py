@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-17 05:59
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0009_search_vectors'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='conversation',
+            index=models.Index(fields=['user', '-start_time'], name='chat_conver_user_id_727520_idx'),
+        ),
+    ]
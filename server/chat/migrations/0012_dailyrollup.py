@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:01
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0011_message_conversation_timestamp_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('conversations', models.IntegerField(default=0)),
+                ('ended_conversations', models.IntegerField(default=0)),
+                ('archived_conversations', models.IntegerField(default=0)),
+                ('summarized_conversations', models.IntegerField(default=0)),
+                ('messages', models.IntegerField(default=0)),
+                ('user_messages', models.IntegerField(default=0)),
+                ('ai_messages', models.IntegerField(default=0)),
+                ('bookmarked_messages', models.IntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('user', 'date'), name='unique_user_daily_rollup')],
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:06
+
+import django.utils.timezone
+from django.db import migrations, models
+
+BACKFILL_UPDATED_AT = """
+UPDATE chat_conversation SET updated_at = GREATEST(
+    start_time,
+    end_time,
+    (SELECT MAX(timestamp) FROM chat_message WHERE chat_message.conversation_id = chat_conversation.id)
+);
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0012_dailyrollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversation',
+            name='updated_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+        migrations.RunSQL(BACKFILL_UPDATED_AT, migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-17 07:03
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0015_rolling_summary'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='conversation',
+            name='summary_message_id',
+        ),
+    ]
@@ -1,5 +1,8 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
+from django.utils import timezone
 import uuid
 
 class Conversation(models.Model):
@@ -14,6 +17,38 @@ class Conversation(models.Model):
     insights = models.TextField(blank=True, null=True)
     share_token = models.CharField(max_length=64, blank=True, null=True, unique=True)
     is_archived = models.BooleanField(default=False)
+    summary_status = models.CharField(max_length=20, blank=True, null=True, choices=[
+        ('rolling', 'Rolling'),
+        ('pending', 'Pending'),
+        ('processing', 'Processing'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ])
+    context_summary = models.TextField(blank=True, null=True)
+    context_summary_message_id = models.BigIntegerField(blank=True, null=True)
+    # Bumped by versioning.touch_conversation whenever the conversation or its messages change
+    version = models.PositiveIntegerField(default=1, editable=False)
+    updated_at = models.DateTimeField(default=timezone.now, editable=False)
+    # Maintained by a database trigger from title (weight A) and summary (weight B)
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=['search_vector']),
+            models.Index(fields=['user', '-start_time']),
+        ]
+
+    # Only touch_conversation writes these; saving the copies held in memory could move the version
+    # back under a concurrent bump and hand out an ETag twice
+    VERSION_FIELDS = ('version', 'updated_at')
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.VERSION_FIELDS
+            ]
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return self.title
@@ -28,6 +63,129 @@ class Message(models.Model):
     reactions = models.JSONField(blank=True, null=True, default=list)
     parent = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True, related_name='branches')
     branch_name = models.CharField(max_length=255, blank=True, null=True)
+    # Maintained by a database trigger from content
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=['search_vector']),
+            models.Index(fields=['conversation', 'timestamp', 'id']),
+        ]
 
     def __str__(self):
         return f"{self.sender}: {self.content[:30]}"
+
+
+class Job(models.Model):
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('processing', 'Processing'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    kind = models.CharField(max_length=50)
+    conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, null=True, blank=True, related_name='jobs')
+    idempotency_key = models.CharField(max_length=255, unique=True)
+    payload = models.JSONField(blank=True, null=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True, null=True)
+    result = models.JSONField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_after']),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} ({self.status})"
+
+
+class Embedding(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='embeddings')
+    conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, related_name='embeddings')
+    message = models.ForeignKey(Message, on_delete=models.CASCADE, null=True, blank=True, related_name='embeddings')
+    kind = models.CharField(max_length=10, choices=[('message', 'Message'), ('summary', 'Summary')])
+    chunk_index = models.PositiveIntegerField(default=0)
+    text = models.TextField()
+    vector = models.BinaryField()
+    model_name = models.CharField(max_length=100)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'model_name', 'id']),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['message', 'chunk_index', 'model_name'],
+                condition=models.Q(kind='message'),
+                name='unique_message_chunk_embedding',
+            ),
+            models.UniqueConstraint(
+                fields=['conversation', 'chunk_index', 'model_name'],
+                condition=models.Q(kind='summary'),
+                name='unique_summary_chunk_embedding',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} embedding for {self.conversation_id}"
+
+
+class DailyRollup(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='daily_rollups')
+    date = models.DateField()
+    conversations = models.IntegerField(default=0)
+    ended_conversations = models.IntegerField(default=0)
+    archived_conversations = models.IntegerField(default=0)
+    summarized_conversations = models.IntegerField(default=0)
+    messages = models.IntegerField(default=0)
+    user_messages = models.IntegerField(default=0)
+    ai_messages = models.IntegerField(default=0)
+    bookmarked_messages = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'date'], name='unique_user_daily_rollup'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} {self.date}"
+
+
+class MemoryDigest(models.Model):
+    """Rolled-up memory of a user's conversation summaries: weekly, then monthly, then all-time."""
+
+    LEVEL_CHOICES = [
+        ('week', 'Week'),
+        ('month', 'Month'),
+        ('all', 'All time'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='memory_digests')
+    level = models.CharField(max_length=10, choices=LEVEL_CHOICES)
+    period_start = models.DateField()
+    period_end = models.DateField()
+    content = models.TextField(blank=True, default='')
+    source_count = models.PositiveIntegerField(default=0)
+    # Set when a source changed; memory.refresh rebuilds stale digests and marks their parent stale
+    is_stale = models.BooleanField(default=True)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'level', 'period_start'], name='unique_user_memory_digest'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'level', 'is_stale']),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} {self.level} {self.period_start}"
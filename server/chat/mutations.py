@@ -0,0 +1,231 @@
+import json
+import uuid
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .events import publish
+from .models import Conversation, Message
+from .rollups import increment, increment_many
+from .versioning import publish_versions, touch_conversations
+
+CONVERSATIONS = Conversation._meta.db_table
+MESSAGES = Message._meta.db_table
+
+# Reactions may be SQL NULL or a non-array JSON value on old rows; treat those as an empty list
+REACTIONS = "(CASE WHEN jsonb_typeof(m.reactions) = 'array' THEN m.reactions ELSE '[]'::jsonb END)"
+
+
+def _fetch(sql, params):
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+
+def _jsonb(value):
+    # Django hands jsonb back from raw cursors as text
+    return json.loads(value) if isinstance(value, str) else value
+
+
+def _versions(touched):
+    # New conversation versions for events, so clients can tell whether their cached copy is current
+    return {str(pk): version for pk, (version, _) in touched.items()}
+
+
+def parse_conversation_ids(values):
+    parsed = {}
+    for value in values:
+        try:
+            parsed[str(value)] = uuid.UUID(str(value))
+        except ValueError:
+            parsed[str(value)] = None
+    return parsed
+
+
+def parse_message_ids(values):
+    parsed = {}
+    for value in values:
+        try:
+            parsed[str(value)] = int(value)
+        except (TypeError, ValueError):
+            parsed[str(value)] = None
+    return parsed
+
+
+def _results(parsed, found, changed, extra):
+    """Per-item results in request order: invalid, not_found, unchanged or updated."""
+    results = []
+    for raw, pk in parsed.items():
+        if pk is None:
+            results.append({"id": raw, "status": "invalid"})
+        elif pk not in found:
+            results.append({"id": raw, "status": "not_found"})
+        else:
+            results.append({"id": raw, "status": "updated" if pk in changed else "unchanged", **extra})
+    return results
+
+
+def toggle_archive(user, conversation_id):
+    """Flip is_archived in one conditional UPDATE; returns the new value, or None if not the user's conversation."""
+    with transaction.atomic():
+        rows = _fetch(
+            f"UPDATE {CONVERSATIONS} SET is_archived = NOT is_archived, version = version + 1, updated_at = %s "
+            f"WHERE id = %s AND user_id = %s RETURNING id, is_archived, start_time, version, share_token",
+            [timezone.now(), conversation_id, user.pk],
+        )
+        if not rows:
+            return None
+        pk, is_archived, start_time, version, share_token = rows[0]
+        increment(user.pk, timezone.localdate(start_time), archived_conversations=1 if is_archived else -1)
+        publish_versions([(pk, version, share_token)])
+        publish(user.pk, 'conversation.archived', conversations=[{"id": pk, "is_archived": is_archived, "version": version}])
+    return is_archived
+
+
+def bulk_archive(user, parsed, archived):
+    ids = [pk for pk in parsed.values() if pk is not None]
+    with transaction.atomic():
+        rows = _fetch(
+            f"""
+            WITH target AS (
+                SELECT id, is_archived FROM {CONVERSATIONS}
+                WHERE user_id = %(user)s AND id = ANY(%(ids)s)
+                FOR UPDATE
+            ), updated AS (
+                UPDATE {CONVERSATIONS} c
+                SET is_archived = %(value)s, version = c.version + 1, updated_at = %(now)s
+                FROM target
+                WHERE c.id = target.id AND target.is_archived <> %(value)s
+                RETURNING c.id, c.start_time, c.version, c.share_token
+            )
+            SELECT target.id, updated.id IS NOT NULL, updated.start_time, updated.version, updated.share_token
+            FROM target LEFT JOIN updated ON updated.id = target.id
+            """,
+            {'user': user.pk, 'ids': ids, 'value': archived, 'now': timezone.now()},
+        )
+        changed = [row for row in rows if row[1]]
+        increment_many(
+            (user.pk, timezone.localdate(start_time), {'archived_conversations': 1 if archived else -1})
+            for _, _, start_time, _, _ in changed
+        )
+        publish_versions([(pk, version, share_token) for pk, _, _, version, share_token in changed])
+        if changed:
+            publish(user.pk, 'conversation.archived', conversations=[
+                {"id": pk, "is_archived": archived, "version": version} for pk, _, _, version, _ in changed
+            ])
+    return _results(parsed, {row[0] for row in rows}, {row[0] for row in changed}, {"is_archived": archived})
+
+
+def toggle_bookmark(user, message_id):
+    """Flip is_bookmarked in one conditional UPDATE; returns the new value, or None if not the user's message."""
+    with transaction.atomic():
+        rows = _fetch(
+            f"UPDATE {MESSAGES} m SET is_bookmarked = NOT m.is_bookmarked FROM {CONVERSATIONS} c "
+            f"WHERE m.id = %s AND c.id = m.conversation_id AND c.user_id = %s "
+            f"RETURNING m.is_bookmarked, m.conversation_id, m.timestamp",
+            [message_id, user.pk],
+        )
+        if not rows:
+            return None
+        is_bookmarked, conversation_id, timestamp = rows[0]
+        increment(user.pk, timezone.localdate(timestamp), bookmarked_messages=1 if is_bookmarked else -1)
+        versions = touch_conversations([conversation_id])
+        publish(user.pk, 'message.bookmarked', messages=[
+            {"id": message_id, "conversation_id": conversation_id, "is_bookmarked": is_bookmarked}
+        ], versions=_versions(versions))
+    return is_bookmarked
+
+
+def bulk_bookmark(user, parsed, bookmarked):
+    ids = [pk for pk in parsed.values() if pk is not None]
+    with transaction.atomic():
+        rows = _fetch(
+            f"""
+            WITH target AS (
+                SELECT m.id, m.is_bookmarked FROM {MESSAGES} m JOIN {CONVERSATIONS} c ON c.id = m.conversation_id
+                WHERE c.user_id = %(user)s AND m.id = ANY(%(ids)s)
+                FOR UPDATE OF m
+            ), updated AS (
+                UPDATE {MESSAGES} m SET is_bookmarked = %(value)s
+                FROM target
+                WHERE m.id = target.id AND target.is_bookmarked <> %(value)s
+                RETURNING m.id, m.conversation_id, m.timestamp
+            )
+            SELECT target.id, updated.id IS NOT NULL, updated.conversation_id, updated.timestamp
+            FROM target LEFT JOIN updated ON updated.id = target.id
+            """,
+            {'user': user.pk, 'ids': ids, 'value': bookmarked},
+        )
+        changed = [row for row in rows if row[1]]
+        increment_many(
+            (user.pk, timezone.localdate(timestamp), {'bookmarked_messages': 1 if bookmarked else -1})
+            for _, _, _, timestamp in changed
+        )
+        versions = touch_conversations({conversation_id for _, _, conversation_id, _ in changed})
+        if changed:
+            publish(user.pk, 'message.bookmarked', messages=[
+                {"id": pk, "conversation_id": conversation_id, "is_bookmarked": bookmarked}
+                for pk, _, conversation_id, _ in changed
+            ], versions=_versions(versions))
+    return _results(parsed, {row[0] for row in rows}, {row[0] for row in changed}, {"is_bookmarked": bookmarked})
+
+
+def toggle_reaction(user, message_id, reaction):
+    """
+    Remove `reaction` if present, otherwise make it the only reaction, in one conditional UPDATE.
+    Returns the new list, or None if not the user's message.
+    """
+    with transaction.atomic():
+        rows = _fetch(
+            f"""
+            UPDATE {MESSAGES} m SET reactions = CASE
+                WHEN {REACTIONS} @> jsonb_build_array(%(reaction)s::text) THEN {REACTIONS} - %(reaction)s::text
+                ELSE jsonb_build_array(%(reaction)s::text)
+            END
+            FROM {CONVERSATIONS} c
+            WHERE m.id = %(id)s AND c.id = m.conversation_id AND c.user_id = %(user)s
+            RETURNING m.reactions, m.conversation_id
+            """,
+            {'id': message_id, 'user': user.pk, 'reaction': reaction},
+        )
+        if not rows:
+            return None
+        reactions, conversation_id = rows[0]
+        reactions = _jsonb(reactions)
+        versions = touch_conversations([conversation_id])
+        publish(user.pk, 'message.reactions', messages=[
+            {"id": message_id, "conversation_id": conversation_id, "reactions": reactions}
+        ], versions=_versions(versions))
+    return reactions
+
+
+def bulk_react(user, parsed, reaction):
+    """Set the reaction on every message (or clear reactions when `reaction` is None)."""
+    ids = [pk for pk in parsed.values() if pk is not None]
+    reactions = json.dumps([reaction] if reaction is not None else [])
+    with transaction.atomic():
+        rows = _fetch(
+            f"""
+            WITH target AS (
+                SELECT m.id, m.reactions FROM {MESSAGES} m JOIN {CONVERSATIONS} c ON c.id = m.conversation_id
+                WHERE c.user_id = %(user)s AND m.id = ANY(%(ids)s)
+                FOR UPDATE OF m
+            ), updated AS (
+                UPDATE {MESSAGES} m SET reactions = %(reactions)s::jsonb
+                FROM target
+                WHERE m.id = target.id AND target.reactions IS DISTINCT FROM %(reactions)s::jsonb
+                RETURNING m.id, m.conversation_id
+            )
+            SELECT target.id, updated.id IS NOT NULL, updated.conversation_id
+            FROM target LEFT JOIN updated ON updated.id = target.id
+            """,
+            {'user': user.pk, 'ids': ids, 'reactions': reactions},
+        )
+        changed = [row for row in rows if row[1]]
+        versions = touch_conversations({conversation_id for _, _, conversation_id in changed})
+        if changed:
+            publish(user.pk, 'message.reactions', messages=[
+                {"id": pk, "conversation_id": conversation_id, "reactions": json.loads(reactions)}
+                for pk, _, conversation_id in changed
+            ], versions=_versions(versions))
+    return _results(parsed, {row[0] for row in rows}, {row[0] for row in changed}, {"reactions": json.loads(reactions)})
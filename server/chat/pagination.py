@@ -0,0 +1,30 @@
+import base64
+import json
+
+from rest_framework.pagination import CursorPagination
+
+
+class ConversationCursorPagination(CursorPagination):
+    ordering = '-start_time'
+    page_size = 30
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+def encode_cursor(data):
+    return base64.urlsafe_b64encode(json.dumps(data).encode()).decode()
+
+
+def decode_cursor(value, **fields):
+    """Decode a cursor made by encode_cursor; `fields` maps each required key to its type (or tuple of types)."""
+    try:
+        data = json.loads(base64.urlsafe_b64decode(value.encode()))
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+    if not isinstance(data, dict):
+        raise ValueError("Invalid cursor")
+    for key, types in fields.items():
+        # bool is an int subclass but never a valid position
+        if not isinstance(data.get(key), types) or isinstance(data[key], bool):
+            raise ValueError("Invalid cursor")
+    return data
@@ -0,0 +1,168 @@
+import multiprocessing
+import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+from io import BytesIO
+from pathlib import Path
+
+from django.conf import settings
+from django.utils.html import escape
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.lib.units import inch
+from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer
+
+from . import metrics
+
+
+@lru_cache(maxsize=None)
+def _styles():
+    # Built once per process instead of once per message
+    styles = getSampleStyleSheet()
+    return {
+        'title': ParagraphStyle('CustomTitle', parent=styles['Heading1'], fontSize=24, spaceAfter=30),
+        'heading': styles['Heading2'],
+        'body': styles['Normal'],
+        'sender': ParagraphStyle('Sender', parent=styles['Normal'], fontName='Helvetica-Bold', fontSize=12),
+    }
+
+
+def render_pdf(document):
+    """
+    Render a conversation to PDF bytes. `document` is plain data (no model instances) so this can
+    run in a worker process: title, start_time, end_time, summary and a list of (sender, content).
+    """
+    styles = _styles()
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=letter)
+    story = [Paragraph(escape(document['title']), styles['title']), Spacer(1, 0.2*inch)]
+
+    story.append(Paragraph(f"<b>Start Time:</b> {document['start_time']}", styles['body']))
+    if document['end_time']:
+        story.append(Paragraph(f"<b>End Time:</b> {document['end_time']}", styles['body']))
+    story.append(Spacer(1, 0.3*inch))
+
+    if document['summary']:
+        story.append(Paragraph("<b>Summary</b>", styles['heading']))
+        story.append(Paragraph(escape(document['summary']), styles['body']))
+        story.append(Spacer(1, 0.3*inch))
+
+    story.append(Paragraph("<b>Messages</b>", styles['heading']))
+    story.append(Spacer(1, 0.2*inch))
+
+    for sender, content in document['messages']:
+        story.append(Paragraph(f"{sender.upper()}:", styles['sender']))
+        story.append(Paragraph(escape(content), styles['body']))
+        story.append(Spacer(1, 0.2*inch))
+
+    doc.build(story)
+    return buffer.getvalue()
+
+
+def pdf_document(conversation):
+    return {
+        'title': conversation.title,
+        'start_time': str(conversation.start_time),
+        'end_time': str(conversation.end_time) if conversation.end_time else None,
+        'summary': conversation.summary,
+        'messages': list(conversation.messages.order_by('timestamp', 'id').values_list('sender', 'content')),
+    }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn rather than fork: the parent is a threaded server holding DB connections
+            _pool = ProcessPoolExecutor(
+                max_workers=settings.PDF_RENDER_WORKERS,
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+        return _pool
+
+
+def _reset_pool(broken):
+    global _pool
+    with _pool_lock:
+        if _pool is broken:
+            _pool = None
+    broken.shutdown(wait=False, cancel_futures=True)
+
+
+def render_in_pool(document):
+    if settings.PDF_RENDER_WORKERS <= 0:
+        return render_pdf(document)
+    metrics.PDF_RENDER_QUEUE.inc()
+    pool = _get_pool()
+    try:
+        future = pool.submit(render_pdf, document)
+        try:
+            return future.result(timeout=settings.PDF_RENDER_TIMEOUT)
+        except FutureTimeoutError:
+            future.cancel()
+            raise TimeoutError(f"PDF render took longer than {settings.PDF_RENDER_TIMEOUT} seconds")
+    except BrokenProcessPool:
+        # A worker died (e.g. killed for memory); start a fresh pool for the next render
+        _reset_pool(pool)
+        raise
+    finally:
+        metrics.PDF_RENDER_QUEUE.dec()
+
+
+def artifact_path(conversation_id, version):
+    return Path(settings.PDF_CACHE_DIR) / f"{conversation_id}-{version}.pdf"
+
+
+def _artifact_version(path):
+    try:
+        return int(path.stem.rsplit('-', 1)[1])
+    except (IndexError, ValueError):
+        return None
+
+
+def discard_artifacts(conversation_id, below=None):
+    """Delete the conversation's cached PDFs, or only those older than version `below`."""
+    for path in Path(settings.PDF_CACHE_DIR).glob(f"{conversation_id}-*.pdf"):
+        version = _artifact_version(path)
+        if below is None or (version is not None and version < below):
+            path.unlink(missing_ok=True)
+
+
+def open_artifact(conversation, version):
+    """Open the cached PDF for this version, or return None if it has not been rendered yet."""
+    try:
+        return open(artifact_path(conversation.pk, version), 'rb')
+    except FileNotFoundError:
+        return None
+
+
+def render_artifact(conversation):
+    """
+    Render the conversation's current version into the PDF cache; runs in the job worker so no
+    request waits on the process pool. Returns the version rendered.
+    """
+    # Imported here: pool workers import this module to unpickle render_pdf without setting up Django
+    from .models import Conversation
+
+    # Version before content: a concurrent change can only make the file newer than its name says
+    version = Conversation.objects.filter(pk=conversation.pk).values_list('version', flat=True).get()
+    path = artifact_path(conversation.pk, version)
+    if path.exists():
+        return version
+    content = render_in_pool(pdf_document(conversation))
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Write to a temp file and rename so a concurrent reader never sees a partial PDF
+    fd, tmp = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(content)
+    os.replace(tmp, path)
+    # Only older versions: a slow render must not delete what a newer one already wrote
+    discard_artifacts(conversation.pk, below=version)
+    return version
@@ -0,0 +1,223 @@
+import cProfile
+import json
+import os
+import pstats
+import re
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connections
+
+PROFILE_ID = re.compile(r"^\d+-[0-9a-f]{8}$")
+
+# One cProfile at a time: from Python 3.12 the profiler hooks are process-wide
+_cprofile_lock = threading.Lock()
+
+
+class QueryRecorder:
+    """Database execute wrapper counting queries and their time; optionally keeps every statement."""
+
+    def __init__(self, keep_statements=False, max_statements=None):
+        self.keep_statements = keep_statements
+        self.max_statements = max_statements
+        self.count = 0
+        self.duration = 0.0
+        self.statements = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.count += 1
+            self.duration += elapsed
+            if self.keep_statements and (self.max_statements is None or len(self.statements) < self.max_statements):
+                self.statements.append({"sql": sql, "duration_ms": round(elapsed * 1000, 3), "many": many})
+
+    @contextmanager
+    def record(self):
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(self))
+            yield self
+
+
+def normalize_sql(sql):
+    # Statements differing only in literals or IN-list length are the same query shape
+    sql = re.sub(r"'(?:[^']|'')*'", "?", sql)
+    sql = re.sub(r"\b\d+(?:\.\d+)?\b", "?", sql)
+    sql = re.sub(r"\bIN \((?:\s*(?:%s|\?)\s*,?)+\)", "IN (...)", sql)
+    return re.sub(r"\s+", " ", sql).strip()
+
+
+def repeated_queries(statements, threshold):
+    """Query shapes run at least `threshold` times in one request: the usual signature of an N+1."""
+    shapes = {}
+    for statement in statements:
+        shape = shapes.setdefault(normalize_sql(statement["sql"]), {"count": 0, "duration_ms": 0.0})
+        shape["count"] += 1
+        shape["duration_ms"] += statement["duration_ms"]
+    return sorted(
+        (
+            {"sql": sql, "count": shape["count"], "duration_ms": round(shape["duration_ms"], 3)}
+            for sql, shape in shapes.items() if shape["count"] >= threshold
+        ),
+        key=lambda shape: -shape["count"],
+    )
+
+
+class CProfileProfiler:
+    mode = 'cprofile'
+
+    def __init__(self):
+        self._profile = cProfile.Profile()
+
+    def __enter__(self):
+        self._profile.enable()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._profile.disable()
+
+    def report(self, limit):
+        stats = pstats.Stats(self._profile).stats
+        rows = sorted(stats.items(), key=lambda item: -item[1][3])[:limit]
+        return {
+            "total_seconds": round(max((ct for _, _, _, ct, _ in stats.values()), default=0.0), 6),
+            "functions": [
+                {
+                    "function": f"{filename}:{line}({name})",
+                    "calls": calls,
+                    "total_seconds": round(tottime, 6),
+                    "cumulative_seconds": round(cumtime, 6),
+                }
+                for (filename, line, name), (_, calls, tottime, cumtime, _) in rows
+            ],
+        }
+
+
+class WallProfiler:
+    """Samples the request thread's stack every `interval` seconds; time spent waiting on I/O shows up too."""
+
+    mode = 'wall'
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._samples = Counter()
+        self._stop = threading.Event()
+        self._thread_id = None
+        self._sampler = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(f"{frame.f_code.co_filename}:{frame.f_code.co_name}")
+                frame = frame.f_back
+            if stack:
+                self._samples[";".join(reversed(stack))] += 1
+
+    def __enter__(self):
+        self._thread_id = threading.get_ident()
+        self._sampler = threading.Thread(target=self._run, daemon=True)
+        self._sampler.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._sampler.join()
+
+    def report(self, limit):
+        # Stacks are in the collapsed format flame graph tools read
+        return {
+            "interval_seconds": self.interval,
+            "samples": sum(self._samples.values()),
+            "stacks": [
+                {"stack": stack, "samples": count, "seconds": round(count * self.interval, 6)}
+                for stack, count in self._samples.most_common(limit)
+            ],
+        }
+
+
+@contextmanager
+def profiler(mode):
+    """Yield a running profiler; cProfile falls back to wall-clock sampling if another request holds it."""
+    if mode == 'cprofile' and _cprofile_lock.acquire(blocking=False):
+        try:
+            with CProfileProfiler() as running:
+                yield running
+        finally:
+            _cprofile_lock.release()
+        return
+    with WallProfiler(settings.PROFILE_WALL_INTERVAL) as running:
+        yield running
+
+
+def save(record):
+    directory = Path(settings.PROFILE_DIR)
+    directory.mkdir(parents=True, exist_ok=True)
+    profile_id = f"{time.time_ns() // 1_000_000}-{uuid.uuid4().hex[:8]}"
+    record = {"id": profile_id, **record}
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    with os.fdopen(fd, 'w') as handle:
+        json.dump(record, handle)
+    os.replace(temp_path, directory / f"{profile_id}.json")
+    _prune(directory)
+    return profile_id
+
+
+def _prune(directory):
+    paths = sorted(directory.glob("*.json"), reverse=True)
+    for path in paths[settings.PROFILE_MAX_STORED:]:
+        path.unlink(missing_ok=True)
+
+
+def _path(profile_id):
+    if not PROFILE_ID.match(profile_id or ""):
+        return None
+    return Path(settings.PROFILE_DIR) / f"{profile_id}.json"
+
+
+def load(profile_id):
+    path = _path(profile_id)
+    if path is None:
+        return None
+    try:
+        return json.loads(path.read_text())
+    except FileNotFoundError:
+        return None
+
+
+def list_profiles():
+    """Newest first, without the profile and SQL bodies."""
+    summaries = []
+    for path in sorted(Path(settings.PROFILE_DIR).glob("*.json"), reverse=True):
+        try:
+            record = json.loads(path.read_text())
+        except (FileNotFoundError, json.JSONDecodeError):
+            continue
+        queries = record.get("queries", {})
+        summaries.append({
+            **{key: value for key, value in record.items() if key not in ("profile", "queries")},
+            "query_count": queries.get("count"),
+            "query_duration_ms": queries.get("duration_ms"),
+            "repeated_queries": len(queries.get("repeated", [])),
+        })
+    return summaries
+
+
+def delete(profile_id):
+    path = _path(profile_id)
+    if path is None or not path.exists():
+        return False
+    path.unlink(missing_ok=True)
+    return True
@@ -0,0 +1,196 @@
+import asyncio
+import collections
+import random
+import threading
+import time
+
+from google.api_core import exceptions as google_exceptions
+
+
+class TransientLLMError(Exception):
+    """A failure that is worth retrying, e.g. raised by the fault-injecting fake provider."""
+
+
+class CircuitOpenError(Exception):
+    def __init__(self, retry_after):
+        super().__init__(f"LLM provider unavailable; retry after {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+
+# Throttling and server-side failures clear up on their own; bad requests, auth and safety errors do not
+RETRYABLE_ERRORS = (
+    TransientLLMError,
+    ConnectionError,
+    google_exceptions.TooManyRequests,
+    google_exceptions.ServerError,
+    google_exceptions.DeadlineExceeded,
+    google_exceptions.RetryError,
+)
+
+
+def is_retryable(error):
+    return isinstance(error, RETRYABLE_ERRORS)
+
+
+def is_unhealthy(error):
+    # Timeouts are not retried (they already used the caller's whole deadline) but still count against the breaker
+    return is_retryable(error) or isinstance(error, TimeoutError)
+
+
+class RetryPolicy:
+    """Exponential backoff with full jitter, capped at `max_delay` and bounded by a total `budget` in seconds."""
+
+    def __init__(self, attempts=3, base_delay=0.5, max_delay=8.0, budget=60.0):
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget = budget
+
+    def delay(self, attempt):
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+    def next_delay(self, error, attempt, elapsed):
+        """Seconds to wait before the next attempt, or None if the error should be raised."""
+        if attempt >= self.attempts or not is_retryable(error):
+            return None
+        delay = self.delay(attempt)
+        if elapsed + delay >= self.budget:
+            return None
+        return delay
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive retryable failures or timeouts and fails calls fast for
+    `reset_timeout` seconds; then lets a single trial call through (half-open) and closes again
+    if it succeeds. Shared by every event loop of the process, hence the thread lock.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_started = None
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state
+
+    def before_call(self):
+        with self._lock:
+            if self._state == self.CLOSED:
+                return
+            now = time.monotonic()
+            remaining = self._opened_at + self.reset_timeout - now
+            if self._state == self.OPEN and remaining <= 0:
+                self._state = self.HALF_OPEN
+            # A trial that never reported back (e.g. cancelled) stops blocking others after reset_timeout
+            if self._state == self.HALF_OPEN and (
+                self._trial_started is None or now - self._trial_started > self.reset_timeout
+            ):
+                self._trial_started = now
+                return
+            raise CircuitOpenError(max(remaining, 0.0))
+
+    def record_success(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._trial_started = None
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+            self._trial_started = None
+
+    def record(self, error):
+        # Errors the provider answered deliberately (bad request, safety block) say nothing about its health,
+        # so they leave the state alone; a half-open trial ending that way frees the slot for the next call
+        if is_unhealthy(error):
+            self.record_failure()
+            return
+        with self._lock:
+            self._trial_started = None
+
+
+class SharedSemaphore:
+    """
+    Counting semaphore for coroutines on any event loop in the process. async_to_sync runs each call
+    from a sync caller (WSGI views, job worker threads) on a loop of its own, so an asyncio.Semaphore
+    would only limit calls that share a loop. Slots are handed to waiters first in, first out.
+    """
+
+    def __init__(self, value):
+        self._value = value
+        self._lock = threading.Lock()
+        self._waiters = collections.deque()
+
+    async def acquire(self):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self._value > 0 and not self._waiters:
+                self._value -= 1
+                return
+            waiter = (loop, loop.create_future())
+            self._waiters.append(waiter)
+        try:
+            await waiter[1]
+        except asyncio.CancelledError:
+            with self._lock:
+                queued = waiter in self._waiters
+                if queued:
+                    self._waiters.remove(waiter)
+            if not queued:
+                # release() already handed this waiter a slot; pass it on
+                self.release()
+            raise
+
+    def release(self):
+        with self._lock:
+            while self._waiters:
+                loop, future = self._waiters.popleft()
+                try:
+                    loop.call_soon_threadsafe(_grant, future)
+                except RuntimeError:
+                    # The waiter's loop has closed; try the next one
+                    continue
+                return
+            self._value += 1
+
+
+def _grant(future):
+    if not future.done():
+        future.set_result(None)
+
+
+async def hedged(make_attempt, hedge_after):
+    """
+    Run `make_attempt()` and, if it has not finished after `hedge_after` seconds, race a second copy
+    against it. The first success wins and the loser is cancelled; if both fail the last error is raised.
+    """
+    tasks = {asyncio.ensure_future(make_attempt())}
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=hedge_after)
+        if not done:
+            tasks.add(asyncio.ensure_future(make_attempt()))
+        error = None
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in tasks:
+            task.cancel()
@@ -0,0 +1,206 @@
+from collections import Counter, defaultdict
+
+from django.db import connection, transaction
+from django.db.models import Count, Q
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import Conversation, DailyRollup, Message
+
+COUNTERS = [
+    'conversations',
+    'ended_conversations',
+    'archived_conversations',
+    'summarized_conversations',
+    'messages',
+    'user_messages',
+    'ai_messages',
+    'bookmarked_messages',
+]
+
+
+def increment(user_id, day, **deltas):
+    """Add `deltas` to the user's row for `day` with a single INSERT ... ON CONFLICT DO UPDATE."""
+    increment_many([(user_id, day, deltas)])
+
+
+def increment_many(rows):
+    """Apply (user_id, day, deltas) rows in one upsert; deltas for the same row are summed first."""
+    totals = defaultdict(Counter)
+    for user_id, day, deltas in rows:
+        totals[(user_id, day)].update(deltas)
+    totals = {key: {name: value for name, value in deltas.items() if value} for key, deltas in totals.items()}
+    totals = {key: deltas for key, deltas in totals.items() if deltas}
+    if not totals:
+        return
+    changed = sorted({name for deltas in totals.values() for name in deltas})
+    table = DailyRollup._meta.db_table
+    updates = ", ".join(f"{name} = {table}.{name} + EXCLUDED.{name}" for name in changed)
+    placeholders = f"(%s, %s, {', '.join(['%s'] * len(COUNTERS))})"
+    sql = (
+        f"INSERT INTO {table} (user_id, date, {', '.join(COUNTERS)}) "
+        f"VALUES {', '.join([placeholders] * len(totals))} "
+        f"ON CONFLICT (user_id, date) DO UPDATE SET {updates}"
+    )
+    params = []
+    for (user_id, day), deltas in totals.items():
+        params += [user_id, day] + [deltas.get(name, 0) for name in COUNTERS]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+def conversation_counts(conversation):
+    return {
+        'conversations': 1,
+        'ended_conversations': int(conversation.status == 'ended'),
+        'archived_conversations': int(conversation.is_archived),
+        'summarized_conversations': int(bool(conversation.summary)),
+    }
+
+
+def message_counts(message):
+    return {
+        'messages': 1,
+        'user_messages': int(message.sender == 'user'),
+        'ai_messages': int(message.sender == 'ai'),
+        'bookmarked_messages': int(message.is_bookmarked),
+    }
+
+
+def _diff(after, before):
+    return {name: after.get(name, 0) - before.get(name, 0) for name in set(after) | set(before)}
+
+
+def record_conversation(conversation, before=None):
+    """Apply the change from `before` (a counts dict, or None for a new row) to `conversation`'s counts."""
+    increment(
+        conversation.user_id,
+        timezone.localdate(conversation.start_time),
+        **_diff(conversation_counts(conversation), before or {})
+    )
+
+
+def record_message(message, before=None, user_id=None):
+    increment(
+        user_id or message.conversation.user_id,
+        timezone.localdate(message.timestamp),
+        **_diff(message_counts(message), before or {})
+    )
+
+
+def remove_conversation(conversation):
+    """Subtract a conversation and all of its messages; call before deleting it."""
+    increment(
+        conversation.user_id,
+        timezone.localdate(conversation.start_time),
+        **{name: -value for name, value in conversation_counts(conversation).items()}
+    )
+    for day, counts in _message_counts_by_date(Message.objects.filter(conversation=conversation)):
+        increment(conversation.user_id, day, **{name: -value for name, value in counts.items()})
+
+
+def remove_message(message, user_id=None):
+    """Subtract a message and the branch messages that will be cascade-deleted with it."""
+    ids = [message.pk]
+    frontier = [message.pk]
+    while frontier:
+        frontier = list(Message.objects.filter(parent_id__in=frontier).values_list('id', flat=True))
+        ids.extend(frontier)
+    for day, counts in _message_counts_by_date(Message.objects.filter(id__in=ids)):
+        increment(user_id or message.conversation.user_id, day, **{name: -value for name, value in counts.items()})
+
+
+def _message_counts_by_date(messages):
+    rows = (
+        messages.annotate(date=TruncDate('timestamp'))
+        .values('date')
+        .annotate(
+            messages=Count('id'),
+            user_messages=Count('id', filter=Q(sender='user')),
+            ai_messages=Count('id', filter=Q(sender='ai')),
+            bookmarked_messages=Count('id', filter=Q(is_bookmarked=True)),
+        )
+        .order_by()
+    )
+    for row in rows:
+        day = row.pop('date')
+        yield day, row
+
+
+def compute_rollups(user_ids=None):
+    """Recompute every rollup row from the source tables; returns {(user_id, date): counters}."""
+    expected = defaultdict(lambda: dict.fromkeys(COUNTERS, 0))
+
+    conversations = Conversation.objects.all()
+    messages = Message.objects.all()
+    if user_ids is not None:
+        conversations = conversations.filter(user_id__in=user_ids)
+        messages = messages.filter(conversation__user_id__in=user_ids)
+
+    conversation_rows = (
+        conversations.annotate(date=TruncDate('start_time'))
+        .values('user_id', 'date')
+        .annotate(
+            conversations=Count('id'),
+            ended_conversations=Count('id', filter=Q(status='ended')),
+            archived_conversations=Count('id', filter=Q(is_archived=True)),
+            summarized_conversations=Count('id', filter=Q(summary__isnull=False) & ~Q(summary='')),
+        )
+        .order_by()
+    )
+    for row in conversation_rows:
+        expected[(row.pop('user_id'), row.pop('date'))].update(row)
+
+    message_rows = (
+        messages.annotate(date=TruncDate('timestamp'))
+        .values('conversation__user_id', 'date')
+        .annotate(
+            messages=Count('id'),
+            user_messages=Count('id', filter=Q(sender='user')),
+            ai_messages=Count('id', filter=Q(sender='ai')),
+            bookmarked_messages=Count('id', filter=Q(is_bookmarked=True)),
+        )
+        .order_by()
+    )
+    for row in message_rows:
+        expected[(row.pop('conversation__user_id'), row.pop('date'))].update(row)
+
+    return expected
+
+
+def stored_rollups(user_ids=None):
+    rollups = DailyRollup.objects.all()
+    if user_ids is not None:
+        rollups = rollups.filter(user_id__in=user_ids)
+    return {
+        (row['user_id'], row['date']): {name: row[name] for name in COUNTERS}
+        for row in rollups.values('user_id', 'date', *COUNTERS)
+    }
+
+
+def find_drift(user_ids=None):
+    """Return [(user_id, date, stored, expected)] for every row whose counters disagree with the source tables."""
+    expected = compute_rollups(user_ids)
+    stored = stored_rollups(user_ids)
+    empty = dict.fromkeys(COUNTERS, 0)
+    drift = []
+    for key in sorted(set(expected) | set(stored), key=lambda k: (k[0], k[1])):
+        want = expected.get(key, empty)
+        have = stored.get(key, empty)
+        if want != have:
+            drift.append((key[0], key[1], have, want))
+    return drift
+
+
+def rebuild(user_ids=None):
+    expected = compute_rollups(user_ids)
+    with transaction.atomic():
+        rollups = DailyRollup.objects.all()
+        if user_ids is not None:
+            rollups = rollups.filter(user_id__in=user_ids)
+        rollups.delete()
+        DailyRollup.objects.bulk_create(
+            [DailyRollup(user_id=user_id, date=day, **counts) for (user_id, day), counts in expected.items()],
+            batch_size=1000,
+        )
+    return len(expected)
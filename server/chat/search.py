@@ -0,0 +1,270 @@
+import copy
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Count, Max
+
+from .jobs import enqueue
+from .llm import embed_texts, get_client
+from .llm_cache import response_cache
+from .models import Embedding, Message
+
+EMBED_BATCH_SIZE = 100
+
+
+def chunk_text(text, max_chars):
+    text = text.strip()
+    if len(text) <= max_chars:
+        return [text] if text else []
+    chunks = []
+    while text:
+        if len(text) <= max_chars:
+            chunks.append(text)
+            break
+        cut = text.rfind(" ", 0, max_chars)
+        if cut <= 0:
+            cut = max_chars
+        chunks.append(text[:cut].strip())
+        text = text[cut:].strip()
+    return chunks
+
+
+def _to_bytes(vector):
+    return np.asarray(vector, dtype=np.float32).tobytes()
+
+
+def _normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _embed_rows(rows):
+    # rows: (kwargs, text) pairs; embeds in batches and bulk-inserts the Embedding rows
+    model_name = get_client().embedding_model
+    created = 0
+    for start in range(0, len(rows), EMBED_BATCH_SIZE):
+        batch = rows[start:start + EMBED_BATCH_SIZE]
+        vectors = embed_texts([text for _, text in batch], site='search_index')
+        # Concurrent index jobs for one conversation may embed the same rows; the unique constraints keep one copy
+        Embedding.objects.bulk_create([
+            Embedding(text=text, vector=_to_bytes(vector), model_name=model_name, **fields)
+            for (fields, text), vector in zip(batch, vectors)
+        ], ignore_conflicts=True)
+        created += len(batch)
+    return created
+
+
+def schedule_indexing(conversation, message_id):
+    return enqueue('index_conversation', conversation, key=f"index_conversation:{conversation.pk}:{message_id}")
+
+
+def reindex_message(message):
+    """Drop the embeddings of an edited or moved message and schedule the job that embeds it again."""
+    Embedding.objects.filter(message=message).delete()
+    conversation = message.conversation
+    return schedule_indexing(conversation, f"{message.pk}:{conversation.version}")
+
+
+def index_conversation(conversation):
+    """Embed the conversation's messages that have no embedding yet, and its summary if it changed."""
+    model_name = get_client().embedding_model
+    max_chars = settings.SEARCH_CHUNK_CHARS
+    rows = []
+
+    pending = (
+        Message.objects.filter(conversation=conversation)
+        .exclude(embeddings__model_name=model_name)
+        .order_by('id')
+    )
+    for message in pending.iterator():
+        for index, chunk in enumerate(chunk_text(message.content, max_chars)):
+            rows.append(({
+                'user_id': conversation.user_id,
+                'conversation_id': conversation.pk,
+                'message_id': message.pk,
+                'kind': 'message',
+                'chunk_index': index,
+            }, chunk))
+
+    if conversation.summary:
+        existing = list(
+            Embedding.objects.filter(conversation=conversation, kind='summary', model_name=model_name)
+            .order_by('chunk_index').values_list('text', flat=True)
+        )
+        chunks = chunk_text(conversation.summary, max_chars)
+        if existing != chunks:
+            Embedding.objects.filter(conversation=conversation, kind='summary').delete()
+            for index, chunk in enumerate(chunks):
+                rows.append(({
+                    'user_id': conversation.user_id,
+                    'conversation_id': conversation.pk,
+                    'kind': 'summary',
+                    'chunk_index': index,
+                }, chunk))
+
+    return _embed_rows(rows)
+
+
+class VectorIndex:
+    """
+    In-memory cosine-similarity index. Exact search is a single matrix-vector product plus
+    argpartition; with `approximate=True` vectors are bucketed by k-means centroids (IVF) and only
+    the `nprobe` closest buckets are scored.
+    """
+
+    def __init__(self, ids, vectors, approximate=False, nprobe=8):
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.vectors = _normalize(np.asarray(vectors, dtype=np.float32))
+        self.nprobe = nprobe
+        self.centroids = None
+        if approximate and len(self.ids):
+            self._train()
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _train(self, iterations=10, sample_size=50000):
+        rng = np.random.default_rng(0)
+        nlist = max(1, int(np.sqrt(len(self.ids))))
+        sample = self.vectors
+        if len(sample) > sample_size:
+            sample = sample[rng.choice(len(sample), sample_size, replace=False)]
+        centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+        for _ in range(iterations):
+            assignment = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, sample)
+            counts = np.bincount(assignment, minlength=nlist)
+            filled = counts > 0
+            centroids[filled] = _normalize(sums[filled])
+        self.centroids = centroids
+        self.assignment = np.argmax(self.vectors @ centroids.T, axis=1)
+        self._build_lists()
+
+    def _build_lists(self):
+        self.order = np.argsort(self.assignment, kind='stable')
+        counts = np.bincount(self.assignment, minlength=len(self.centroids))
+        self.offsets = np.concatenate(([0], np.cumsum(counts)))
+
+    def extended(self, ids, vectors):
+        # Returns a new index so concurrent searches on the cached one never see a half-updated state
+        index = copy.copy(self)
+        vectors = _normalize(np.asarray(vectors, dtype=np.float32))
+        index.ids = np.concatenate((self.ids, np.asarray(ids, dtype=np.int64)))
+        index.vectors = np.vstack((self.vectors, vectors)) if len(self.vectors) else vectors
+        if self.centroids is not None:
+            index.assignment = np.concatenate((self.assignment, np.argmax(vectors @ self.centroids.T, axis=1)))
+            index._build_lists()
+        return index
+
+    def _candidates(self, query):
+        if self.centroids is None:
+            return None
+        nprobe = min(self.nprobe, len(self.centroids))
+        closest = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+        return np.concatenate([self.order[self.offsets[c]:self.offsets[c + 1]] for c in closest])
+
+    def search(self, query, k):
+        if not len(self.ids):
+            return [], []
+        query = _normalize(np.asarray(query, dtype=np.float32))
+        rows = self._candidates(query)
+        if rows is not None and not len(rows):
+            # Every probed bucket is empty (centroids left without vectors after training)
+            return [], []
+        scores = self.vectors @ query if rows is None else self.vectors[rows] @ query
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        positions = top if rows is None else rows[top]
+        return self.ids[positions].tolist(), scores[top].tolist()
+
+
+_indexes = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+def _load_vectors(queryset):
+    ids = []
+    vectors = []
+    for embedding_id, vector in queryset.order_by('id').values_list('id', 'vector').iterator(chunk_size=2000):
+        ids.append(embedding_id)
+        vectors.append(np.frombuffer(vector, dtype=np.float32))
+    return ids, np.vstack(vectors) if vectors else np.zeros((0, 0), dtype=np.float32)
+
+
+def get_user_index(user):
+    """
+    Return the user's index, loading only embeddings added since the cached copy was built.
+    A drop in the row count (deleted conversations) forces a full reload.
+    """
+    model_name = get_client().embedding_model
+    queryset = Embedding.objects.filter(user=user, model_name=model_name)
+    stats = queryset.aggregate(last_id=Max('id'), count=Count('id'))
+    if not stats['count']:
+        return None
+
+    with _indexes_lock:
+        cached = _indexes.get((user.pk, model_name))
+        if cached:
+            _indexes.move_to_end((user.pk, model_name))
+
+    if cached and cached['last_id'] == stats['last_id'] and cached['count'] == stats['count']:
+        return cached['index']
+
+    if cached and cached['count'] < stats['count'] and cached['last_id'] < stats['last_id']:
+        index = cached['index']
+        ids, vectors = _load_vectors(queryset.filter(id__gt=cached['last_id']))
+        if len(index) + len(ids) == stats['count']:
+            index = index.extended(ids, vectors)
+        else:
+            cached = None
+    else:
+        cached = None
+
+    if cached is None:
+        ids, vectors = _load_vectors(queryset)
+        index = VectorIndex(
+            ids,
+            vectors,
+            approximate=len(ids) >= settings.SEARCH_IVF_MIN_VECTORS,
+            nprobe=settings.SEARCH_IVF_NPROBE,
+        )
+
+    with _indexes_lock:
+        _indexes[(user.pk, model_name)] = {'index': index, 'last_id': stats['last_id'], 'count': stats['count']}
+        _indexes.move_to_end((user.pk, model_name))
+        while len(_indexes) > settings.SEARCH_INDEX_CACHE_USERS:
+            _indexes.popitem(last=False)
+    return index
+
+
+def semantic_search(user, query, k=None, bypass_cache=False):
+    index = get_user_index(user)
+    if index is None:
+        return []
+    query_vector = response_cache.get_or_compute(
+        'query_embedding',
+        get_client().embedding_model,
+        query,
+        lambda: embed_texts([query], task_type='retrieval_query', site='search_query')[0],
+        bypass=bypass_cache,
+    )
+    ids, scores = index.search(query_vector, k or settings.SEARCH_TOP_K)
+    embeddings = Embedding.objects.in_bulk(ids)
+    results = []
+    for embedding_id, score in zip(ids, scores):
+        embedding = embeddings.get(embedding_id)
+        if embedding is None:
+            continue
+        results.append({
+            "conversation_id": str(embedding.conversation_id),
+            "message_id": embedding.message_id,
+            "kind": embedding.kind,
+            "text": embedding.text,
+            "score": round(float(score), 4),
+        })
+    return results
@@ -1,10 +1,10 @@
 from rest_framework import serializers
-from .models import Conversation, Message
+from .models import Conversation, Message, Job
 
 class MessageSerializer(serializers.ModelSerializer):
     class Meta:
         model = Message
-        fields = '__all__'
+        exclude = ['search_vector']
 
 
 class ConversationSerializer(serializers.ModelSerializer):
@@ -12,5 +12,27 @@ class ConversationSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Conversation
-        fields = '__all__'
-        read_only_fields = ['user'] 
+        exclude = ['search_vector']
+        read_only_fields = [
+            'user', 'summary_status', 'context_summary', 'context_summary_message_id', 'version',
+            'updated_at',
+        ]
+
+
+class ConversationListSerializer(serializers.ModelSerializer):
+    message_count = serializers.IntegerField(read_only=True)
+    last_message_preview = serializers.CharField(read_only=True, allow_null=True)
+    last_message_at = serializers.DateTimeField(read_only=True, allow_null=True)
+
+    class Meta:
+        model = Conversation
+        fields = [
+            'id', 'title', 'status', 'summary_status', 'start_time', 'end_time', 'is_archived', 'updated_at',
+            'message_count', 'last_message_preview', 'last_message_at',
+        ]
+
+
+class JobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Job
+        fields = ['id', 'kind', 'conversation', 'status', 'attempts', 'max_attempts', 'last_error', 'result', 'created_at', 'updated_at']
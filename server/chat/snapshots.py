@@ -0,0 +1,138 @@
+import gzip
+import json
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+
+from .models import Conversation
+
+
+PROCESS_LOCAL_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def _cache():
+    return caches[settings.SHARED_SNAPSHOT_CACHE_ALIAS]
+
+
+def _pointer_ttl():
+    # Token and version pointers are moved by whichever process changes the conversation, job workers
+    # included. A process-local cache never sees those moves, so there the pointers only live briefly and
+    # are re-read from the database; a shared cache keeps them until the next publish.
+    backend = settings.CACHES[settings.SHARED_SNAPSHOT_CACHE_ALIAS]['BACKEND']
+    return settings.SHARED_SNAPSHOT_LOCAL_POINTER_TTL if backend in PROCESS_LOCAL_BACKENDS else None
+
+
+def _token_key(token):
+    return f"shared:token:{token}"
+
+
+def _version_key(conversation_id):
+    return f"shared:version:{conversation_id}"
+
+
+def _snapshot_key(conversation_id, version):
+    return f"shared:snapshot:{conversation_id}:{version}"
+
+
+def _counter_key(token, name):
+    return f"shared:{name}:{token}"
+
+
+def _count(token, name):
+    cache = _cache()
+    key = _counter_key(token, name)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # First hit, or the counter was evicted; a lost increment under a concurrent first hit is acceptable
+        cache.add(key, 1, timeout=None)
+
+
+def share_stats(token):
+    values = _cache().get_many([_counter_key(token, 'hits'), _counter_key(token, 'builds')])
+    return {
+        "hits": values.get(_counter_key(token, 'hits'), 0),
+        "builds": values.get(_counter_key(token, 'builds'), 0),
+    }
+
+
+def publish_version(conversation_id, version):
+    """
+    Point readers at a new version. Snapshots are keyed by version, so one built from a read that raced
+    with a write is stored under the old key and never served as current.
+    """
+    _cache().set(_version_key(conversation_id), version, timeout=_pointer_ttl())
+
+
+def forget(conversation_id, token):
+    keys = [_version_key(conversation_id)]
+    if token:
+        keys.append(_token_key(token))
+    _cache().delete_many(keys)
+
+
+def build(conversation, serialize):
+    data = json.dumps(serialize(conversation), cls=DjangoJSONEncoder).encode()
+    snapshot = {
+        "etag": f'"shared-{conversation.pk}-{conversation.version}"',
+        "updated_at": int(conversation.updated_at.timestamp()),
+        "body": gzip.compress(data, compresslevel=6),
+    }
+    _cache().set(_snapshot_key(conversation.pk, conversation.version), snapshot, settings.SHARED_SNAPSHOT_TTL)
+    _count(conversation.share_token, 'builds')
+    return snapshot
+
+
+def get(token, serialize):
+    """
+    Return the snapshot for a share token, or None if the token is unknown. The cache answers
+    token -> conversation id -> current version -> gzipped body; the database is read only to
+    resolve an unseen token or rebuild a snapshot after a change.
+    """
+    cache = _cache()
+    conversation_id = cache.get(_token_key(token))
+    if conversation_id is not None:
+        version = cache.get(_version_key(conversation_id))
+        if version is not None:
+            snapshot = cache.get(_snapshot_key(conversation_id, version))
+            if snapshot is not None:
+                _count(token, 'hits')
+                return snapshot
+
+    conversation = Conversation.objects.filter(share_token=token).first()
+    if conversation is None:
+        cache.delete(_token_key(token))
+        return None
+    ttl = _pointer_ttl()
+    cache.set(_token_key(token), conversation.pk, timeout=ttl)
+    cache.add(_version_key(conversation.pk), conversation.version, timeout=ttl)
+    _count(token, 'hits')
+    # After a pointer expired the snapshot of the current version is usually still cached
+    snapshot = cache.get(_snapshot_key(conversation.pk, conversation.version))
+    return snapshot if snapshot is not None else build(conversation, serialize)
+
+
+def respond(request, snapshot):
+    """Serve a snapshot as-is to gzip-capable clients, with validators and CDN-friendly caching headers."""
+    response = get_conditional_response(request, etag=snapshot["etag"], last_modified=snapshot["updated_at"])
+    if response is None:
+        if 'gzip' in request.headers.get('Accept-Encoding', ''):
+            response = HttpResponse(snapshot["body"], content_type='application/json')
+            response['Content-Encoding'] = 'gzip'
+        else:
+            response = HttpResponse(gzip.decompress(snapshot["body"]), content_type='application/json')
+    response['ETag'] = snapshot["etag"]
+    response['Last-Modified'] = http_date(snapshot["updated_at"])
+    response['Cache-Control'] = (
+        f"public, max-age={settings.SHARED_CACHE_MAX_AGE}, s-maxage={settings.SHARED_CACHE_S_MAXAGE}, "
+        f"stale-while-revalidate={settings.SHARED_CACHE_STALE_WHILE_REVALIDATE}"
+    )
+    patch_vary_headers(response, ['Accept-Encoding'])
+    return response
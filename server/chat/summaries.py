@@ -0,0 +1,98 @@
+from django.conf import settings
+from django.db import transaction
+
+from .context import fold_into_summary
+from .events import conversation_changed
+from .extraction import build_transcript
+from .jobs import enqueue
+from .memory import mark_conversation_stale
+from .models import Conversation, Message
+from .rollups import conversation_counts, record_conversation
+from .search import schedule_indexing
+from .versioning import touch_conversation
+
+# One rolling summary per conversation, `context_summary`, serves both prompts (see context.build_prompt) and,
+# mirrored into `summary` with status 'rolling', search, query and memory digests while the conversation is
+# active. The newest turns are left out of it because prompts carry them verbatim.
+
+
+def _verbatim_turns():
+    return max(1, settings.CONTEXT_RECENT_MESSAGES // 2)
+
+
+def _unsummarized(conversation):
+    return Message.objects.filter(
+        conversation=conversation, parent__isnull=True, id__gt=conversation.context_summary_message_id or 0
+    ).order_by('id')
+
+
+def schedule_rolling_summary(conversation, due=None):
+    """
+    Queue a fold once `due` turns (SUMMARY_ROLLING_EVERY by default) wait behind the verbatim window. The
+    job is keyed by the summary's position, so callers racing on the same turns share one job.
+    """
+    due = settings.SUMMARY_ROLLING_EVERY if due is None else due
+    if due <= 0 or conversation.status != 'active':
+        return None
+    # Bounded probe instead of a count, so old conversations without a summary stay cheap
+    probe = _verbatim_turns() + due
+    if not _unsummarized(conversation)[probe - 1:probe].exists():
+        return None
+    position = conversation.context_summary_message_id or 0
+    return enqueue('rolling_summary', conversation, key=f"rolling_summary:{conversation.pk}:{position}")
+
+
+def update_rolling_summary(conversation):
+    """
+    Fold every turn older than the verbatim window into the rolling summary, CONTEXT_FOLD_BATCH turns per
+    LLM call, so no turn is left out of both the summary and the prompt. Returns the number folded.
+    """
+    if conversation.status != 'active':
+        return 0
+    boundary = _unsummarized(conversation).order_by('-id').values_list('id', flat=True)[
+        _verbatim_turns() - 1:_verbatim_turns()
+    ].first()
+    folded = 0
+    while boundary is not None:
+        previous_upto = conversation.context_summary_message_id
+        batch = list(_unsummarized(conversation).filter(id__lt=boundary)[:settings.CONTEXT_FOLD_BATCH])
+        if not batch:
+            break
+        summary = fold_into_summary(conversation.context_summary, batch)
+        fields = {
+            'context_summary': summary,
+            'context_summary_message_id': batch[-1].id,
+            'summary': summary,
+            'summary_status': 'rolling',
+        }
+        before = conversation_counts(conversation)
+        with transaction.atomic():
+            # Stop if another fold moved the summary meanwhile or the conversation was ended
+            updated = Conversation.objects.filter(
+                pk=conversation.pk, status='active', context_summary_message_id=previous_upto
+            ).update(**fields)
+            if not updated:
+                break
+            for field, value in fields.items():
+                setattr(conversation, field, value)
+            record_conversation(conversation, before)
+            touch_conversation(conversation)
+            # Digests pick the new summary up on their next refresh; ending the conversation schedules one
+            mark_conversation_stale(conversation)
+            conversation_changed('conversation.summarized', conversation, summary=summary)
+        folded += len(batch)
+
+    if folded:
+        schedule_indexing(conversation, f"summary-{conversation.context_summary_message_id}")
+    return folded
+
+
+def final_transcript(conversation):
+    """
+    Extraction input for an ended conversation: the rolling summary plus the turns after it when there is
+    one, so finalizing stays cheap however long the conversation got; otherwise the full transcript.
+    """
+    if conversation.context_summary_message_id and conversation.context_summary:
+        latest = build_transcript(_unsummarized(conversation).iterator())
+        return f"Summary of the conversation so far:\n{conversation.context_summary}\n\nLatest turns:\n{latest}"
+    return build_transcript(conversation.messages.order_by('id').iterator())
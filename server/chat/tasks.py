@@ -0,0 +1,79 @@
+from django.db import transaction
+
+from .events import conversation_changed, message_created, publish
+from .extraction import extract
+from .jobs import handler
+from .memory import refresh, schedule_refresh
+from .models import Conversation, Message
+from .pdf import render_artifact
+from .rollups import conversation_counts, record_conversation, record_message
+from .search import index_conversation, schedule_indexing
+from .summaries import final_transcript, update_rolling_summary
+from .versioning import touch_conversation
+
+
+def mark_summary_failed(job):
+    Conversation.objects.filter(pk=job.conversation_id).update(summary_status='failed')
+    touch_conversation(job.conversation_id)
+    publish(job.conversation.user_id, 'conversation.summary_failed', conversation_id=job.conversation_id)
+
+
+@handler('summarize_conversation', on_failure=mark_summary_failed)
+def summarize_conversation(job):
+    conversation = job.conversation
+    if conversation.summary_status == 'done':
+        return {"skipped": True}
+
+    Conversation.objects.filter(pk=conversation.pk).update(summary_status='processing')
+    touch_conversation(conversation)
+
+    transcript = final_transcript(conversation)
+    extracted = extract(transcript)
+    summary = extracted["summary"]
+    key_points = extracted["key_points"]
+    insights = extracted["insights"]
+
+    before = conversation_counts(conversation)
+    with transaction.atomic():
+        conversation.summary = summary
+        conversation.key_points = key_points
+        conversation.insights = insights
+        conversation.summary_status = 'done'
+        conversation.save(update_fields=['summary', 'key_points', 'insights', 'summary_status'])
+        record_conversation(conversation, before)
+
+        summary_message = Message.objects.create(
+            conversation=conversation,
+            sender='ai',
+            content=f"**Conversation Summary**\n\n{summary}"
+        )
+        record_message(summary_message, user_id=conversation.user_id)
+        touch_conversation(conversation)
+        schedule_refresh(conversation)
+        conversation_changed(
+            'conversation.summarized', conversation, summary=summary, key_points=key_points, insights=insights
+        )
+        message_created(summary_message, conversation.user_id, conversation.version)
+
+    schedule_indexing(conversation, summary_message.pk)
+    return {"summary_length": len(summary), "key_points": len(key_points)}
+
+
+@handler('index_conversation')
+def index_conversation_job(job):
+    return {"embedded": index_conversation(job.conversation)}
+
+
+@handler('refresh_memory')
+def refresh_memory(job):
+    return {"rebuilt": refresh(job.payload['user_id'])}
+
+
+@handler('render_pdf')
+def render_pdf_job(job):
+    return {"version": render_artifact(job.conversation)}
+
+
+@handler('rolling_summary')
+def rolling_summary(job):
+    return {"folded": update_rolling_summary(job.conversation)}
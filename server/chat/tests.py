@@ -1 +1,1206 @@
-from django.test import TestCase
+import asyncio
+import json
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import date, timedelta
+from pathlib import Path
+from unittest import mock
+
+from asgiref.sync import async_to_sync, sync_to_async
+from channels.layers import get_channel_layer
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import cache
+from django.core.signals import request_finished
+from django.db import close_old_connections, connection, transaction
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+import numpy as np
+from rest_framework.test import APIClient
+
+from .admission import AdmissionController, CacheAdmissionStore, LocalAdmissionStore, Rejected
+from .consumers import EventConsumer
+from .context import build_prompt
+from .events import group_name, publish
+from .fulltext import keyword_search
+from .llm import FakeProvider, FaultyProvider, LLMClient, LLMTimeoutError, get_client
+from . import jobs, metrics, pdf
+from .llm_cache import LocalLRUCache, ResponseCache, response_cache
+from .memory import digests_for, mark_conversation_stale, period, refresh, route
+from .models import Conversation, Embedding, Job, MemoryDigest, Message
+from .versioning import touch_conversation
+from .views import ConversationViewSet
+from .pagination import encode_cursor
+from .pdf import artifact_path, render_artifact, render_in_pool
+from .resilience import CircuitBreaker, CircuitOpenError, RetryPolicy, SharedSemaphore, TransientLLMError, hedged
+from .rollups import find_drift, rebuild, stored_rollups
+from .search import VectorIndex
+from .threads import active_path, message_tree
+from .summaries import schedule_rolling_summary, update_rolling_summary
+
+
+class AuthTests(TestCase):
+    def test_register_logs_the_new_user_in(self):
+        client = APIClient()
+        response = client.post('/api/auth/register/', {'username': 'alice', 'password': 'pw-12345'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(client.get('/api/auth/user/').json()['username'], 'alice')
+        self.assertEqual(User.objects.filter(username='alice').count(), 1)
+
+    def test_login_and_cached_user_session(self):
+        User.objects.create_user('bob', password='pw-12345')
+        client = APIClient()
+        response = client.post('/api/auth/login/', {'username': 'bob', 'password': 'pw-12345'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(client.get('/api/auth/user/').status_code, 200)
+        # Served from the user cache on the second request
+        self.assertEqual(client.get('/api/auth/user/').json()['username'], 'bob')
+
+    def test_password_change_ends_other_sessions(self):
+        user = User.objects.create_user('carol', password='pw-12345')
+        client = APIClient()
+        client.post('/api/auth/login/', {'username': 'carol', 'password': 'pw-12345'}, format='json')
+        self.assertEqual(client.get('/api/auth/user/').status_code, 200)
+        user.set_password('changed-pw')
+        user.save()
+        self.assertEqual(client.get('/api/auth/user/').status_code, 403)
+
+    def test_wrong_password_is_rejected(self):
+        User.objects.create_user('dave', password='pw-12345')
+        response = APIClient().post('/api/auth/login/', {'username': 'dave', 'password': 'nope'}, format='json')
+        self.assertEqual(response.status_code, 401)
+
+
+class ExportStreamingTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('erin')
+        self.conversation = Conversation.objects.create(user=self.user, title='Long')
+        Message.objects.bulk_create([
+            Message(conversation=self.conversation, sender='user', content=f"message {i}") for i in range(300)
+        ])
+
+    async def test_exports_stream_asynchronously_under_asgi(self):
+        await self.async_client.aforce_login(self.user)
+        for path in (f'/api/conversations/{self.conversation.pk}/export/', '/api/conversations/export_all/'):
+            response = await self.async_client.get(path)
+            self.assertEqual(response.status_code, 200)
+            # A sync iterator would be drained into memory by the ASGI handler before the first byte
+            self.assertTrue(response.is_async)
+            body = b"".join([chunk async for chunk in response.streaming_content])
+            self.assertIn(b"message 299", body)
+
+    def test_json_export_is_valid_under_wsgi(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.get(f'/api/conversations/{self.conversation.pk}/export/')
+        self.assertFalse(response.is_async)
+        data = json.loads(b"".join(response.streaming_content))
+        self.assertEqual(len(data['messages']), 300)
+
+
+class RetryPolicyTests(SimpleTestCase):
+    def test_only_transient_errors_are_retried(self):
+        policy = RetryPolicy(attempts=3, base_delay=0.5, max_delay=8, budget=60)
+        self.assertIsNotNone(policy.next_delay(TransientLLMError(), 1, 0))
+        self.assertIsNotNone(policy.next_delay(ConnectionError(), 1, 0))
+        self.assertIsNone(policy.next_delay(ValueError("bad request"), 1, 0))
+        self.assertIsNone(policy.next_delay(LLMTimeoutError(), 1, 0))
+
+    def test_backoff_is_jittered_capped_and_bounded(self):
+        policy = RetryPolicy(attempts=10, base_delay=0.5, max_delay=2, budget=60)
+        for attempt, cap in ((1, 0.5), (2, 1), (3, 2), (6, 2)):
+            for _ in range(50):
+                self.assertTrue(0 <= policy.next_delay(TransientLLMError(), attempt, 0) <= cap)
+        self.assertIsNone(policy.next_delay(TransientLLMError(), 10, 0))
+        self.assertIsNone(RetryPolicy(attempts=5, base_delay=1, budget=1).next_delay(TransientLLMError(), 1, 1))
+
+
+class CircuitBreakerTests(SimpleTestCase):
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch('chat.resilience.time.monotonic', side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30)
+
+    def _open(self):
+        for _ in range(3):
+            self.breaker.before_call()
+            self.breaker.record(TransientLLMError())
+
+    def test_opens_after_consecutive_failures(self):
+        self._open()
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        with self.assertRaises(CircuitOpenError) as raised:
+            self.breaker.before_call()
+        self.assertEqual(raised.exception.retry_after, 30)
+
+    def test_half_open_lets_one_trial_through_and_closes_on_success(self):
+        self._open()
+        self.now += 31
+        self.breaker.before_call()
+        self.assertEqual(self.breaker.state, CircuitBreaker.HALF_OPEN)
+        with self.assertRaises(CircuitOpenError):
+            self.breaker.before_call()
+        self.breaker.record_success()
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+        self.breaker.before_call()
+
+    def test_failed_trial_reopens(self):
+        self._open()
+        self.now += 31
+        self.breaker.before_call()
+        self.breaker.record(LLMTimeoutError())
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+
+    def test_non_retryable_errors_leave_the_state_alone(self):
+        self._open()
+        self.now += 31
+        self.breaker.before_call()
+        self.breaker.record(ValueError("bad request"))
+        self.assertEqual(self.breaker.state, CircuitBreaker.HALF_OPEN)
+        # The trial slot is free again for the next call
+        self.breaker.before_call()
+
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30)
+        breaker.record(TransientLLMError())
+        breaker.record(ValueError("bad request"))
+        breaker.record(TransientLLMError())
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+
+
+class HedgedTests(SimpleTestCase):
+    async def test_slow_attempt_is_raced_and_cancelled(self):
+        calls = []
+        cancelled = asyncio.Event()
+
+        async def attempt():
+            calls.append(len(calls))
+            if len(calls) == 1:
+                try:
+                    await asyncio.sleep(10)
+                except asyncio.CancelledError:
+                    cancelled.set()
+                    raise
+            return f"attempt {len(calls)}"
+
+        self.assertEqual(await hedged(attempt, 0.01), "attempt 2")
+        await asyncio.wait_for(cancelled.wait(), 1)
+        self.assertEqual(len(calls), 2)
+
+    async def test_fast_attempt_is_not_hedged(self):
+        calls = []
+
+        async def attempt():
+            calls.append(1)
+            return "done"
+
+        self.assertEqual(await hedged(attempt, 1), "done")
+        self.assertEqual(len(calls), 1)
+
+
+class CountingProvider(FakeProvider):
+    """Fake that fails its first `failures` calls, either before or after the first stream chunk."""
+
+    def __init__(self, failures=0, after_first_chunk=False):
+        super().__init__(chunk_size=4)
+        self.failures = failures
+        self.after_first_chunk = after_first_chunk
+        self.calls = 0
+
+    async def generate(self, prompt, json_output=False):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise TransientLLMError("flaky")
+        return await super().generate(prompt, json_output)
+
+    async def stream(self, prompt):
+        self.calls += 1
+        failing = self.calls <= self.failures
+        if failing and not self.after_first_chunk:
+            raise TransientLLMError("flaky")
+        async for chunk in super().stream(prompt):
+            yield chunk
+            if failing:
+                raise TransientLLMError("dropped")
+
+
+class LLMClientTests(SimpleTestCase):
+    def _client(self, provider, **kwargs):
+        return LLMClient(provider, timeout=kwargs.pop('timeout', 5), retry=RetryPolicy(attempts=3, base_delay=0), **kwargs)
+
+    async def _stream(self, client):
+        return [chunk async for chunk in client.stream("hi")]
+
+    async def test_transient_failures_are_retried(self):
+        provider = CountingProvider(failures=2)
+        self.assertEqual(await self._client(provider).generate("hi"), provider.reply)
+        self.assertEqual(provider.calls, 3)
+
+    async def test_always_failing_fake_gives_up_after_the_attempts(self):
+        provider = FaultyProvider(FakeProvider(), error_rate=1.0)
+        with self.assertRaises(TransientLLMError):
+            await self._client(provider).generate("hi")
+
+    async def test_timeouts_are_not_retried(self):
+        provider = FaultyProvider(FakeProvider(), slow_rate=1.0, slow_latency=10)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        with self.assertRaises(LLMTimeoutError):
+            await self._client(provider, timeout=0.05).generate("hi")
+        self.assertLess(loop.time() - started, 1)
+
+    async def test_open_breaker_fails_fast(self):
+        # Three attempts of the first call open the breaker
+        breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30)
+        client = self._client(FaultyProvider(FakeProvider(), error_rate=1.0), breaker=breaker)
+        with self.assertRaises(TransientLLMError):
+            await client.generate("hi")
+        with self.assertRaises(CircuitOpenError):
+            await client.generate("hi")
+
+    async def test_stream_retries_before_the_first_chunk(self):
+        provider = CountingProvider(failures=1)
+        self.assertEqual("".join(await self._stream(self._client(provider))), provider.reply)
+        self.assertEqual(provider.calls, 2)
+
+    async def test_stream_does_not_retry_after_the_first_chunk(self):
+        provider = CountingProvider(failures=1, after_first_chunk=True)
+        chunks = []
+        with self.assertRaises(TransientLLMError):
+            async for chunk in self._client(provider).stream("hi"):
+                chunks.append(chunk)
+        self.assertEqual(chunks, [provider.reply[:4]])
+        self.assertEqual(provider.calls, 1)
+
+
+class ConcurrencyProbe(FakeProvider):
+    """Fake that records the most calls it ever had in flight at once."""
+
+    def __init__(self):
+        super().__init__(latency=0.05)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.peak = 0
+
+    async def generate(self, prompt, json_output=False):
+        with self._lock:
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+        try:
+            return await super().generate(prompt, json_output)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+
+class SharedConcurrencyTests(SimpleTestCase):
+    def test_sync_callers_on_separate_loops_share_the_cap(self):
+        provider = ConcurrencyProbe()
+        client = LLMClient(provider, max_concurrency=2)
+        # Each async_to_sync call from a fresh thread runs on an event loop of its own
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            replies = list(pool.map(lambda _: async_to_sync(client.generate)("hi"), range(8)))
+        self.assertEqual(replies, [provider.reply] * 8)
+        self.assertEqual(provider.peak, 2)
+
+    async def test_cancelled_waiter_does_not_leak_a_slot(self):
+        semaphore = SharedSemaphore(1)
+        await semaphore.acquire()
+        waiter = asyncio.ensure_future(semaphore.acquire())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        semaphore.release()
+        with self.assertRaises(asyncio.CancelledError):
+            await waiter
+        await asyncio.wait_for(semaphore.acquire(), 1)
+
+
+def sse_events(body):
+    events = []
+    for block in body.decode().strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.split("\n"))
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+@override_settings(ADMISSION_RATE=1000, ADMISSION_BURST=1000, ADMISSION_MAX_CONCURRENT=100)
+class StreamingReplyTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('frank')
+        self.conversation = Conversation.objects.create(user=self.user, title='Stream')
+        from . import admission
+        admission.get_admission.cache_clear()
+        self.addCleanup(admission.get_admission.cache_clear)
+
+    def _client(self, provider):
+        patcher = mock.patch('chat.views.get_client', return_value=LLMClient(provider, retry=RetryPolicy(attempts=1)))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def _post(self, content="Hello"):
+        await self.async_client.aforce_login(self.user)
+        return await self.async_client.post(
+            f'/api/conversations/{self.conversation.pk}/send_message/?stream=true',
+            {'content': content}, content_type='application/json',
+        )
+
+    async def test_tokens_arrive_in_order_then_done(self):
+        provider = FakeProvider(chunk_size=5)
+        self._client(provider)
+        response = await self._post()
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        events = sse_events(b"".join([chunk async for chunk in response.streaming_content]))
+        names = [name for name, _ in events]
+        self.assertEqual(names[-1], 'done')
+        self.assertEqual(set(names[:-1]), {'token'})
+        self.assertEqual("".join(data['content'] for _, data in events[:-1]), provider.reply)
+        done = events[-1][1]
+        ai_message = await Message.objects.aget(pk=done['id'])
+        self.assertEqual(ai_message.content, provider.reply)
+        self.assertEqual(ai_message.sender, 'ai')
+
+    async def test_ai_prefix_is_stripped(self):
+        self._client(FakeProvider(reply="AI: Hi there, friend", chunk_size=2))
+        response = await self._post()
+        events = sse_events(b"".join([chunk async for chunk in response.streaming_content]))
+        self.assertEqual("".join(data['content'] for name, data in events if name == 'token'), "Hi there, friend")
+        self.assertEqual(events[-1][1]['ai_response'], "Hi there, friend")
+
+    async def test_user_message_is_saved_before_streaming(self):
+        self._client(FakeProvider())
+        response = await self._post("Saved first")
+        chunks = response.streaming_content
+        await chunks.__anext__()
+        self.assertTrue(await Message.objects.filter(sender='user', content="Saved first").aexists())
+        self.assertFalse(await Message.objects.filter(sender='ai').aexists())
+        [chunk async for chunk in chunks]
+        self.assertTrue(await Message.objects.filter(sender='ai').aexists())
+
+    async def test_provider_failure_sends_an_error_event(self):
+        self._client(FaultyProvider(FakeProvider(), error_rate=1.0))
+        with self.assertLogs('chat.views', level='ERROR'):
+            response = await self._post()
+            events = sse_events(b"".join([chunk async for chunk in response.streaming_content]))
+        self.assertEqual([name for name, _ in events], ['error', 'done'])
+        self.assertEqual(events[-1][1]['ai_response'], events[0][1]['content'])
+
+    async def test_disconnect_keeps_the_partial_reply(self):
+        provider = FakeProvider(chunk_size=5)
+        self._client(provider)
+        user_message = await Message.objects.acreate(conversation=self.conversation, sender='user', content="Hi")
+        stream = ConversationViewSet()._stream_ai_response(self.conversation, user_message, "Hi", {})
+        await stream.__anext__()
+        await stream.__anext__()
+        await stream.aclose()
+        ai_message = await Message.objects.aget(sender='ai')
+        self.assertEqual(ai_message.content, provider.reply[:10].strip())
+
+    async def test_stream_holds_the_admission_slot_until_closed(self):
+        from .admission import get_admission
+        self._client(FakeProvider())
+        response = await self._post()
+        active = get_admission().store._active
+        self.assertEqual(active[str(self.user.pk)], 1)
+        # Closed before the first chunk, as when the client goes away early. Closing fires
+        # request_finished, which would close the test's database connection
+        request_finished.disconnect(close_old_connections)
+        try:
+            await sync_to_async(response.close)()
+        finally:
+            request_finished.connect(close_old_connections)
+        self.assertEqual(active[str(self.user.pk)], 0)
+
+
+class SharedSnapshotTests(TestCase):
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.user = User.objects.create_user('gina')
+        self.conversation = Conversation.objects.create(user=self.user, title='Shared', share_token='token-1')
+
+    def _fetch(self):
+        response = APIClient().get('/api/conversations/shared/token-1/')
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    @override_settings(SHARED_SNAPSHOT_LOCAL_POINTER_TTL=0)
+    def test_changes_made_by_another_process_reach_a_local_cache(self):
+        self.assertEqual(self._fetch()['title'], 'Shared')
+        # As a job worker would: the row changes but this process's cache hears nothing
+        Conversation.objects.filter(pk=self.conversation.pk).update(title='Renamed', version=5)
+        self.assertEqual(self._fetch()['title'], 'Renamed')
+
+    def test_unchanged_snapshot_is_not_rebuilt(self):
+        from . import snapshots
+        self._fetch()
+        self._fetch()
+        self.assertEqual(snapshots.share_stats('token-1'), {"hits": 2, "builds": 1})
+
+
+class JobQueueTests(TestCase):
+    def setUp(self):
+        import chat.tasks  # noqa: F401 - registers the job handlers
+        self.user = User.objects.create_user('hank')
+        self.conversation = Conversation.objects.create(user=self.user, title='Jobs')
+        Message.objects.create(conversation=self.conversation, sender='user', content="Plan the release")
+
+    def _drain(self):
+        while True:
+            claimed = jobs.claim(10)
+            if not claimed:
+                return
+            for job in claimed:
+                jobs.run(job)
+
+    @override_settings(JOB_MAX_ATTEMPTS=1)
+    def test_ending_again_retries_a_failed_summary(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        with mock.patch('chat.tasks.extract', side_effect=RuntimeError("provider down")), \
+                self.assertLogs('chat.jobs', level='ERROR'):
+            job_id = client.post(f'/api/conversations/{self.conversation.pk}/end/').json()['job_id']
+            self._drain()
+        self.conversation.refresh_from_db()
+        self.assertEqual(self.conversation.summary_status, 'failed')
+
+        response = client.post(f'/api/conversations/{self.conversation.pk}/end/').json()
+        self.assertEqual(response['job_id'], job_id)
+        self.assertEqual(response['summary_status'], 'pending')
+        self.assertEqual(Job.objects.get(pk=job_id).status, 'pending')
+        with mock.patch('chat.tasks.extract', return_value={"summary": "Release plan", "key_points": [], "insights": ""}):
+            self._drain()
+        self.conversation.refresh_from_db()
+        self.assertEqual(self.conversation.summary_status, 'done')
+        self.assertEqual(self.conversation.summary, "Release plan")
+
+    def test_enqueue_is_idempotent_while_the_job_is_alive(self):
+        first = jobs.enqueue('index_conversation', self.conversation, key='k')
+        self.assertEqual(jobs.enqueue('index_conversation', self.conversation, key='k').pk, first.pk)
+        self.assertEqual(Job.objects.filter(idempotency_key='k').count(), 1)
+
+
+@override_settings(CONTEXT_RECENT_MESSAGES=4, CONTEXT_FOLD_BATCH=3, SUMMARY_ROLLING_EVERY=2)
+class RollingSummaryTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('iris')
+        self.conversation = Conversation.objects.create(user=self.user, title='Rolling')
+        self.messages = [
+            Message.objects.create(conversation=self.conversation, sender='user', content=f"turn {i}")
+            for i in range(9)
+        ]
+
+    def test_one_job_folds_the_whole_gap_into_the_shared_summary(self):
+        self.assertIsNotNone(schedule_rolling_summary(self.conversation))
+        with mock.patch('chat.summaries.fold_into_summary', side_effect=lambda previous, batch: (
+            f"{previous or ''}{''.join(m.content[-1] for m in batch)}"
+        )) as fold, mock.patch('chat.summaries.schedule_indexing'):
+            self.assertEqual(update_rolling_summary(self.conversation), 7)
+
+        # Two turns stay verbatim; everything older is covered, in batches of CONTEXT_FOLD_BATCH
+        self.assertEqual(fold.call_count, 3)
+        self.conversation.refresh_from_db()
+        self.assertEqual(self.conversation.context_summary, "0123456")
+        self.assertEqual(self.conversation.summary, "0123456")
+        self.assertEqual(self.conversation.summary_status, 'rolling')
+        self.assertEqual(self.conversation.context_summary_message_id, self.messages[6].id)
+        self.assertFalse(Job.objects.filter(kind='refresh_memory').exists())
+        self.assertIsNone(schedule_rolling_summary(self.conversation))
+
+    def test_prompt_overflow_schedules_a_fold_instead_of_calling_the_llm(self):
+        user_message = Message.objects.create(conversation=self.conversation, sender='user', content="next")
+        with mock.patch('chat.context.generate_text') as generate:
+            prompt, metrics = build_prompt(self.conversation, user_message)
+        generate.assert_not_called()
+        self.assertTrue(metrics["truncated"])
+        self.assertEqual(metrics["recent_messages"], 4)
+        self.assertIn("turn 8", prompt)
+
+        schedule_rolling_summary(self.conversation, due=1)
+        with mock.patch('chat.summaries.fold_into_summary', return_value="Earlier turns"), \
+                mock.patch('chat.summaries.schedule_indexing'):
+            update_rolling_summary(self.conversation)
+        prompt, metrics = build_prompt(self.conversation, user_message)
+        self.assertFalse(metrics["truncated"])
+        self.assertIn("Earlier turns", prompt)
+        # Nothing between the summary and the recent turns is missing
+        self.assertEqual(self.conversation.context_summary_message_id, self.messages[7].id)
+        self.assertEqual(metrics["recent_messages"], 1)
+
+
+class SearchTests(TestCase):
+    def test_ivf_search_with_only_empty_buckets_returns_nothing(self):
+        index = VectorIndex([1, 2, 3], [[1.0, 0.0], [0.9, 0.1], [1.0, 0.05]], approximate=True, nprobe=1)
+        # A centroid no vector is assigned to, closest to the query
+        index.centroids = np.vstack((index.centroids, [[0.0, 1.0]]))
+        index._build_lists()
+        self.assertEqual(len(index._candidates(np.array([0.0, 1.0], dtype=np.float32))), 0)
+        self.assertEqual(index.search([0.0, 1.0], 2), ([], []))
+
+    def test_editing_a_message_embeds_it_again(self):
+        user = User.objects.create_user('june')
+        conversation = Conversation.objects.create(user=user, title='Search')
+        message = Message.objects.create(conversation=conversation, sender='user', content="old text")
+        Embedding.objects.create(
+            user=user, conversation=conversation, message=message, kind='message', text="old text",
+            vector=b"", model_name='m',
+        )
+        client = APIClient()
+        client.force_authenticate(user)
+        response = client.patch(f'/api/messages/{message.pk}/', {'content': "new text"}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Embedding.objects.filter(message=message).exists())
+        self.assertTrue(Job.objects.filter(kind='index_conversation', conversation=conversation, status='pending').exists())
+
+    def test_keyword_headlines_escape_the_message_text(self):
+        user = User.objects.create_user('kim')
+        conversation = Conversation.objects.create(user=user, title='Markup')
+        Message.objects.create(conversation=conversation, sender='user', content="<script>alert(1)</script> cats & dogs")
+        headline = keyword_search(user, "cats")['messages'][0]['headline']
+        self.assertEqual(headline, "&lt;script&gt;alert(1)&lt;/script&gt; <mark>cats</mark> &amp; dogs")
+
+    def test_keyword_title_headlines_are_escaped(self):
+        user = User.objects.create_user('lena')
+        Conversation.objects.create(user=user, title="<b>Cats</b> & care")
+        hit = keyword_search(user, "cats")['conversations'][0]
+        self.assertEqual(hit['title_headline'], "&lt;b&gt;<mark>Cats</mark>&lt;/b&gt; &amp; care")
+
+    def test_keyword_facets_are_only_counted_on_the_first_page(self):
+        user = User.objects.create_user('milo')
+        conversation = Conversation.objects.create(user=user, title='Pets')
+        for i in range(3):
+            Message.objects.create(conversation=conversation, sender='user', content=f"cats {i}")
+        first = keyword_search(user, "cats", limit=2)
+        self.assertEqual(first['facets']['total'], 3)
+        with CaptureQueriesContext(connection) as queries:
+            second = keyword_search(user, "cats", cursor=first['next_cursor'], limit=2)
+        self.assertIsNone(second['facets'])
+        self.assertEqual(len(second['messages']), 1)
+        self.assertEqual(len(queries), 1)
+
+
+class ResponseCacheMetricsTests(SimpleTestCase):
+    @override_settings(LLM_CACHE_TTLS={'test_scope': 60})
+    def test_lookups_are_exported_on_the_metrics_registry(self):
+        cache = ResponseCache(LocalLRUCache(10))
+        for bypass in (False, False, True):
+            cache.get_or_compute('test_scope', 'model', "prompt", lambda: "answer", bypass=bypass)
+        rendered = metrics.LLM_CACHE_LOOKUPS.render()
+        for outcome in ('miss', 'local_hit', 'bypass'):
+            self.assertIn(f'llm_cache_lookups_total{{scope="test_scope",outcome="{outcome}"}} 1', rendered)
+
+
+class CursorTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('lena')
+        self.conversation = Conversation.objects.create(user=self.user, title='Cursors')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_cursor_fields_of_the_wrong_type_are_rejected(self):
+        for cursor in (
+            encode_cursor({"timestamp": 123, "id": 1}),
+            encode_cursor({"timestamp": "2026-01-01T00:00:00+00:00", "id": "1"}),
+            encode_cursor({"timestamp": "2026-01-01T00:00:00+00:00", "id": True}),
+            encode_cursor([1, 2]),
+        ):
+            response = self.client.get(f'/api/conversations/{self.conversation.pk}/messages/', {'before': cursor})
+            self.assertEqual(response.status_code, 400, cursor)
+        response = self.client.get(
+            '/api/conversations/search/', {'q': "cats", 'cursor': encode_cursor({"rank": "high", "id": 1})}
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_valid_cursor_is_accepted(self):
+        message = Message.objects.create(conversation=self.conversation, sender='user', content="Hi")
+        cursor = encode_cursor({"timestamp": message.timestamp.isoformat(), "id": message.id + 1})
+        response = self.client.get(f'/api/conversations/{self.conversation.pk}/messages/', {'before': cursor})
+        self.assertEqual(response.status_code, 200)
+
+
+class VersioningTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('mona')
+        self.conversation = Conversation.objects.create(user=self.user, title='Versions')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = f'/api/conversations/{self.conversation.pk}/'
+
+    def test_unchanged_conversation_revalidates_with_304(self):
+        etag = self.client.get(self.url)['ETag']
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        self.client.patch(self.url, {'title': "Renamed"}, format='json')
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_save_does_not_write_back_a_stale_version(self):
+        stale = Conversation.objects.get(pk=self.conversation.pk)
+        # A concurrent request bumps the version after `stale` was loaded
+        touch_conversation(self.conversation.pk)
+        bumped = Conversation.objects.get(pk=self.conversation.pk).version
+        stale.title = "Renamed"
+        stale.save()
+        self.assertEqual(Conversation.objects.get(pk=self.conversation.pk).version, bumped)
+
+    def test_update_during_a_bump_never_reuses_an_etag(self):
+        seen = {self.client.get(self.url)['ETag']}
+        original_save = Conversation.save
+
+        def save_after_concurrent_touch(instance, *args, **kwargs):
+            touch_conversation(instance.pk)
+            seen.add(self.client.get(self.url)['ETag'])
+            original_save(instance, *args, **kwargs)
+
+        with mock.patch.object(Conversation, 'save', save_after_concurrent_touch):
+            self.client.patch(self.url, {'title': "Renamed"}, format='json')
+        final = self.client.get(self.url)
+        self.assertEqual(final.json()['title'], "Renamed")
+        self.assertNotIn(final['ETag'], seen)
+
+    def test_sharing_keeps_the_version_moving_forward(self):
+        stale_version = self.conversation.version
+        touch_conversation(self.conversation.pk)
+        with mock.patch('chat.views.ConversationViewSet.get_object', return_value=self.conversation):
+            self.client.post(f'{self.url}share/')
+        self.conversation.refresh_from_db()
+        self.assertEqual(self.conversation.version, stale_version + 2)
+
+
+@override_settings(PDF_RENDER_WORKERS=0)
+class PdfExportTests(TestCase):
+    def setUp(self):
+        import chat.tasks  # noqa: F401 - registers the job handlers
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        self.cache_dir = Path(cache_dir.name)
+        override = override_settings(PDF_CACHE_DIR=cache_dir.name)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.user = User.objects.create_user('nina')
+        self.conversation = Conversation.objects.create(user=self.user, title='PDF')
+        Message.objects.create(conversation=self.conversation, sender='user', content="Hello")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = f'/api/conversations/{self.conversation.pk}/export/?format=pdf'
+
+    def test_render_happens_in_a_job_then_the_export_is_served(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 202)
+        self.assertIn('Retry-After', response)
+        self.assertNotIn('ETag', response)
+        job = Job.objects.get(pk=response.json()['job_id'])
+        self.assertEqual(job.kind, 'render_pdf')
+        self.assertEqual(self.client.get(self.url).json()['job_id'], job.id)
+
+        jobs.run(jobs.claim(1)[0])
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertTrue(b"".join(response.streaming_content).startswith(b"%PDF"))
+        self.assertIn('ETag', response)
+
+    def test_render_only_discards_older_versions(self):
+        touch_conversation(self.conversation)
+        newer = artifact_path(self.conversation.pk, self.conversation.version + 1)
+        older = artifact_path(self.conversation.pk, self.conversation.version - 1)
+        for path in (newer, older):
+            path.write_bytes(b"%PDF stale")
+
+        self.assertEqual(render_artifact(self.conversation), self.conversation.version)
+        self.assertTrue(artifact_path(self.conversation.pk, self.conversation.version).exists())
+        self.assertTrue(newer.exists())
+        self.assertFalse(older.exists())
+
+    @override_settings(PDF_RENDER_WORKERS=1)
+    def test_broken_pool_is_replaced(self):
+        broken = mock.Mock()
+        broken.submit.side_effect = BrokenProcessPool("worker died")
+        with mock.patch('chat.pdf._pool', broken):
+            with self.assertRaises(BrokenProcessPool):
+                render_in_pool({})
+            self.assertIsNone(pdf._pool)
+        broken.shutdown.assert_called_once()
+
+
+class ConversationListTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('olga')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _create(self, count, messages=2):
+        created = []
+        for i in range(count):
+            conversation = Conversation.objects.create(user=self.user, title=f"Conversation {i}")
+            for j in range(messages):
+                Message.objects.create(conversation=conversation, sender='user', content=f"Message {j} of {i}")
+            created.append(conversation)
+        return created
+
+    def _queries_for_list(self):
+        with CaptureQueriesContext(connection) as captured:
+            self.assertEqual(self.client.get('/api/conversations/', {'page_size': 50}).status_code, 200)
+        return len(captured)
+
+    def test_query_count_does_not_grow_with_the_page(self):
+        self._create(1)
+        few = self._queries_for_list()
+        self._create(20, messages=3)
+        self.assertEqual(self._queries_for_list(), few)
+
+    def test_cursor_pages_cover_every_conversation_once(self):
+        created = self._create(5)
+        archived = Conversation.objects.create(user=self.user, title="Archived", is_archived=True)
+        Conversation.objects.create(user=User.objects.create_user('other'), title="Not mine")
+
+        seen = []
+        url = '/api/conversations/?page_size=2'
+        while url:
+            page = self.client.get(url).json()
+            self.assertLessEqual(len(page['results']), 2)
+            seen.extend(row['id'] for row in page['results'])
+            url = page['next']
+        self.assertEqual(seen, [str(c.pk) for c in reversed(created)])
+
+        shown = self.client.get('/api/conversations/', {'show_archived': 'true', 'page_size': 50}).json()
+        self.assertIn(str(archived.pk), [row['id'] for row in shown['results']])
+
+    def test_rows_carry_message_annotations(self):
+        conversation, empty = self._create(1, messages=3)[0], self._create(1, messages=0)[0]
+        rows = {row['id']: row for row in self.client.get('/api/conversations/').json()['results']}
+        row = rows[str(conversation.pk)]
+        self.assertEqual(row['message_count'], 3)
+        self.assertEqual(row['last_message_preview'], "Message 2 of 0")
+        self.assertIsNotNone(row['last_message_at'])
+        self.assertNotIn('summary', row)
+        self.assertEqual(rows[str(empty.pk)]['message_count'], 0)
+        self.assertIsNone(rows[str(empty.pk)]['last_message_preview'])
+
+
+@override_settings(ADMISSION_RATE=1000, ADMISSION_BURST=1000, ADMISSION_MAX_CONCURRENT=100)
+class RollupTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('pia')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _post_message(self, conversation_id, sender, content):
+        return self.client.post(
+            '/api/messages/', {'conversation': conversation_id, 'sender': sender, 'content': content}, format='json'
+        ).json()
+
+    def test_incremental_counters_match_a_rebuild(self):
+        first = self.client.post('/api/conversations/', {'title': "First"}, format='json').json()['id']
+        second = self.client.post('/api/conversations/', {'title': "Second"}, format='json').json()['id']
+        kept = self._post_message(first, 'user', "Hello")
+        self._post_message(first, 'ai', "Hi")
+        dropped = self._post_message(second, 'user', "Bye")
+        self.client.post(f"/api/messages/{kept['id']}/bookmark/")
+        self.client.post('/api/messages/bulk_bookmark/', {'ids': [kept['id'], dropped['id']]}, format='json')
+        self.client.post(f'/api/conversations/{first}/archive/')
+        self.client.patch(f'/api/conversations/{first}/', {'summary': "Greetings"}, format='json')
+        self.client.delete(f"/api/messages/{dropped['id']}/")
+        self.client.post(f'/api/conversations/{second}/end/')
+        self.client.delete(f'/api/conversations/{second}/')
+
+        self.assertEqual(find_drift([self.user.pk]), [])
+        stored = stored_rollups([self.user.pk])
+        totals = {name: sum(row[name] for row in stored.values()) for name in next(iter(stored.values()))}
+        self.assertEqual(totals, {
+            'conversations': 1, 'ended_conversations': 0, 'archived_conversations': 1,
+            'summarized_conversations': 1, 'messages': 2, 'user_messages': 1, 'ai_messages': 1,
+            'bookmarked_messages': 1,
+        })
+        rebuild([self.user.pk])
+        self.assertEqual(stored_rollups([self.user.pk]), stored)
+
+    def test_analytics_totals_come_from_the_rollups(self):
+        conversation = self.client.post('/api/conversations/', {'title': "Stats"}, format='json').json()['id']
+        for sender in ('user', 'ai', 'user'):
+            self._post_message(conversation, sender, "text")
+        self.client.post(f'/api/conversations/{conversation}/end/')
+
+        data = self.client.get('/api/conversations/analytics/').json()
+        self.assertEqual(data['total_conversations'], 1)
+        self.assertEqual(data['total_messages'], 3)
+        self.assertEqual(data['user_message_count'], 2)
+        self.assertEqual(data['ai_message_count'], 1)
+        self.assertEqual(data['ended_conversations'], 1)
+        self.assertEqual(data['active_conversations'], 0)
+        self.assertEqual(data['avg_messages_per_conversation'], 3)
+        self.assertEqual(data['conversations_last_7_days'], 1)
+        self.assertEqual(len(data['conversations_by_date']), 1)
+
+
+class BranchTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('quinn')
+        self.conversation = Conversation.objects.create(user=self.user, title='Branches')
+
+        def add(content, parent=None):
+            return Message.objects.create(conversation=self.conversation, sender='user', content=content, parent=parent)
+
+        self.m1, self.m2 = add("m1"), add("m2")
+        self.b1 = add("b1", self.m2)
+        self.b2 = add("b2", self.b1)
+        self.c1 = add("c1", self.m2)
+        self.m3 = add("m3")
+
+    def test_tree_is_depth_first_with_depths(self):
+        rows = [(message.content, depth) for message, depth in message_tree(self.conversation)]
+        self.assertEqual(rows, [("m1", 0), ("m2", 0), ("b1", 1), ("b2", 2), ("c1", 1), ("m3", 0)])
+
+    def test_tree_endpoint_nests_branches_under_their_fork(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        roots = client.get(f'/api/conversations/{self.conversation.pk}/tree/').json()['messages']
+        self.assertEqual([node['content'] for node in roots], ["m1", "m2", "m3"])
+        self.assertEqual([node['content'] for node in roots[1]['children']], ["b1", "c1"])
+        self.assertEqual(roots[1]['children'][0]['children'][0]['content'], "b2")
+
+    def test_active_path_is_the_mainline_up_to_the_fork_then_the_branch(self):
+        self.assertEqual([m.content for m in active_path(self.conversation, self.b2.id)], ["m1", "m2", "b1", "b2"])
+        self.assertEqual([m.content for m in active_path(self.conversation, self.c1.id)], ["m1", "m2", "c1"])
+        self.assertEqual([m.content for m in active_path(self.conversation, self.b2.id, prefix_limit=0)], ["m2", "b1", "b2"])
+        other = Conversation.objects.create(user=self.user, title='Other')
+        self.assertEqual(active_path(other, self.b2.id), [])
+
+    def test_path_stops_on_a_parent_cycle(self):
+        Message.objects.filter(pk=self.b1.pk).update(parent=self.b2)
+        self.assertEqual(sorted(m.content for m in active_path(self.conversation, self.b2.id)), ["b1", "b2"])
+
+    def test_branch_prompt_uses_its_own_path(self):
+        user_message = Message.objects.create(
+            conversation=self.conversation, sender='user', content="next", parent=self.b2
+        )
+        prompt, metrics = build_prompt(self.conversation, user_message)
+        for content in ("m1", "m2", "b1", "b2"):
+            self.assertIn(f"user: {content}", prompt)
+        for content in ("c1", "m3"):
+            self.assertNotIn(f"user: {content}", prompt)
+        self.assertFalse(metrics["truncated"])
+
+    def test_branch_prompt_only_uses_a_summary_from_before_the_fork(self):
+        user_message = Message.objects.create(
+            conversation=self.conversation, sender='user', content="next", parent=self.b2
+        )
+        self.conversation.context_summary = "Summary of m1"
+        self.conversation.context_summary_message_id = self.m1.id
+        prompt, _ = build_prompt(self.conversation, user_message)
+        self.assertIn("Summary of m1", prompt)
+        self.assertNotIn("user: m1", prompt)
+
+        # A summary reaching past the fork covers mainline turns this branch never saw
+        self.conversation.context_summary = "Summary of m1 to m3"
+        self.conversation.context_summary_message_id = self.m3.id
+        prompt, _ = build_prompt(self.conversation, user_message)
+        self.assertNotIn("Summary of m1 to m3", prompt)
+        self.assertIn("user: m1", prompt)
+
+
+class MutationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('rosa')
+        self.other = User.objects.create_user('sam')
+        self.conversation = Conversation.objects.create(user=self.user, title='Mine')
+        self.foreign = Conversation.objects.create(user=self.other, title='Theirs')
+        self.message = Message.objects.create(conversation=self.conversation, sender='user', content="Hi")
+        self.foreign_message = Message.objects.create(conversation=self.foreign, sender='user', content="Hey")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _version(self, conversation):
+        return Conversation.objects.get(pk=conversation.pk).version
+
+    def test_toggles_flip_and_bump_the_version(self):
+        version = self._version(self.conversation)
+        self.assertTrue(self.client.post(f'/api/conversations/{self.conversation.pk}/archive/').json()['is_archived'])
+        self.assertFalse(self.client.post(f'/api/conversations/{self.conversation.pk}/archive/').json()['is_archived'])
+        self.assertTrue(self.client.post(f'/api/messages/{self.message.pk}/bookmark/').json()['is_bookmarked'])
+        react = f'/api/messages/{self.message.pk}/react/'
+        self.assertEqual(self.client.post(react, {'reaction': "👍"}, format='json').json()['reactions'], ["👍"])
+        self.assertEqual(self.client.post(react, {'reaction': "🎉"}, format='json').json()['reactions'], ["🎉"])
+        self.assertEqual(self.client.post(react, {'reaction': "🎉"}, format='json').json()['reactions'], [])
+        self.assertEqual(self._version(self.conversation), version + 6)
+
+    def test_toggles_ignore_other_users_rows(self):
+        self.assertEqual(self.client.post(f'/api/conversations/{self.foreign.pk}/archive/').status_code, 404)
+        self.assertEqual(self.client.post(f'/api/messages/{self.foreign_message.pk}/bookmark/').status_code, 404)
+        response = self.client.post(f'/api/messages/{self.foreign_message.pk}/react/', {'reaction': "👍"}, format='json')
+        self.assertEqual(response.status_code, 404)
+        self.foreign.refresh_from_db()
+        self.foreign_message.refresh_from_db()
+        self.assertFalse(self.foreign.is_archived)
+        self.assertFalse(self.foreign_message.is_bookmarked)
+        self.assertFalse(self.foreign_message.reactions)
+
+    def test_bulk_reports_each_item_and_skips_other_users_rows(self):
+        ids = [str(self.conversation.pk), str(self.foreign.pk), "not-a-uuid"]
+        response = self.client.post('/api/conversations/bulk_archive/', {'ids': ids}, format='json').json()
+        self.assertEqual(response['updated'], 1)
+        self.assertEqual([r['status'] for r in response['results']], ['updated', 'not_found', 'invalid'])
+        again = self.client.post('/api/conversations/bulk_archive/', {'ids': ids[:1]}, format='json').json()
+        self.assertEqual(again['results'][0]['status'], 'unchanged')
+
+        ids = [self.message.pk, self.foreign_message.pk]
+        response = self.client.post('/api/messages/bulk_bookmark/', {'ids': ids}, format='json').json()
+        self.assertEqual([r['status'] for r in response['results']], ['updated', 'not_found'])
+        response = self.client.post('/api/messages/bulk_react/', {'ids': ids, 'reaction': "👍"}, format='json').json()
+        self.assertEqual([r['status'] for r in response['results']], ['updated', 'not_found'])
+
+        self.foreign.refresh_from_db()
+        self.foreign_message.refresh_from_db()
+        self.message.refresh_from_db()
+        self.assertFalse(self.foreign.is_archived)
+        self.assertFalse(self.foreign_message.is_bookmarked)
+        self.assertFalse(self.foreign_message.reactions)
+        self.assertTrue(self.message.is_bookmarked)
+        self.assertEqual(self.message.reactions, ["👍"])
+
+    def test_bulk_rejects_bad_input(self):
+        self.assertEqual(self.client.post('/api/messages/bulk_bookmark/', {'ids': []}, format='json').status_code, 400)
+        response = self.client.post('/api/messages/bulk_bookmark/', {'ids': [1], 'bookmarked': "yes"}, format='json')
+        self.assertEqual(response.status_code, 400)
+        with override_settings(BULK_MAX_ITEMS=2):
+            response = self.client.post('/api/conversations/bulk_archive/', {'ids': [1, 2, 3]}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class ObservabilityTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('tara')
+        self.staff = User.objects.create_user('uma', is_staff=True)
+        profile_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(profile_dir.cleanup)
+        override = override_settings(PROFILE_DIR=profile_dir.name)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def _count(self, histogram, *key):
+        return dict(
+            (sample_key, value) for name, sample_key, _, value in histogram.samples() if name.endswith('_count')
+        ).get(key, 0)
+
+    def test_requests_are_labelled_by_view_and_action(self):
+        self.client.force_login(self.user)
+        listed = self._count(metrics.REQUEST_DURATION, 'ConversationViewSet', 'list', 'GET', '200')
+        queries = self._count(metrics.REQUEST_DB_QUERIES, 'ConversationViewSet', 'list')
+        unmatched = self._count(metrics.REQUEST_DURATION, 'unmatched', '', 'GET', '404')
+
+        self.client.get('/api/conversations/')
+        self.client.get('/no/such/path/')
+        self.assertEqual(self._count(metrics.REQUEST_DURATION, 'ConversationViewSet', 'list', 'GET', '200'), listed + 1)
+        self.assertEqual(self._count(metrics.REQUEST_DB_QUERIES, 'ConversationViewSet', 'list'), queries + 1)
+        self.assertEqual(self._count(metrics.REQUEST_DURATION, 'unmatched', '', 'GET', '404'), unmatched + 1)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_metrics_endpoint_needs_the_token(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        response = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b"# TYPE http_request_duration_seconds histogram", response.content)
+
+    def test_staff_can_profile_a_request_and_read_it_back(self):
+        self.client.force_login(self.staff)
+        response = self.client.get('/api/conversations/', HTTP_X_PROFILE='cprofile')
+        profile_id = response['X-Profile-Id']
+
+        listed = self.client.get('/api/profiles/').json()
+        self.assertEqual([p['id'] for p in listed], [profile_id])
+        self.assertEqual(listed[0]['view'], 'ConversationViewSet')
+        self.assertGreater(listed[0]['query_count'], 0)
+        record = self.client.get(f'/api/profiles/{profile_id}/').json()
+        self.assertEqual(record['mode'], 'cprofile')
+        self.assertTrue(record['queries']['statements'])
+
+        self.assertEqual(self.client.delete(f'/api/profiles/{profile_id}/').status_code, 204)
+        self.assertEqual(self.client.get(f'/api/profiles/{profile_id}/').status_code, 404)
+
+    def test_profiling_is_staff_only(self):
+        self.client.force_login(self.user)
+        self.assertNotIn('X-Profile-Id', self.client.get('/api/conversations/', HTTP_X_PROFILE='cprofile'))
+        self.assertEqual(self.client.get('/api/profiles/').status_code, 403)
+
+
+class MemoryTests(TestCase):
+    # A Thursday
+    today = date(2026, 10, 15)
+
+    def setUp(self):
+        self.user = User.objects.create_user('vera')
+
+    def _digest(self, level, day, content="digest"):
+        start, end = period(level, day)
+        return MemoryDigest.objects.create(
+            user=self.user, level=level, period_start=start, period_end=end, content=content
+        )
+
+    def test_specific_questions_go_to_excerpts(self):
+        self.assertEqual(route("Where is the pizza recipe?", self.today)['level'], 'excerpts')
+        routed = route("Which database did we pick yesterday?", self.today)
+        self.assertEqual(routed, {"level": 'excerpts', "start": date(2026, 10, 14), "end": None})
+
+    def test_broad_questions_use_the_coarsest_level_that_fits(self):
+        self.assertEqual(route("What have I been working on?", self.today)['level'], 'all')
+        this_week = route("What was I working on this week?", self.today)
+        self.assertEqual(this_week, {"level": 'week', "start": date(2026, 10, 12), "end": date(2026, 10, 16)})
+        self.assertEqual(route("Give me a recap of the last 30 days", self.today)['level'], 'month')
+        self.assertEqual(route("Overview of the past 6 months", self.today)['level'], 'all')
+
+    def test_digests_overlap_the_range_and_fall_back_to_coarser_levels(self):
+        routed = route("What was I working on this week?", self.today)
+        self.assertEqual(digests_for(self.user, routed), [])
+
+        month = self._digest('month', self.today)
+        self._digest('month', date(2026, 8, 1))
+        self.assertEqual(digests_for(self.user, routed), [month])
+
+        week = self._digest('week', self.today, content='')
+        self.assertEqual(digests_for(self.user, routed), [month])
+        MemoryDigest.objects.filter(pk=week.pk).update(content="built")
+        self.assertEqual(digests_for(self.user, routed), [week])
+        self._digest('week', self.today - timedelta(days=14))
+        self.assertEqual(digests_for(self.user, routed), [week])
+
+    def test_refresh_rebuilds_stale_digests_bottom_up(self):
+        conversation = Conversation.objects.create(
+            user=self.user, title='Launch', summary="Planned the launch", summary_status='done'
+        )
+        mark_conversation_stale(conversation)
+        with mock.patch('chat.memory.generate_text', return_value="Launch planning") as generate:
+            self.assertEqual(refresh(self.user.pk), {'week': 1, 'month': 1, 'all': 1})
+        self.assertEqual(generate.call_count, 3)
+        self.assertIn("Planned the launch", generate.call_args_list[0].args[0])
+        self.assertFalse(MemoryDigest.objects.filter(user=self.user, is_stale=True).exists())
+        self.assertEqual(refresh(self.user.pk), {})
+
+
+class EventTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('wren')
+        self.client = APIClient()
+        self.client.force_login(self.user)
+        self.layer = get_channel_layer()
+        self.channel = async_to_sync(self.layer.new_channel)()
+        async_to_sync(self.layer.group_add)(group_name(self.user.pk), self.channel)
+
+    def tearDown(self):
+        async_to_sync(self.layer.flush)()
+
+    def _received(self):
+        async def receive():
+            try:
+                message = await asyncio.wait_for(self.layer.receive(self.channel), 0.1)
+            except asyncio.TimeoutError:
+                return None
+            return json.loads(message['text'])
+        return async_to_sync(receive)()
+
+    def test_events_are_sent_only_once_the_transaction_commits(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.post('/api/conversations/', {"title": "Plans"}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertIsNone(self._received())
+
+        for callback in callbacks:
+            callback()
+        event = self._received()
+        self.assertEqual(event['event'], 'conversation.created')
+        self.assertEqual(event['conversation']['id'], response.json()['id'])
+
+    def test_events_are_dropped_on_rollback(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with self.assertRaises(RuntimeError):
+                with transaction.atomic():
+                    publish(self.user.pk, 'conversation.updated')
+                    raise RuntimeError
+        self.assertEqual(callbacks, [])
+        self.assertIsNone(self._received())
+
+    def test_events_go_only_to_the_owner(self):
+        other = User.objects.create_user('yara')
+        with self.captureOnCommitCallbacks(execute=True):
+            publish(other.pk, 'conversation.updated')
+            publish(self.user.pk, 'conversation.archived')
+        self.assertEqual(self._received()['event'], 'conversation.archived')
+        self.assertIsNone(self._received())
+
+
+class EventConsumerTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('zane')
+
+    async def _connect(self, user):
+        communicator = WebsocketCommunicator(EventConsumer.as_asgi(), '/ws/events/')
+        communicator.scope['user'] = user
+        connected, _ = await communicator.connect()
+        return communicator, connected
+
+    async def test_anonymous_connections_are_refused(self):
+        _, connected = await self._connect(AnonymousUser())
+        self.assertFalse(connected)
+
+    async def test_signed_in_user_receives_their_events(self):
+        communicator, connected = await self._connect(self.user)
+        self.assertTrue(connected)
+        text = json.dumps({"event": 'conversation.updated'})
+        await get_channel_layer().group_send(group_name(self.user.pk), {"type": "chat.event", "text": text})
+        self.assertEqual(await communicator.receive_from(), text)
+
+        await communicator.send_to(text_data=json.dumps({"type": "ping"}))
+        self.assertEqual(await communicator.receive_json_from(), {"event": "pong"})
+        await communicator.disconnect()
+
+    async def test_foreign_origins_are_refused(self):
+        from backend.asgi import application
+
+        communicator = WebsocketCommunicator(application, '/ws/events/', headers=[(b'origin', b'https://evil.example')])
+        connected, _ = await communicator.connect()
+        self.assertFalse(connected)
+
+
+class AdmissionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        response_cache.local.clear()
+
+    def _controller(self, store):
+        # No refill during the test: two requests' worth of tokens, one slot and no queue
+        return AdmissionController(store, max_concurrent=1, rate=0.001, burst=2, max_queue=0, queue_timeout=0)
+
+    def test_concurrency_rejections_keep_their_rate_token(self):
+        for store in (LocalAdmissionStore(), CacheAdmissionStore('default')):
+            with self.subTest(store=type(store).__name__):
+                controller = self._controller(store)
+                ticket = controller.acquire(1)
+                with self.assertRaises(Rejected) as rejected:
+                    controller.acquire(1)
+                self.assertEqual(rejected.exception.reason, 'too_many_concurrent_requests')
+                ticket.release()
+
+                controller.acquire(1).release()
+                with self.assertRaises(Rejected) as rejected:
+                    controller.acquire(1)
+                self.assertEqual(rejected.exception.reason, 'rate_limited')
+
+    def test_cached_suggestions_skip_admission(self):
+        user = User.objects.create_user('abel')
+        conversation = Conversation.objects.create(user=user, title='Trip')
+        client = APIClient()
+        client.force_login(user)
+        saturated = self._controller(LocalAdmissionStore())
+        saturated.acquire(user.pk)
+        url = f'/api/conversations/{conversation.pk}/suggestions/'
+
+        with mock.patch('chat.views.get_admission', return_value=saturated):
+            self.assertEqual(client.get(url).status_code, 429)
+            prompt = "Based on this conversation context, suggest 3 helpful follow-up questions or topics as a JSON array:\n"
+            key = response_cache.make_key(get_client().model_name, prompt)
+            response_cache.set('suggestions', key, '["Where next?"]')
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"suggestions": ["Where next?"]})
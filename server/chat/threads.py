@@ -0,0 +1,87 @@
+from .models import Message
+
+TABLE = Message._meta.db_table
+COLUMNS = ", ".join(
+    f"m.{column}" for column in (
+        'id', 'conversation_id', 'sender', 'content', 'timestamp', 'is_bookmarked', 'reactions', 'parent_id', 'branch_name',
+    )
+)
+
+# Mainline messages (parent_id IS NULL) are the roots; each branch hangs off the message it forked from.
+# The path array orders siblings by id and lets the recursion stop on a cycle introduced by a bad edit.
+TREE_SQL = f"""
+WITH RECURSIVE tree AS (
+    SELECT m.id, 0 AS depth, ARRAY[m.id] AS path
+    FROM {TABLE} m
+    WHERE m.conversation_id = %(conversation)s AND m.parent_id IS NULL
+    UNION ALL
+    SELECT m.id, tree.depth + 1, tree.path || m.id
+    FROM {TABLE} m JOIN tree ON m.parent_id = tree.id
+    WHERE NOT m.id = ANY(tree.path)
+)
+SELECT {COLUMNS}, tree.depth
+FROM tree JOIN {TABLE} m ON m.id = tree.id
+ORDER BY tree.path
+"""
+
+# Walk up from the leaf to the mainline message it forked from, then prepend the mainline before the fork
+# (optionally only its newest `prefix_limit` messages).
+PATH_SQL = f"""
+WITH RECURSIVE up AS (
+    SELECT m.id, m.parent_id, 0 AS depth, ARRAY[m.id] AS seen
+    FROM {TABLE} m
+    WHERE m.id = %(leaf)s AND m.conversation_id = %(conversation)s
+    UNION ALL
+    SELECT m.id, m.parent_id, up.depth + 1, up.seen || m.id
+    FROM {TABLE} m JOIN up ON m.id = up.parent_id
+    WHERE NOT m.id = ANY(up.seen)
+),
+fork AS (
+    SELECT m.id, m.timestamp FROM up JOIN {TABLE} m ON m.id = up.id WHERE up.parent_id IS NULL
+),
+prefix AS (
+    SELECT m.id
+    FROM {TABLE} m, fork
+    WHERE m.conversation_id = %(conversation)s
+      AND m.parent_id IS NULL
+      AND (m.timestamp, m.id) < (fork.timestamp, fork.id)
+    ORDER BY m.timestamp DESC, m.id DESC
+    LIMIT %(prefix_limit)s
+)
+SELECT {COLUMNS}, path.part, path.depth
+FROM (
+    SELECT id, 0 AS part, 0 AS depth FROM prefix
+    UNION ALL
+    SELECT id, 1, depth FROM up
+) path JOIN {TABLE} m ON m.id = path.id
+ORDER BY path.part, path.depth DESC, m.timestamp, m.id
+"""
+
+
+def message_tree(conversation):
+    """Every message of the conversation as a list of `(message, depth)` in depth-first order, in one query."""
+    return [(message, message.depth) for message in Message.objects.raw(TREE_SQL, {'conversation': conversation.pk})]
+
+
+def nest(rows, serialize):
+    """Turn depth-first `(message, depth)` rows into nested dicts with a `children` list."""
+    roots = []
+    nodes = {}
+    for message, depth in rows:
+        node = {**serialize(message), "depth": depth, "children": []}
+        nodes[message.id] = node
+        parent = nodes.get(message.parent_id)
+        (parent["children"] if parent is not None else roots).append(node)
+    return roots
+
+
+def active_path(conversation, leaf_id, prefix_limit=None):
+    """
+    Messages from the start of the conversation down to `leaf_id`, oldest first, in one query: the
+    mainline up to the fork point, then the branch chain. Empty if the leaf is not in this conversation.
+    """
+    return list(Message.objects.raw(PATH_SQL, {
+        'conversation': conversation.pk,
+        'leaf': leaf_id,
+        'prefix_limit': prefix_limit,
+    }))
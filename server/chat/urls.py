@@ -1,8 +1,10 @@
 from rest_framework.routers import DefaultRouter
-from .views import ConversationViewSet, MessageViewSet
+from .views import ConversationViewSet, MessageViewSet, JobViewSet, ProfileViewSet
 
 router = DefaultRouter()
 router.register(r'conversations', ConversationViewSet, basename='conversation')
 router.register(r'messages', MessageViewSet, basename='message')
+router.register(r'jobs', JobViewSet, basename='job')
+router.register(r'profiles', ProfileViewSet, basename='profile')
 
 urlpatterns = router.urls
@@ -0,0 +1,64 @@
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from . import snapshots
+from .models import Conversation
+
+
+def publish_versions(rows):
+    """Point shared snapshots at new versions once the transaction commits; rows are (pk, version, share_token)."""
+    shared = [(pk, version) for pk, version, share_token in rows if share_token]
+    if shared:
+        transaction.on_commit(lambda: [snapshots.publish_version(pk, version) for pk, version in shared])
+
+
+def touch_conversations(pks):
+    """Bump version and modified time of several conversations in one UPDATE; returns {pk: (version, updated_at)}."""
+    if not pks:
+        return {}
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"UPDATE {Conversation._meta.db_table} SET version = version + 1, updated_at = %s "
+            f"WHERE id = ANY(%s) RETURNING id, version, updated_at, share_token",
+            [timezone.now(), list(pks)],
+        )
+        rows = cursor.fetchall()
+    publish_versions([(pk, version, share_token) for pk, version, _, share_token in rows])
+    return {pk: (version, updated_at) for pk, version, updated_at, _ in rows}
+
+
+def touch_conversation(conversation):
+    """
+    Bump the version and modified time of a conversation, given an instance (updated in place) or a pk.
+    Call it wherever the conversation, its messages, reactions or bookmarks change.
+    """
+    pk = conversation.pk if isinstance(conversation, Conversation) else conversation
+    touched = touch_conversations([pk])
+    if pk in touched and isinstance(conversation, Conversation):
+        conversation.version, conversation.updated_at = touched[pk]
+
+
+def conversation_etag(conversation, variant):
+    # One representation per variant (detail, shared, each export format) so their validators never collide
+    return f'"{variant}-{conversation.pk}-{conversation.version}"'
+
+
+def not_modified(request, conversation, variant):
+    """Return a 304 response if the client's validators still match, otherwise None."""
+    response = get_conditional_response(
+        request,
+        etag=conversation_etag(conversation, variant),
+        last_modified=int(conversation.updated_at.timestamp()),
+    )
+    if response is not None:
+        add_validators(response, conversation, variant)
+    return response
+
+
+def add_validators(response, conversation, variant):
+    response['ETag'] = conversation_etag(conversation, variant)
+    response['Last-Modified'] = http_date(conversation.updated_at.timestamp())
+    response['Cache-Control'] = 'private, no-cache'
+    return response
@@ -1,49 +1,102 @@
 from rest_framework import viewsets, status
 from rest_framework.response import Response
 from rest_framework.decorators import action
-from rest_framework.permissions import AllowAny
-from .models import Conversation, Message
-from .serializers import ConversationSerializer, MessageSerializer
-from django.utils import timezone
-from django.utils.html import escape
-from django.http import HttpResponse
-import google.generativeai as genai
+from rest_framework.permissions import AllowAny, IsAdminUser
+from .models import Conversation, DailyRollup, Message, Job
+from .serializers import ConversationSerializer, ConversationListSerializer, MessageSerializer, JobSerializer
+from .pagination import ConversationCursorPagination, decode_cursor, encode_cursor
 from django.conf import settings
-from concurrent.futures import ThreadPoolExecutor, TimeoutError
-import functools
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce, Substr
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from django.http import FileResponse, StreamingHttpResponse
+from asgiref.sync import sync_to_async
 import logging
 import json
-from reportlab.lib.pagesizes import letter
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
-from reportlab.lib.units import inch
-from io import BytesIO
+import math
 import markdown
+from .admission import Rejected, get_admission
+from .context import build_prompt
+from .events import conversation_changed, message_created, publish
+from .memory import digests_for, route, schedule_refresh
+from .jobs import enqueue
+from .search import reindex_message, schedule_indexing, semantic_search
+from .summaries import schedule_rolling_summary
+from .fulltext import keyword_search
+from .exports import json_chunks, markdown_chunks, ndjson_chunks, streaming_response, zip_chunks
+from .pdf import discard_artifacts, open_artifact
+from .mutations import (
+    bulk_archive, bulk_bookmark, bulk_react, parse_conversation_ids, parse_message_ids, toggle_archive,
+    toggle_bookmark, toggle_reaction
+)
+from .threads import active_path, message_tree, nest
+from .versioning import add_validators, not_modified, touch_conversation
+from . import profiling, snapshots
+from .rollups import (
+    conversation_counts, message_counts, record_conversation, record_message, remove_conversation, remove_message
+)
+from .llm import generate_text, get_client
+from .llm_cache import MISSING, response_cache
+from .resilience import CircuitOpenError
 
 logger = logging.getLogger(__name__)
 
-genai.configure(api_key=settings.GEMINI_API_KEY)
-model = genai.GenerativeModel("gemini-2.5-flash")
+AI_ERROR_MESSAGE = "I apologize, but I'm having trouble connecting to the AI service. Please check your GEMINI_API_KEY configuration or try again later."
 
-executor = ThreadPoolExecutor(max_workers=5)
+def strip_ai_prefix(content):
+    stripped = content.lstrip()
+    if stripped.lower().startswith("ai:"):
+        return stripped[3:].lstrip()
+    return content
+
+
+def bulk_ids(request):
+    ids = request.data.get('ids')
+    if not isinstance(ids, list) or not ids:
+        return None, Response({"error": "ids must be a non-empty list"}, status=status.HTTP_400_BAD_REQUEST)
+    if len(ids) > settings.BULK_MAX_ITEMS:
+        return None, Response(
+            {"error": f"At most {settings.BULK_MAX_ITEMS} ids per request"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    return ids, None
+
+
+def bulk_response(results):
+    return Response({
+        "updated": sum(1 for result in results if result["status"] == "updated"),
+        "results": results,
+    })
+
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
 
-def timeout_handler(timeout_seconds):
-    def decorator(func):
-        @functools.wraps(func)
-        def wrapper(*args, **kwargs):
-            future = executor.submit(func, *args, **kwargs)
-            try:
-                return future.result(timeout=timeout_seconds)
-            except TimeoutError:
-                raise Exception(f"Request timed out after {timeout_seconds} seconds")
-        return wrapper
-    return decorator
+
+class AdmittedStreamingResponse(StreamingHttpResponse):
+    """Holds an admission ticket for as long as the stream runs."""
+
+    def __init__(self, ticket, *args, **kwargs):
+        self._ticket = ticket
+        super().__init__(*args, **kwargs)
+
+    def close(self):
+        # Called by the handler after the last chunk and when the client goes away, even if the
+        # generator never started
+        try:
+            super().close()
+        finally:
+            self._ticket.release()
 
 
 class ConversationViewSet(viewsets.ModelViewSet):
     queryset = Conversation.objects.all().order_by('-start_time')
     serializer_class = ConversationSerializer
 
+    pagination_class = ConversationCursorPagination
+
     def get_queryset(self):
         queryset = super().get_queryset()
         queryset = queryset.filter(user=self.request.user)
@@ -51,127 +104,407 @@ class ConversationViewSet(viewsets.ModelViewSet):
             show_archived = self.request.query_params.get('show_archived', 'false').lower() == 'true'
             if not show_archived:
                 queryset = queryset.filter(is_archived=False)
+            queryset = self._annotate_list(queryset)
         return queryset
+
+    def _annotate_list(self, queryset):
+        # Correlated subqueries are only evaluated for the rows on the current page
+        messages = Message.objects.filter(conversation=OuterRef('pk'))
+        latest = messages.order_by('-id')
+        return queryset.defer('summary', 'key_points', 'insights', 'context_summary', 'search_vector').annotate(
+            message_count=Coalesce(
+                Subquery(messages.order_by().values('conversation').annotate(count=Count('id')).values('count')),
+                0
+            ),
+            last_message_preview=Substr(Subquery(latest.values('content')[:1]), 1, 120),
+            last_message_at=Subquery(latest.values('timestamp')[:1]),
+        )
+
+    def get_serializer_class(self):
+        if self.action == 'list':
+            return ConversationListSerializer
+        return super().get_serializer_class()
     
     def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
+        conversation = serializer.save(user=self.request.user)
+        record_conversation(conversation)
+        conversation_changed('conversation.created', conversation)
 
-    def _generate_ai_response(self, prompt):
-        @timeout_handler(30)
-        def get_response():
-            return model.generate_content(prompt).text.strip()
-        
+    def retrieve(self, request, *args, **kwargs):
+        conversation = self.get_object()
+        # Answer revalidations from the conversation row alone, before the messages are loaded
+        cached = not_modified(request, conversation, 'detail')
+        if cached is not None:
+            return cached
+        return add_validators(Response(self.get_serializer(conversation).data), conversation, 'detail')
+
+    def perform_update(self, serializer):
+        before = conversation_counts(serializer.instance)
+        previous_summary = serializer.instance.summary
+        with transaction.atomic():
+            conversation = serializer.save()
+            record_conversation(conversation, before)
+            touch_conversation(conversation)
+            if conversation.summary != previous_summary:
+                schedule_refresh(conversation)
+            conversation_changed('conversation.updated', conversation)
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            remove_conversation(instance)
+            conversation_id = instance.pk
+            instance.delete()
+            if instance.summary:
+                schedule_refresh(instance, key=f"refresh_memory:{instance.user_id}:{conversation_id}:deleted")
+            publish(instance.user_id, 'conversation.deleted', conversation_id=conversation_id)
+        discard_artifacts(conversation_id)
+        snapshots.forget(conversation_id, instance.share_token)
+
+    def _reply_fields(self, conversation, user_message, content):
+        # Replies to a branch turn continue that branch
+        fields = {'conversation': conversation, 'sender': 'ai', 'content': content}
+        if user_message.parent_id is not None:
+            fields.update(parent=user_message, branch_name=user_message.branch_name)
+        return fields
+
+    def _after_ai_message(self, conversation, ai_message):
+        record_message(ai_message, user_id=conversation.user_id)
+        touch_conversation(conversation)
+        schedule_indexing(conversation, ai_message.id)
+        schedule_rolling_summary(conversation)
+        message_created(ai_message, conversation.user_id, conversation.version)
+
+    def _admit(self):
+        # Returns (ticket, None) when admitted, or (None, 429 response); the caller must release the ticket
+        try:
+            return get_admission().acquire(self.request.user.pk), None
+        except Rejected as e:
+            response = Response(
+                {"error": "Too many AI requests, please retry shortly", "reason": e.reason},
+                status=status.HTTP_429_TOO_MANY_REQUESTS
+            )
+            response['Retry-After'] = str(math.ceil(e.retry_after))
+            return None, response
+
+    def _cache_bypassed(self):
+        cache_control = self.request.headers.get('Cache-Control', '').lower()
+        return 'no-cache' in cache_control or self.request.query_params.get('nocache', 'false').lower() == 'true'
+
+    def _cached_ai_response(self, prompt, cache_scope):
+        # Cache hits cost no LLM call, so they are served without going through admission
         try:
-            response = get_response()
+            return response_cache.lookup(cache_scope, get_client().model_name, prompt, bypass=self._cache_bypassed())
+        except Exception as e:
+            logger.warning(f"AI response cache lookup failed: {str(e)}")
+            return MISSING
+
+    def _generate_ai_response(self, prompt, site, cache_scope=None, lookup=True):
+        # lookup=False when the caller has already missed the cache via _cached_ai_response
+        try:
+            model_name = get_client().model_name
+            compute = lambda: generate_text(prompt, site=site)
+            if lookup:
+                response = response_cache.get_or_compute(
+                    cache_scope, model_name, prompt, compute, bypass=self._cache_bypassed(),
+                )
+            else:
+                response = response_cache.compute_and_set(cache_scope, model_name, prompt, compute)
             return {"success": True, "content": response}
+        except CircuitOpenError as e:
+            logger.warning(f"AI response skipped: {str(e)}")
+            return {"success": False, "content": AI_ERROR_MESSAGE}
         except Exception as e:
             logger.error(f"AI response generation failed: {str(e)}", exc_info=True)
-            error_msg = "I apologize, but I'm having trouble connecting to the AI service. Please check your GEMINI_API_KEY configuration or try again later."
-            return {"success": False, "content": error_msg}
+            return {"success": False, "content": AI_ERROR_MESSAGE}
+
+    async def _stream_ai_response(self, conversation, user_message, prompt, context_metrics):
+        # Tokens are held back until the "AI:" prefix the model sometimes echoes can be detected
+        pending = ""
+        started = False
+        chunks = []
+        ai_content = None
+        try:
+            try:
+                async for chunk in get_client().stream(prompt, site='chat'):
+                    if not started:
+                        pending += chunk
+                        if len(pending.lstrip()) < 3:
+                            continue
+                        chunk = strip_ai_prefix(pending)
+                        started = True
+                    chunks.append(chunk)
+                    yield sse_event("token", {"content": chunk})
+                if not started and pending:
+                    chunks.append(strip_ai_prefix(pending))
+                    yield sse_event("token", {"content": chunks[-1]})
+                ai_content = "".join(chunks).strip()
+            except CircuitOpenError as e:
+                logger.warning(f"AI response streaming skipped: {str(e)}")
+                ai_content = AI_ERROR_MESSAGE
+                yield sse_event("error", {"content": ai_content})
+            except Exception as e:
+                logger.error(f"AI response streaming failed: {str(e)}", exc_info=True)
+                ai_content = AI_ERROR_MESSAGE
+                yield sse_event("error", {"content": ai_content})
+        finally:
+            # Also runs when the client goes away mid-stream and the generator is closed at a yield, so the
+            # part of the reply generated so far is kept; an abandoned stream without any text saves nothing
+            finished = ai_content is not None
+            if not finished:
+                ai_content = ("".join(chunks) if started else strip_ai_prefix(pending)).strip()
+            if finished or ai_content:
+                ai_message = await Message.objects.acreate(**self._reply_fields(conversation, user_message, ai_content))
+                await sync_to_async(self._after_ai_message)(conversation, ai_message)
+
+        yield sse_event("done", {
+            "id": ai_message.id,
+            "user_message_id": user_message.id,
+            "ai_response": ai_content,
+            "context": context_metrics
+        })
 
     @action(detail=True, methods=['post'])
     def send_message(self, request, pk=None):
-
-        print("send_message called")
         conversation = self.get_object()
         user_message = request.data.get('content')
         
         if not user_message or not user_message.strip():
-            print("Empty message received")
             return Response(
                 {"error": "Message content is required"},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        Message.objects.create(
-            conversation=conversation,
-            sender='user',
-            content=user_message
-        )
+        # Optional active-branch pointer: the message this turn continues from. Without it the turn goes
+        # on the mainline.
+        parent = None
+        parent_id = request.data.get('parent_id')
+        if parent_id is not None:
+            parent = Message.objects.filter(pk=parent_id, conversation=conversation).first()
+            if parent is None:
+                return Response(
+                    {"error": "parent_id must be a message in this conversation"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+        ticket, rejected = self._admit()
+        if rejected:
+            return rejected
 
-        context = "\n".join(
-            [f"{m.sender}: {m.content}" for m in conversation.messages.all()]
-        )
-
-        prompt = f"Conversation so far:\n{context}\nUser: {user_message}\nAI:"
-
-        result = self._generate_ai_response(prompt)
-        
-        ai_content = result["content"]
-        ai_content_stripped = ai_content.lstrip()
-        if ai_content_stripped.lower().startswith("ai:"):
-            colon_index = ai_content_stripped.lower().index(":") + 1
-            ai_content = ai_content_stripped[colon_index:].lstrip()
-
-        Message.objects.create(
-            conversation=conversation,
-            sender='ai',
-            content=ai_content
-        )
+        try:
+            saved_user_message = Message.objects.create(
+                conversation=conversation,
+                sender='user',
+                content=user_message,
+                parent=parent,
+                branch_name=parent.branch_name if parent else None
+            )
+            record_message(saved_user_message, user_id=conversation.user_id)
+            touch_conversation(conversation)
+            message_created(saved_user_message, conversation.user_id, conversation.version)
+
+            prompt, context_metrics = build_prompt(conversation, saved_user_message)
+            if context_metrics["truncated"]:
+                # Fold the turns that no longer fit in the background; until then they are left out
+                schedule_rolling_summary(conversation, due=1)
+
+            if request.query_params.get('stream', 'false').lower() == 'true':
+                response = AdmittedStreamingResponse(
+                    ticket,
+                    self._stream_ai_response(conversation, saved_user_message, prompt, context_metrics),
+                    content_type='text/event-stream'
+                )
+                response['Cache-Control'] = 'no-cache'
+                response['X-Accel-Buffering'] = 'no'
+                return response
+
+            result = self._generate_ai_response(prompt, 'chat')
+        except BaseException:
+            ticket.release()
+            raise
+        ticket.release()
+        ai_content = strip_ai_prefix(result["content"])
+
+        ai_message = Message.objects.create(**self._reply_fields(conversation, saved_user_message, ai_content))
+        self._after_ai_message(conversation, ai_message)
 
         return Response({
             "user_message": user_message,
-            "ai_response": ai_content
+            "ai_response": ai_content,
+            "user_message_id": saved_user_message.id,
+            "ai_message_id": ai_message.id,
+            "context": context_metrics
         }, status=status.HTTP_200_OK)
 
+    @action(detail=True, methods=['get'])
+    def messages(self, request, pk=None):
+        conversation = self.get_object()
+        before = request.query_params.get('before')
+        since = request.query_params.get('since')
+        try:
+            limit = max(min(int(request.query_params.get('limit', 50)), 200), 1)
+            if since:
+                position = decode_cursor(since, timestamp=str, id=int)
+            elif before:
+                position = decode_cursor(before, timestamp=str, id=int)
+            if since or before:
+                timestamp = parse_datetime(position['timestamp'])
+                if timestamp is None:
+                    raise ValueError("Invalid cursor")
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        messages = Message.objects.filter(conversation=conversation).defer('search_vector')
+        if since:
+            # Refresh: everything newer than the client's last message, oldest first
+            page = list(messages.filter(
+                Q(timestamp__gt=timestamp) | Q(timestamp=timestamp, id__gt=position['id'])
+            ).order_by('timestamp', 'id')[:limit + 1])
+            has_more = len(page) > limit
+            page = page[:limit]
+        else:
+            # History: the newest page, or the page older than `before`
+            if before:
+                messages = messages.filter(
+                    Q(timestamp__lt=timestamp) | Q(timestamp=timestamp, id__lt=position['id'])
+                )
+            page = list(messages.order_by('-timestamp', '-id')[:limit + 1])
+            has_more = len(page) > limit
+            page = list(reversed(page[:limit]))
+
+        def cursor_for(message):
+            return encode_cursor({"timestamp": message.timestamp.isoformat(), "id": message.id})
+
+        return Response({
+            "results": MessageSerializer(page, many=True).data,
+            "previous_cursor": cursor_for(page[0]) if page and not since and has_more else None,
+            "next_cursor": cursor_for(page[-1]) if page else since,
+            "has_more": has_more
+        })
+
+    # The whole message tree, or with ?leaf=<message id> the path from the start of the conversation to it
+    @action(detail=True, methods=['get'])
+    def tree(self, request, pk=None):
+        conversation = self.get_object()
+        leaf = request.query_params.get('leaf')
+        if leaf is None:
+            rows = message_tree(conversation)
+            return Response({"messages": nest(rows, lambda m: MessageSerializer(m).data)})
+
+        try:
+            path = active_path(conversation, int(leaf))
+        except ValueError:
+            return Response({"error": "leaf must be a message id"}, status=status.HTTP_400_BAD_REQUEST)
+        if not path:
+            return Response({"error": "Message not found"}, status=status.HTTP_404_NOT_FOUND)
+        return Response({"path": MessageSerializer(path, many=True).data})
+
     @action(detail=True, methods=['post'])
     def end(self, request, pk=None):
         conversation = self.get_object()
-        conversation.end_time = timezone.now()
-        conversation.status = 'ended'
 
-        full_text = "\n".join([m.content for m in conversation.messages.all()])
-        
-        summary_prompt = f"Summarize this conversation briefly:\n{full_text}"
-        result = self._generate_ai_response(summary_prompt)
-        summary = result["content"] if result["success"] else "Summary generation failed."
-        
-        key_points_prompt = f"Extract 3-5 key points from this conversation as a JSON array of strings:\n{full_text}"
-        key_points_result = self._generate_ai_response(key_points_prompt)
-        if key_points_result["success"]:
-            try:
-                import json as json_module
-                key_points = json_module.loads(key_points_result["content"])
-            except (json_module.JSONDecodeError, ValueError, TypeError):
-                key_points = [key_points_result["content"]]
-        else:
-            key_points = []
-        
-        insights_prompt = f"Provide insights and analysis from this conversation:\n{full_text}"
-        insights_result = self._generate_ai_response(insights_prompt)
-        insights = insights_result["content"] if insights_result["success"] else ""
-        
-        conversation.summary = summary
-        conversation.key_points = key_points
-        conversation.insights = insights
-        conversation.save()
-
-        Message.objects.create(
-            conversation=conversation,
-            sender='ai',
-            content=f"**Conversation Summary**\n\n{summary}"
-        )
+        if conversation.status != 'ended':
+            before = conversation_counts(conversation)
+            conversation.end_time = timezone.now()
+            conversation.status = 'ended'
+            conversation.summary_status = 'pending'
+            with transaction.atomic():
+                conversation.save(update_fields=['end_time', 'status', 'summary_status'])
+                record_conversation(conversation, before)
+                touch_conversation(conversation)
+                conversation_changed('conversation.ended', conversation)
+        elif conversation.summary_status == 'failed':
+            # Ending again retries the summary; enqueue() resets the failed job
+            conversation.summary_status = 'pending'
+            with transaction.atomic():
+                conversation.save(update_fields=['summary_status'])
+                touch_conversation(conversation)
+                conversation_changed('conversation.updated', conversation)
+
+        job = enqueue('summarize_conversation', conversation)
 
         return Response({
             "message": "Conversation ended",
-            "summary": summary,
-            "key_points": key_points,
-            "insights": insights
-        }, status=status.HTTP_200_OK)
+            "job_id": job.id,
+            "summary_status": conversation.summary_status
+        }, status=status.HTTP_202_ACCEPTED)
 
     @action(detail=False, methods=['post'])
     def query(self, request):
         query_text = request.data.get('query')
 
-        all_conversations = Conversation.objects.filter(user=request.user)
-        combined = "\n\n".join(
-            [f"Conversation {c.id}: {c.summary or 'No summary'}" for c in all_conversations]
-        )
+        if not query_text or not query_text.strip():
+            return Response(
+                {"error": "Query is required"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
 
-        prompt = f"Here are summaries of past conversations:\n{combined}\nUser query: {query_text}\nAnswer based on these summaries."
+        ticket, rejected = self._admit()
+        if rejected:
+            return rejected
+        with ticket:
+            # Broad questions read a handful of pre-built digests, so their cost does not grow with history
+            routed = route(query_text)
+            digests = digests_for(request.user, routed) if routed["level"] != 'excerpts' else []
+            if digests:
+                evidence = [{
+                    "kind": "digest",
+                    "level": d.level,
+                    "period_start": d.period_start.isoformat(),
+                    "period_end": d.period_end.isoformat(),
+                    "text": d.content,
+                } for d in digests]
+                sources = "\n\n".join(
+                    [f"[{i + 1}] {e['level']} digest from {e['period_start']}: {e['text']}" for i, e in enumerate(evidence)]
+                )
+                prompt = f"Here are digests of the user's past conversations:\n{sources}\nUser query: {query_text}\nAnswer based on these digests and cite them by their [number]."
+                routed["level"] = digests[0].level
+            else:
+                try:
+                    evidence = semantic_search(request.user, query_text, bypass_cache=self._cache_bypassed())
+                except Exception as e:
+                    logger.error(f"Semantic search failed: {str(e)}", exc_info=True)
+                    evidence = []
+
+                excerpts = "\n\n".join(
+                    [f"[{i + 1}] Conversation {e['conversation_id']} ({e['kind']}): {e['text']}" for i, e in enumerate(evidence)]
+                )
+
+                prompt = f"Here are the most relevant excerpts from past conversations:\n{excerpts or 'No matching excerpts.'}\nUser query: {query_text}\nAnswer based on these excerpts and cite them by their [number]."
+                routed["level"] = 'excerpts'
+
+            result = self._generate_ai_response(prompt, 'query', cache_scope='query')
+        return Response({
+            "query": query_text,
+            "response": result["content"],
+            "evidence": evidence,
+            "source": routed["level"],
+        })
 
-        result = self._generate_ai_response(prompt)
-        return Response({"query": query_text, "response": result["content"]})
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        query_text = request.query_params.get('q', '').strip()
+        if not query_text:
+            return Response(
+                {"error": "Search query is required"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        archived = request.query_params.get('archived')
+        try:
+            limit = min(int(request.query_params.get('limit', 20)), 100)
+            results = keyword_search(
+                request.user,
+                query_text,
+                status=request.query_params.get('status'),
+                archived=None if archived is None else archived.lower() == 'true',
+                date_from=parse_date(request.query_params.get('from', '')),
+                date_to=parse_date(request.query_params.get('to', '')),
+                cursor=request.query_params.get('cursor'),
+                limit=max(limit, 1),
+            )
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(results)
 
     @action(detail=True, methods=['get'])
     def suggestions(self, request, pk=None):
@@ -180,7 +513,15 @@ class ConversationViewSet(viewsets.ModelViewSet):
         context = "\n".join([f"{m.sender}: {m.content}" for m in reversed(recent_messages)])
         
         prompt = f"Based on this conversation context, suggest 3 helpful follow-up questions or topics as a JSON array:\n{context}"
-        result = self._generate_ai_response(prompt)
+        cached = self._cached_ai_response(prompt, 'suggestions')
+        if cached is not MISSING:
+            result = {"success": True, "content": cached}
+        else:
+            ticket, rejected = self._admit()
+            if rejected:
+                return rejected
+            with ticket:
+                result = self._generate_ai_response(prompt, 'suggestions', cache_scope='suggestions', lookup=False)
         
         if result["success"]:
             try:
@@ -195,13 +536,24 @@ class ConversationViewSet(viewsets.ModelViewSet):
 
     @action(detail=True, methods=['post'])
     def archive(self, request, pk=None):
-        conversation = self.get_object()
-        conversation.is_archived = not conversation.is_archived
-        conversation.save()
+        conversation_id = parse_conversation_ids([pk])[str(pk)]
+        is_archived = toggle_archive(request.user, conversation_id) if conversation_id else None
+        if is_archived is None:
+            return Response({"error": "Conversation not found"}, status=status.HTTP_404_NOT_FOUND)
         return Response({
-            "is_archived": conversation.is_archived
+            "is_archived": is_archived
         })
 
+    @action(detail=False, methods=['post'])
+    def bulk_archive(self, request):
+        ids, error = bulk_ids(request)
+        if error:
+            return error
+        archived = request.data.get('archived', True)
+        if not isinstance(archived, bool):
+            return Response({"error": "archived must be a boolean"}, status=status.HTTP_400_BAD_REQUEST)
+        return bulk_response(bulk_archive(request.user, parse_conversation_ids(ids), archived))
+
     @action(detail=True, methods=['post'])
     def share(self, request, pk=None):
         import secrets
@@ -209,210 +561,229 @@ class ConversationViewSet(viewsets.ModelViewSet):
         
         if not conversation.share_token:
             conversation.share_token = secrets.token_urlsafe(32)
-            conversation.save()
+            conversation.save(update_fields=['share_token'])
+            touch_conversation(conversation)
         
         return Response({
             "share_token": conversation.share_token,
             "share_url": f"/shared/{conversation.share_token}"
         })
 
-    @action(detail=False, methods=['get'], url_path='shared/(?P<token>[^/.]+)', permission_classes=[AllowAny])
+    # No authentication so anonymous hits never touch the session table; the snapshot is served from the cache
+    @action(
+        detail=False,
+        methods=['get'],
+        url_path='shared/(?P<token>[^/.]+)',
+        permission_classes=[AllowAny],
+        authentication_classes=[],
+    )
     def get_shared(self, request, token=None):
-        try:
-            conversation = Conversation.objects.get(share_token=token)
-            serializer = self.get_serializer(conversation)
-            return Response(serializer.data)
-        except Conversation.DoesNotExist:
+        snapshot = snapshots.get(token, lambda conversation: self.get_serializer(conversation).data)
+        if snapshot is None:
             return Response({"error": "Conversation not found"}, status=status.HTTP_404_NOT_FOUND)
+        return snapshots.respond(request, snapshot)
+
+    @action(detail=True, methods=['get'])
+    def share_stats(self, request, pk=None):
+        conversation = self.get_object()
+        if not conversation.share_token:
+            return Response({"error": "Conversation is not shared"}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({"share_token": conversation.share_token, **snapshots.share_stats(conversation.share_token)})
     
     @action(detail=True, methods=['get'])
     def export(self, request, pk=None):
         conversation = self.get_object()
         export_format = request.query_params.get('format', 'json')
+        if export_format not in ('pdf', 'markdown'):
+            export_format = 'json'
+
+        cached = not_modified(request, conversation, f"export-{export_format}")
+        if cached is not None:
+            return cached
         
         if export_format == 'pdf':
-            return self._export_pdf(conversation)
+            response = self._export_pdf(conversation)
+            if response.status_code == status.HTTP_202_ACCEPTED:
+                # No validators: the PDF does not exist yet
+                return response
         elif export_format == 'markdown':
-            return self._export_markdown(conversation)
+            response = self._export_markdown(conversation)
         else:
-            return self._export_json(conversation)
+            response = self._export_json(conversation)
+        return add_validators(response, conversation, f"export-{export_format}")
     
     def _export_json(self, conversation):
-        data = {
-            'id': conversation.id,
-            'title': conversation.title,
-            'start_time': conversation.start_time.isoformat(),
-            'end_time': conversation.end_time.isoformat() if conversation.end_time else None,
-            'status': conversation.status,
-            'summary': conversation.summary,
-            'key_points': conversation.key_points,
-            'messages': [
-                {
-                    'sender': m.sender,
-                    'content': m.content,
-                    'timestamp': m.timestamp.isoformat()
-                }
-                for m in conversation.messages.all()
-            ]
-        }
-        response = HttpResponse(
-            json.dumps(data, indent=2, default=str),
-            content_type='application/json'
-        )
+        response = streaming_response(self.request, json_chunks(conversation), 'application/json')
         response['Content-Disposition'] = f'attachment; filename="conversation_{conversation.id}.json"'
         return response
     
     def _export_markdown(self, conversation):
-        content = f"# {conversation.title}\n\n"
-        content += f"**Start Time:** {conversation.start_time}\n\n"
-        if conversation.end_time:
-            content += f"**End Time:** {conversation.end_time}\n\n"
-        
-        if conversation.summary:
-            content += f"## Summary\n\n{conversation.summary}\n\n"
-        
-        content += "## Messages\n\n"
-        for message in conversation.messages.all():
-            sender_label = "**User:**" if message.sender == "user" else "**AI:**"
-            content += f"{sender_label}\n\n{message.content}\n\n---\n\n"
-        
-        response = HttpResponse(content, content_type='text/markdown')
+        response = streaming_response(self.request, markdown_chunks(conversation), 'text/markdown')
         response['Content-Disposition'] = f'attachment; filename="conversation_{conversation.id}.md"'
         return response
     
+    @action(detail=False, methods=['get'])
+    def export_all(self, request):
+        export_format = request.query_params.get('format', 'ndjson')
+        stamp = timezone.now().strftime('%Y%m%d')
+
+        if export_format == 'zip':
+            response = streaming_response(request, zip_chunks(request.user), 'application/zip')
+            response['Content-Disposition'] = f'attachment; filename="conversations_{stamp}.zip"'
+        elif export_format == 'ndjson':
+            response = streaming_response(request, ndjson_chunks(request.user), 'application/x-ndjson')
+            response['Content-Disposition'] = f'attachment; filename="conversations_{stamp}.ndjson"'
+        else:
+            return Response({"error": "format must be 'ndjson' or 'zip'"}, status=status.HTTP_400_BAD_REQUEST)
+        return response
+    
     def _export_pdf(self, conversation):
-        buffer = BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=letter)
-        styles = getSampleStyleSheet()
-        story = []
-        
-        title_style = ParagraphStyle(
-            'CustomTitle',
-            parent=styles['Heading1'],
-            fontSize=24,
-            spaceAfter=30,
-        )
-        story.append(Paragraph(conversation.title, title_style))
-        story.append(Spacer(1, 0.2*inch))
-        
-        info_style = styles['Normal']
-        story.append(Paragraph(f"<b>Start Time:</b> {conversation.start_time}", info_style))
-        if conversation.end_time:
-            story.append(Paragraph(f"<b>End Time:</b> {conversation.end_time}", info_style))
-        story.append(Spacer(1, 0.3*inch))
-        
-        if conversation.summary:
-            story.append(Paragraph("<b>Summary</b>", styles['Heading2']))
-            story.append(Paragraph(conversation.summary, info_style))
-            story.append(Spacer(1, 0.3*inch))
-        
-        story.append(Paragraph("<b>Messages</b>", styles['Heading2']))
-        story.append(Spacer(1, 0.2*inch))
-        
-        for message in conversation.messages.all():
-            sender_style = ParagraphStyle(
-                'Sender',
-                parent=styles['Normal'],
-                fontName='Helvetica-Bold',
-                fontSize=12,
+        artifact = open_artifact(conversation, conversation.version)
+        if artifact is None:
+            # Rendered by the job worker; poll the job, then request the export again
+            job = enqueue('render_pdf', conversation, key=f"render_pdf:{conversation.pk}:{conversation.version}")
+            return Response(
+                {"job_id": job.id, "status": job.status},
+                status=status.HTTP_202_ACCEPTED,
+                headers={'Retry-After': str(settings.PDF_EXPORT_RETRY_AFTER)},
             )
-            story.append(Paragraph(f"{message.sender.upper()}:", sender_style))
-            
-            content_clean = escape(message.content)
-            story.append(Paragraph(content_clean, info_style))
-            story.append(Spacer(1, 0.2*inch))
-        
-        doc.build(story)
-        buffer.seek(0)
-        
-        response = HttpResponse(buffer, content_type='application/pdf')
-        response['Content-Disposition'] = f'attachment; filename="conversation_{conversation.id}.pdf"'
-        return response
+        return FileResponse(
+            artifact,
+            as_attachment=True,
+            filename=f"conversation_{conversation.id}.pdf",
+            content_type='application/pdf',
+        )
     
     @action(detail=False, methods=['get'])
     def analytics(self, request):
-        from django.db.models import Count, Avg
-        from django.db.models.functions import TruncDate
         from datetime import timedelta
-        from django.utils import timezone
-        
-        user_conversations = Conversation.objects.filter(user=request.user)
-        user_messages = Message.objects.filter(conversation__user=request.user)
-        
-        conversations_by_date = user_conversations.annotate(
-            date=TruncDate('start_time')
-        ).values('date').annotate(
-            count=Count('id')
+
+        rollups = DailyRollup.objects.filter(user=request.user)
+        today = timezone.localdate()
+        last_7_days = today - timedelta(days=7)
+        last_30_days = today - timedelta(days=30)
+
+        totals = rollups.aggregate(
+            total_conversations=Coalesce(Sum('conversations'), 0),
+            total_messages=Coalesce(Sum('messages'), 0),
+            ended_conversations=Coalesce(Sum('ended_conversations'), 0),
+            archived_conversations=Coalesce(Sum('archived_conversations'), 0),
+            conversations_last_7_days=Coalesce(Sum('conversations', filter=Q(date__gte=last_7_days)), 0),
+            conversations_last_30_days=Coalesce(Sum('conversations', filter=Q(date__gte=last_30_days)), 0),
+            messages_last_7_days=Coalesce(Sum('messages', filter=Q(date__gte=last_7_days)), 0),
+            bookmarked_messages_count=Coalesce(Sum('bookmarked_messages'), 0),
+            user_message_count=Coalesce(Sum('user_messages'), 0),
+            ai_message_count=Coalesce(Sum('ai_messages'), 0),
+            conversations_with_summaries=Coalesce(Sum('summarized_conversations'), 0),
+        )
+
+        conversations_by_date = rollups.filter(conversations__gt=0).values(
+            'date'
+        ).annotate(
+            count=F('conversations')
         ).order_by('-date')[:30]
-        
-        total_conversations = user_conversations.count()
-        total_messages = user_messages.count()
-        active_conversations = user_conversations.filter(status='active').count()
-        ended_conversations = user_conversations.filter(status='ended').count()
-        archived_conversations = user_conversations.filter(is_archived=True).count()
-        
+
+        total_conversations = totals['total_conversations']
+        total_messages = totals['total_messages']
         avg_messages_per_conversation = total_messages / total_conversations if total_conversations > 0 else 0
-        
-        now = timezone.now()
-        last_7_days = now - timedelta(days=7)
-        last_30_days = now - timedelta(days=30)
-        
-        conversations_last_7_days = user_conversations.filter(start_time__gte=last_7_days).count()
-        conversations_last_30_days = user_conversations.filter(start_time__gte=last_30_days).count()
-        messages_last_7_days = user_messages.filter(timestamp__gte=last_7_days).count()
-        
-        bookmarked_messages_count = user_messages.filter(is_bookmarked=True).count()
-        
-        user_message_count = user_messages.filter(sender='user').count()
-        ai_message_count = user_messages.filter(sender='ai').count()
-        
-        conversations_with_summaries = user_conversations.exclude(summary__isnull=True).exclude(summary='').count()
-        
+
         return Response({
             'total_conversations': total_conversations,
             'total_messages': total_messages,
-            'active_conversations': active_conversations,
-            'ended_conversations': ended_conversations,
-            'archived_conversations': archived_conversations,
+            'active_conversations': total_conversations - totals['ended_conversations'],
+            'ended_conversations': totals['ended_conversations'],
+            'archived_conversations': totals['archived_conversations'],
             'avg_messages_per_conversation': round(avg_messages_per_conversation, 2),
-            'conversations_last_7_days': conversations_last_7_days,
-            'conversations_last_30_days': conversations_last_30_days,
-            'messages_last_7_days': messages_last_7_days,
-            'bookmarked_messages_count': bookmarked_messages_count,
-            'user_message_count': user_message_count,
-            'ai_message_count': ai_message_count,
-            'conversations_with_summaries': conversations_with_summaries,
+            'conversations_last_7_days': totals['conversations_last_7_days'],
+            'conversations_last_30_days': totals['conversations_last_30_days'],
+            'messages_last_7_days': totals['messages_last_7_days'],
+            'bookmarked_messages_count': totals['bookmarked_messages_count'],
+            'user_message_count': totals['user_message_count'],
+            'ai_message_count': totals['ai_message_count'],
+            'conversations_with_summaries': totals['conversations_with_summaries'],
             'conversations_by_date': list(conversations_by_date)
         })
 
 
 class MessageViewSet(viewsets.ModelViewSet):
-    queryset = Message.objects.all()
     serializer_class = MessageSerializer
 
+    def get_queryset(self):
+        return Message.objects.filter(conversation__user=self.request.user)
+
+    def perform_create(self, serializer):
+        with transaction.atomic():
+            message = serializer.save()
+            record_message(message)
+            touch_conversation(message.conversation)
+            message_created(message, message.conversation.user_id, message.conversation.version)
+
+    def perform_update(self, serializer):
+        before = message_counts(serializer.instance)
+        previous_conversation_id = serializer.instance.conversation_id
+        previous_content = serializer.instance.content
+        with transaction.atomic():
+            message = serializer.save()
+            record_message(message, before)
+            touch_conversation(message.conversation)
+            if previous_conversation_id != message.conversation_id:
+                touch_conversation(previous_conversation_id)
+            if message.content != previous_content or previous_conversation_id != message.conversation_id:
+                reindex_message(message)
+            publish(
+                self.request.user.pk, 'message.updated',
+                previous_conversation_id=previous_conversation_id, message=MessageSerializer(message).data,
+            )
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            remove_message(instance)
+            message_id = instance.pk
+            instance.delete()
+            touch_conversation(instance.conversation_id)
+            publish(
+                self.request.user.pk, 'message.deleted', message_id=message_id, conversation_id=instance.conversation_id
+            )
+
     @action(detail=True, methods=['post'])
     def bookmark(self, request, pk=None):
-        message = self.get_object()
-        message.is_bookmarked = not message.is_bookmarked
-        message.save()
-        return Response({"is_bookmarked": message.is_bookmarked})
+        message_id = parse_message_ids([pk])[str(pk)]
+        is_bookmarked = toggle_bookmark(request.user, message_id) if message_id else None
+        if is_bookmarked is None:
+            return Response({"error": "Message not found"}, status=status.HTTP_404_NOT_FOUND)
+        return Response({"is_bookmarked": is_bookmarked})
 
     @action(detail=True, methods=['post'])
     def react(self, request, pk=None):
-        message = self.get_object()
         reaction = request.data.get('reaction')
-        
-        if not message.reactions:
-            message.reactions = []
-        
-        if reaction in message.reactions:
-            message.reactions.remove(reaction)
-        else:
-            message.reactions.clear()
-            message.reactions.append(reaction)
-        
-        message.save()
-        return Response({"reactions": message.reactions})
+        if not isinstance(reaction, str) or not reaction:
+            return Response({"error": "reaction is required"}, status=status.HTTP_400_BAD_REQUEST)
+
+        message_id = parse_message_ids([pk])[str(pk)]
+        reactions = toggle_reaction(request.user, message_id, reaction) if message_id else None
+        if reactions is None:
+            return Response({"error": "Message not found"}, status=status.HTTP_404_NOT_FOUND)
+        return Response({"reactions": reactions})
+
+    @action(detail=False, methods=['post'])
+    def bulk_bookmark(self, request):
+        ids, error = bulk_ids(request)
+        if error:
+            return error
+        bookmarked = request.data.get('bookmarked', True)
+        if not isinstance(bookmarked, bool):
+            return Response({"error": "bookmarked must be a boolean"}, status=status.HTTP_400_BAD_REQUEST)
+        return bulk_response(bulk_bookmark(request.user, parse_message_ids(ids), bookmarked))
+
+    @action(detail=False, methods=['post'])
+    def bulk_react(self, request):
+        ids, error = bulk_ids(request)
+        if error:
+            return error
+        reaction = request.data.get('reaction')
+        if reaction is not None and (not isinstance(reaction, str) or not reaction):
+            return Response({"error": "reaction must be a non-empty string or null"}, status=status.HTTP_400_BAD_REQUEST)
+        return bulk_response(bulk_react(request.user, parse_message_ids(ids), reaction))
     
     @action(detail=False, methods=['get'])
     def bookmarked(self, request):
@@ -437,6 +808,10 @@ class MessageViewSet(viewsets.ModelViewSet):
             parent=parent_message,
             branch_name=branch_name
         )
+        record_message(branch_message)
+        touch_conversation(parent_message.conversation)
+        schedule_indexing(parent_message.conversation, branch_message.id)
+        message_created(branch_message, request.user.pk, parent_message.conversation.version)
         
         serializer = self.get_serializer(branch_message)
         return Response(serializer.data)
@@ -447,3 +822,30 @@ class MessageViewSet(viewsets.ModelViewSet):
         branches = message.branches.all()
         serializer = self.get_serializer(branches, many=True)
         return Response(serializer.data)
+
+
+class JobViewSet(viewsets.ReadOnlyModelViewSet):
+    serializer_class = JobSerializer
+
+    def get_queryset(self):
+        return Job.objects.filter(conversation__user=self.request.user).order_by('-created_at')
+
+
+class ProfileViewSet(viewsets.ViewSet):
+    """Request profiles captured by ProfilingMiddleware; staff only."""
+
+    permission_classes = [IsAdminUser]
+
+    def list(self, request):
+        return Response(profiling.list_profiles())
+
+    def retrieve(self, request, pk=None):
+        record = profiling.load(pk)
+        if record is None:
+            return Response({"error": "Profile not found"}, status=status.HTTP_404_NOT_FOUND)
+        return Response(record)
+
+    def destroy(self, request, pk=None):
+        if not profiling.delete(pk):
+            return Response({"error": "Profile not found"}, status=status.HTTP_404_NOT_FOUND)
+        return Response(status=status.HTTP_204_NO_CONTENT)